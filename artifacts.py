@@ -0,0 +1,310 @@
+"""
+Content-addressed store for generated documents (PDFs and bulk zips under STATIC_DIR/pdfs).
+
+An artifact's file name is a hash of its kind and the data it renders, so
+the same offer for unchanged data maps to the same file on every worker and
+across restarts, and a repeat request is a stat() instead of a render.
+
+  render once   In-process callers asking for the same key share one render;
+                across worker processes a per-key flock makes the others wait
+                and then find the finished file (write_once, which render
+                processes can call directly).
+  atomic        Renders write to a temporary file in the same directory and
+                os.replace() it into place, so a URL never serves half a PDF.
+  off-request   Renders run on a small dedicated pool; the caller waits up to
+                `wait` seconds and otherwise gets the URL with status
+                "rendering" (the file appears there when done).
+  eviction      evict() (a background task) removes artifacts unused for
+                max_age seconds, then the least recently used ones while the
+                directory exceeds max_bytes. Hits refresh a file's mtime.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; in-process single flight still applies
+    fcntl = None
+
+from scheduler import PeriodicTask
+
+# Keys that change on every computation without the rendered data changing.
+_VOLATILE_KEYS = frozenset({"timestamp", "generated_at"})
+# Leftover lock and temporary files older than this are removed by evict().
+_SCRATCH_MAX_AGE_SECONDS = 3600
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_-]+")
+# Files in the store that count towards its size and age bounds.
+ARTIFACT_SUFFIXES = (".pdf", ".zip")
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in _VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def content_key(kind: str, payload: Any) -> str:
+    """Stable hash of an artifact's kind and the data it is rendered from."""
+    body = json.dumps([kind, _strip_volatile(payload)], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]
+
+
+def write_once(path: str, render: Callable[..., None], *args: Any) -> bool:
+    """
+    Create `path` with render(tmp_path, *args) unless it already exists.
+    Writers of the same path in any process are serialized by a flock on
+    `path`.lock; the file appears atomically. True if this call wrote it.
+    """
+    root = os.path.dirname(path)
+    os.makedirs(root, exist_ok=True)
+    with _lock_file(path + ".lock"):
+        if _touch(path):
+            return False
+        fd, tmp = tempfile.mkstemp(dir=root, suffix=".tmp")
+        os.close(fd)
+        try:
+            render(tmp, *args)
+            os.replace(tmp, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+            raise
+        return True
+
+
+@contextlib.contextmanager
+def _lock_file(lock_path: str):
+    """
+    Hold an exclusive flock on `lock_path`, refreshing its mtime. If evict()
+    unlinked the file between open() and flock(), the lock would not exclude
+    a writer that creates a new one, so reopen until they match.
+    """
+    while True:
+        lock = open(lock_path, "a")
+        if fcntl is None:
+            break
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            current = os.stat(lock_path).st_ino == os.fstat(lock.fileno()).st_ino
+        except FileNotFoundError:
+            current = False
+        if current:
+            break
+        lock.close()
+    try:
+        with contextlib.suppress(OSError):
+            os.utime(lock_path)
+        yield lock
+    finally:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+
+def _remove_stale_lock(lock_path: str) -> None:
+    """Unlink a leftover lock file unless a writer holds it."""
+    # "r": a lock file removed meanwhile must not be re-created here.
+    with open(lock_path, "r") as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+        os.remove(lock_path)
+
+
+def _touch(path: str) -> bool:
+    """Mark an existing artifact as recently used; False if it does not exist."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class ArtifactStore:
+    def __init__(
+        self,
+        root: str,
+        base_url: str,
+        max_bytes: int = 512 * 1024 * 1024,
+        max_age: float = 7 * 86400,
+        render_workers: int = 2,
+        wait: float = 10.0,
+        evict_interval: float = 600.0,
+    ):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.wait = wait
+        self.hits = 0
+        self.renders = 0
+        self.render_ms = 0.0
+        self.shared = 0
+        self.pending_returns = 0
+        self.failures = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.last_error: Optional[str] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=render_workers, thread_name_prefix="lelwa-render")
+        self.task = PeriodicTask("artifact-eviction", evict_interval, self.evict)
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.root, filename)
+
+    def url(self, filename: str) -> str:
+        return f"{self.base_url}/{filename}"
+
+    def filename(self, kind: str, payload: Any, prefix: str = "lelwa", suffix: str = ".pdf") -> str:
+        return f"{prefix}_{_UNSAFE_NAME.sub('_', kind)}_{content_key(kind, payload)}{suffix}"
+
+    def exists(self, filename: str) -> bool:
+        """True (and the artifact counts as used) if `filename` is already stored."""
+        if _touch(self.path(filename)):
+            with self._lock:
+                self.hits += 1
+            return True
+        return False
+
+    def record_render(self, ms: float) -> None:
+        """Count a render done outside get_or_render (e.g. in a render process)."""
+        with self._lock:
+            self.renders += 1
+            self.render_ms += ms
+
+    def get_or_render(
+        self, kind: str, payload: Any, render: Callable[[str], None], prefix: str = "lelwa"
+    ) -> Dict[str, Any]:
+        """
+        The artifact for (kind, payload), rendering it with `render(path)` only
+        if no worker has yet. Returns {"filename", "url", "status"} with status
+        "cached", "generated" or "rendering" (still in progress after `wait`).
+        """
+        filename = self.filename(kind, payload, prefix)
+        path = self.path(filename)
+        result = {"filename": filename, "url": self.url(filename)}
+        if _touch(path):
+            with self._lock:
+                self.hits += 1
+            return {**result, "status": "cached"}
+
+        with self._lock:
+            pending = self._pending.get(filename)
+            if pending is None:
+                pending = self._pending[filename] = self._pool.submit(self._render_once, path, render)
+                pending.add_done_callback(lambda _: self._forget(filename))
+            else:
+                self.shared += 1
+        try:
+            rendered = pending.result(timeout=self.wait)
+        except FutureTimeout:
+            with self._lock:
+                self.pending_returns += 1
+            return {**result, "status": "rendering"}
+        return {**result, "status": "generated" if rendered else "cached"}
+
+    def _forget(self, filename: str) -> None:
+        with self._lock:
+            self._pending.pop(filename, None)
+
+    def _render_once(self, path: str, render: Callable[[str], None]) -> bool:
+        started = time.perf_counter()
+        try:
+            rendered = write_once(path, render)
+        except BaseException as e:
+            with self._lock:
+                self.failures += 1
+                self.last_error = str(e)
+            raise
+        if rendered:
+            self.record_render((time.perf_counter() - started) * 1000)
+        return rendered
+
+    def evict(self) -> Dict[str, int]:
+        """Remove expired artifacts, then least recently used ones beyond max_bytes."""
+        now = time.time()
+        artifacts = []
+        removed = removed_bytes = 0
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return {"removed": 0, "removed_bytes": 0, "bytes": 0}
+        for entry in entries:
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith((".lock", ".tmp")):
+                if now - st.st_mtime > _SCRATCH_MAX_AGE_SECONDS:
+                    with contextlib.suppress(OSError):
+                        if entry.name.endswith(".lock"):
+                            _remove_stale_lock(entry.path)
+                        else:
+                            os.remove(entry.path)
+                continue
+            if not entry.name.endswith(ARTIFACT_SUFFIXES):
+                continue
+            if now - st.st_mtime > self.max_age:
+                with contextlib.suppress(OSError):
+                    os.remove(entry.path)
+                    removed += 1
+                    removed_bytes += st.st_size
+                continue
+            artifacts.append((st.st_mtime, st.st_size, entry.path))
+
+        total = sum(size for _, size, _ in artifacts)
+        artifacts.sort()
+        for _, size, path in artifacts:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(path)
+                removed += 1
+                removed_bytes += size
+            total -= size
+
+        with self._lock:
+            self.evicted += removed
+            self.evicted_bytes += removed_bytes
+        return {"removed": removed, "removed_bytes": removed_bytes, "bytes": total}
+
+    def usage(self) -> Dict[str, int]:
+        files = size = 0
+        try:
+            for entry in os.scandir(self.root):
+                if entry.name.endswith(ARTIFACT_SUFFIXES):
+                    with contextlib.suppress(FileNotFoundError):
+                        size += entry.stat().st_size
+                        files += 1
+        except FileNotFoundError:
+            pass
+        return {"files": files, "bytes": size}
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {
+                "hits": self.hits,
+                "renders": self.renders,
+                "avg_render_ms": round(self.render_ms / self.renders, 1) if self.renders else None,
+                "shared_renders": self.shared,
+                "returned_while_rendering": self.pending_returns,
+                "failures": self.failures,
+                "evicted": self.evicted,
+                "evicted_bytes": self.evicted_bytes,
+                "last_error": self.last_error,
+            }
+        return {**counters, **self.usage(), "max_bytes": self.max_bytes, "max_age_seconds": self.max_age}
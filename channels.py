@@ -5,15 +5,25 @@ Rules enforced here:
   - Credentials are NEVER written to os.environ
   - Credentials are fetched per-request and passed directly to the caller
   - Tokens are single-use and deleted on consumption
+
+Concurrency: the database runs in WAL mode (readers never block the writer,
+across worker processes too) and each thread keeps one open connection.
+Channel configs are served from a short-lived in-process cache that
+save_channel_config invalidates; a save in another worker process is seen
+within CHANNEL_CONFIG_CACHE_SECONDS. Expired resume tokens are purged by a
+background task (purge_resume_tokens), not on every consume.
 """
 
+import copy
 import json
 import os
 import sqlite3
 import tempfile
+import threading
+import time
 import uuid
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
 
 
 def _resolve_channel_db_path() -> str:
@@ -45,10 +55,32 @@ def _ensure_writable_db_path(path: str) -> str:
 
 
 CHANNEL_DB = _ensure_writable_db_path(_resolve_channel_db_path())
+# How long a channel config read is reused (0 disables the cache).
+CHANNEL_CONFIG_CACHE_SECONDS = float(os.getenv("CHANNEL_CONFIG_CACHE_SECONDS", "10"))
+RESUME_TOKEN_TTL = timedelta(hours=24)
+
+# Called as listener(user_id, channel, config) after credentials are saved
+# (e.g. to drop pooled clients built from the old credentials).
+_config_listeners: List[Callable[[str, str, dict], None]] = []
+
+
+_local = threading.local()
+# (user_id, channel) -> (config, expires_at); only connected channels are cached.
+_config_cache: Dict[Tuple[str, str], Tuple[dict, float]] = {}
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
 
 
 def _connect() -> sqlite3.Connection:
-    return sqlite3.connect(CHANNEL_DB)
+    """This thread's connection (opened once). Use as `with _connect() as db:` for a transaction."""
+    db = getattr(_local, "db", None)
+    if db is None:
+        db = sqlite3.connect(CHANNEL_DB, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL is durable across application crashes; fsync happens at checkpoints.
+        db.execute("PRAGMA synchronous=NORMAL")
+        _local.db = db
+    return db
 
 
 # ── Initialisation ─────────────────────────────────────────────────────────
@@ -75,6 +107,7 @@ def init_channel_db() -> None:
                 created_at TEXT NOT NULL
             )
         """)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_resume_tokens_created ON resume_tokens (created_at)")
 
 
 # ── Channel CRUD ───────────────────────────────────────────────────────────
@@ -85,13 +118,28 @@ def get_channel_config(user_id: str, channel: str) -> Optional[dict]:
     Returns None if the channel is not connected.
     Never reads or writes os.environ.
     """
+    key = (user_id, channel)
+    if CHANNEL_CONFIG_CACHE_SECONDS > 0:
+        with _cache_lock:
+            cached = _config_cache.get(key)
+            if cached is not None and cached[1] > time.monotonic():
+                _cache_stats["hits"] += 1
+                return copy.deepcopy(cached[0])
+            _cache_stats["misses"] += 1
     with _connect() as db:
         row = db.execute(
             "SELECT config_json FROM user_channels "
             "WHERE user_id=? AND channel=? AND status='connected'",
             (user_id, channel),
         ).fetchone()
-    return json.loads(row[0]) if row else None
+    if not row:
+        # Not cached: a channel connected by another worker must show up at once.
+        return None
+    config = json.loads(row[0])
+    if CHANNEL_CONFIG_CACHE_SECONDS > 0:
+        with _cache_lock:
+            _config_cache[key] = (copy.deepcopy(config), time.monotonic() + CHANNEL_CONFIG_CACHE_SECONDS)
+    return config
 
 
 def save_channel_config(user_id: str, channel: str, config: dict) -> None:
@@ -107,6 +155,18 @@ def save_channel_config(user_id: str, channel: str, config: dict) -> None:
             """,
             (user_id, channel, json.dumps(config), datetime.now().isoformat()),
         )
+    with _cache_lock:
+        if _config_cache.pop((user_id, channel), None) is not None:
+            _cache_stats["invalidations"] += 1
+    for listener in list(_config_listeners):
+        try:
+            listener(user_id, channel, config)
+        except Exception:
+            pass
+
+
+def on_config_saved(listener: Callable[[str, str, dict], None]) -> None:
+    _config_listeners.append(listener)
 
 
 def list_user_channels(user_id: str) -> dict:
@@ -154,19 +214,17 @@ def consume_resume_token(token: str) -> Optional[dict]:
     Tokens expire after 24 hours.
     Returns None if the token does not exist, has expired, or was already used.
     """
-    from datetime import timedelta
-    cutoff = (datetime.now() - timedelta(hours=24)).isoformat()
+    cutoff = (datetime.now() - RESUME_TOKEN_TTL).isoformat()
     with _connect() as db:
-        # Purge stale tokens (older than 24h) on every consume
-        db.execute("DELETE FROM resume_tokens WHERE created_at < ?", (cutoff,))
-        row = db.execute(
-            "SELECT user_id, session_id, tool_name, args_json "
-            "FROM resume_tokens WHERE token=? AND created_at >= ?",
+        # One statement: of two concurrent consumers only one gets the row.
+        rows = db.execute(
+            "DELETE FROM resume_tokens WHERE token=? AND created_at >= ? "
+            "RETURNING user_id, session_id, tool_name, args_json",
             (token, cutoff),
-        ).fetchone()
-        if not row:
-            return None
-        db.execute("DELETE FROM resume_tokens WHERE token=?", (token,))
+        ).fetchall()
+    if not rows:
+        return None
+    row = rows[0]
     return {
         "user_id": row[0],
         "session_id": row[1],
@@ -175,6 +233,18 @@ def consume_resume_token(token: str) -> Optional[dict]:
     }
 
 
+def purge_resume_tokens() -> int:
+    """Delete expired resume tokens (run periodically by the API)."""
+    cutoff = (datetime.now() - RESUME_TOKEN_TTL).isoformat()
+    with _connect() as db:
+        return db.execute("DELETE FROM resume_tokens WHERE created_at < ?", (cutoff,)).rowcount
+
+
+def channel_store_stats() -> dict:
+    with _cache_lock:
+        return {**_cache_stats, "cached_configs": len(_config_cache), "cache_ttl_seconds": CHANNEL_CONFIG_CACHE_SECONDS}
+
+
 # Initialise tables on import
 try:
     init_channel_db()
@@ -0,0 +1,310 @@
+"""
+Document rendering and bulk document jobs.
+
+render_document_pdf() draws the branded PDF for one property (or market)
+payload. It only needs FPDF, so render processes import this module and
+nothing heavier.
+
+BulkDocumentJobs turns a list of up to BULK_DOCUMENT_MAX listings into PDFs:
+
+  1. every property row is fetched with one query (ToolExecutor.fetch_properties)
+  2. documents already in the artifact store are reused as they are (the key
+     covers the row and the render date, so a day-old PDF is never served)
+  3. the rest render in parallel on a process pool (one process per core by
+     default), each through artifacts.write_once, so a document another
+     worker or job is rendering at the same moment is rendered only once
+  4. optionally the PDFs are zipped (content-addressed as well)
+
+Progress and results are written to a JSON manifest per job under the jobs
+directory, so any API worker on the host can answer a status request.
+"""
+
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fpdf import FPDF
+
+from artifacts import ArtifactStore, write_once
+
+# Listings one bulk job accepts.
+BULK_DOCUMENT_MAX = 200
+# Document types rendered from the property row alone (what the bulk job fetches).
+BULK_DOCUMENT_TYPES = ("offer", "property_visual", "rental_contract", "negotiation")
+# Finished job manifests older than this are removed when new jobs start.
+JOB_RETENTION_SECONDS = 86400
+# Minimum gap between manifest rewrites while a job is running.
+_MANIFEST_WRITE_SECONDS = 0.5
+_SLUG = re.compile(r"[^A-Za-z0-9]+")
+
+
+def render_date() -> str:
+    """The date a document rendered now is stamped with (part of its artifact key)."""
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+def render_document_pdf(path: str, doc_type: str, prop_name: str, data: Any, generated: str) -> None:
+    """Writes the branded document PDF for `data`, dated `generated`, to `path`."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 16)
+    pdf.cell(0, 10, f"LELWA | {doc_type.upper()} REPORT", ln=True, align='C')
+    pdf.ln(10)
+
+    pdf.set_font("Helvetica", "", 12)
+    pdf.cell(0, 10, f"Property: {prop_name}", ln=True)
+    pdf.cell(0, 10, f"Generated: {generated}", ln=True)
+    pdf.ln(5)
+
+    # Add data rows
+    if isinstance(data, list):
+        data = data[0] if data else {}
+    if isinstance(data, dict):
+        for k, v in data.items():
+            pdf.cell(0, 8, f"{k.replace('_', ' ').title()}: {v}", ln=True)
+
+    pdf.set_y(-30)
+    pdf.set_font("Helvetica", "I", 8)
+    pdf.multi_cell(0, 5, "Disclaimer: This document is prepared by Lelwa. Figures are based on DLD data and are not guaranteed.")
+    pdf.output(path)
+
+
+def document_payload(prop_name: str, data: Any, generated: str) -> Dict[str, Any]:
+    """What a document's artifact key is computed over: everything it renders, date included."""
+    return {"property": prop_name, "data": data, "generated": generated}
+
+
+def _write_zip(path: str, members: List[List[str]]) -> None:
+    # PDFs are already compressed; storing them keeps zipping I/O-bound.
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for arcname, source in members:
+            archive.write(source, arcname)
+
+
+class BulkDocumentJobs:
+    def __init__(self, executor: Any, artifacts: ArtifactStore, jobs_dir: str, processes: int = 0):
+        self.executor = executor
+        self.artifacts = artifacts
+        self.jobs_dir = jobs_dir
+        self.processes = processes or os.cpu_count() or 1
+        self.jobs_started = 0
+        self.documents = 0
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._written: Dict[str, float] = {}  # job_id -> last manifest write
+        self._lock = threading.Lock()
+        self._runner = ThreadPoolExecutor(max_workers=2, thread_name_prefix="lelwa-bulk")
+        self._pool = None
+
+    def _render_pool(self):
+        with self._lock:
+            if self._pool is None:
+                try:
+                    # spawn: never fork the threaded API process.
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+                    )
+                except (OSError, NotImplementedError):
+                    # No process support (e.g. some serverless sandboxes): render on threads.
+                    self._pool = ThreadPoolExecutor(max_workers=self.processes, thread_name_prefix="lelwa-render")
+            return self._pool
+
+    def _discard_pool(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(
+        self,
+        document_type: str,
+        property_names: Optional[List[str]] = None,
+        asset_ids: Optional[List[str]] = None,
+        make_zip: bool = True,
+    ) -> Dict[str, Any]:
+        """Start a job; returns its manifest (status "queued")."""
+        inputs = list(asset_ids if asset_ids is not None else property_names or [])
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "document_type": document_type,
+            "status": "queued",
+            "total": len(inputs),
+            "done": 0,
+            "generated": 0,
+            "cached": 0,
+            "failed": 0,
+            "not_found": 0,
+            "items": [{"input": value, "status": "pending"} for value in inputs],
+            "zip_url": None,
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "elapsed_ms": None,
+        }
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            self.jobs_started += 1
+        self._prune()
+        self._write_manifest(job)
+        by_id = asset_ids is not None
+        self._runner.submit(self._run, job, inputs, by_id, make_zip)
+        return self._snapshot(job)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job's manifest, from memory if this worker runs it, else from the jobs directory."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return self._snapshot(job)
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id or ""):
+            return None
+        try:
+            with open(self._manifest_path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _run(self, job: Dict[str, Any], inputs: List[str], by_id: bool, make_zip: bool) -> None:
+        started = time.perf_counter()
+        doc_type = job["document_type"]
+        self._update(job, status="running")
+        try:
+            if by_id:
+                rows = self.executor.fetch_properties(asset_ids=inputs, cap=BULK_DOCUMENT_MAX)
+            else:
+                rows = self.executor.fetch_properties(names=inputs, cap=BULK_DOCUMENT_MAX)
+
+            generated = render_date()
+            futures = {}
+            waiting: Dict[str, List[int]] = {}  # filename -> items it serves (duplicates render once)
+            for i, row in enumerate(rows):
+                if not row:
+                    self._finish_item(job, i, "not_found")
+                    continue
+                name = row.get("name") or job["items"][i]["input"]
+                filename = self.artifacts.filename(doc_type, document_payload(name, row, generated))
+                with self._lock:
+                    job["items"][i].update({"asset_id": row.get("asset_id"), "property": name, "filename": filename})
+                if filename in waiting:
+                    waiting[filename].append(i)
+                    continue
+                waiting[filename] = [i]
+                if self.artifacts.exists(filename):
+                    continue
+                future = self._render_pool().submit(
+                    write_once, self.artifacts.path(filename), render_document_pdf, doc_type, name, row, generated
+                )
+                futures[future] = (filename, time.perf_counter())
+
+            rendering = {filename for filename, _ in futures.values()}
+            for filename, items in waiting.items():
+                if filename not in rendering:
+                    for i in items:
+                        self._finish_item(job, i, "cached", self.artifacts.url(filename))
+            for future in as_completed(futures):
+                filename, submitted = futures[future]
+                try:
+                    status = "generated" if future.result() else "cached"
+                    if status == "generated":
+                        self.artifacts.record_render((time.perf_counter() - submitted) * 1000)
+                    url, error = self.artifacts.url(filename), None
+                except BrokenProcessPool as e:
+                    # A render process died; start a fresh pool for the next job.
+                    self._discard_pool()
+                    status, url, error = "failed", None, str(e)
+                except Exception as e:
+                    status, url, error = "failed", None, str(e)
+                for i in waiting[filename]:
+                    self._finish_item(job, i, status, url, error)
+
+            if make_zip:
+                entries = [
+                    [f"{n:03d}_{_SLUG.sub('_', item['property']).strip('_')[:60]}.pdf", item["filename"]]
+                    for n, item in enumerate(job["items"], 1)
+                    if item["status"] in ("generated", "cached")
+                ]
+                if entries:
+                    zip_name = self.artifacts.filename(f"bulk_{doc_type}", entries, suffix=".zip")
+                    members = [[arcname, self.artifacts.path(filename)] for arcname, filename in entries]
+                    write_once(self.artifacts.path(zip_name), _write_zip, members)
+                    job["zip_url"] = self.artifacts.url(zip_name)
+            self._update(job, status="done")
+        except Exception as e:
+            self._update(job, status="failed", error=str(e))
+        finally:
+            with self._lock:
+                job["finished_at"] = datetime.now().isoformat()
+                job["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                self.documents += job["generated"]
+            self._write_manifest(job, force=True)
+            # Finished manifests are read from disk from now on.
+            with self._lock:
+                self._jobs.pop(job["job_id"], None)
+                self._written.pop(job["job_id"], None)
+
+    def _finish_item(self, job, i: int, status: str, url: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            item = job["items"][i]
+            item["status"] = status
+            if url:
+                item["pdf_url"] = url
+            if error:
+                item["error"] = error
+            job["done"] += 1
+            job[status] += 1
+        self._write_manifest(job)
+
+    def _update(self, job, **fields) -> None:
+        with self._lock:
+            job.update(fields)
+        self._write_manifest(job, force=True)
+
+    def _snapshot(self, job) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(job, default=str))
+
+    def _manifest_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _write_manifest(self, job, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._written.get(job["job_id"], 0.0) < _MANIFEST_WRITE_SECONDS:
+            return
+        self._written[job["job_id"]] = now
+        body = self._snapshot(job)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.jobs_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(body, f, default=str)
+        os.replace(tmp, self._manifest_path(job["job_id"]))
+
+    def _prune(self) -> None:
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        try:
+            for entry in os.scandir(self.jobs_dir):
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        self._runner.shutdown(wait=False, cancel_futures=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["status"] == "running")
+        return {
+            "processes": self.processes,
+            "jobs_started": self.jobs_started,
+            "jobs_running": running,
+            "documents_generated": self.documents,
+        }
@@ -70,6 +70,27 @@ const REQUIRED_ARGS_BY_TOOL: Record<string, string[]> = {
   call_investor: ["to_number"],
 }
 
+// send_whatsapp / call_investor are queued in the backend outbox; delivery settles later.
+const OUTBOX_SETTLED = ["sent", "failed", "blocked"]
+const OUTBOX_POLL_MS = 1500
+const OUTBOX_POLL_LIMIT_MS = 120_000
+
+async function waitForDelivery(apiBase: string, statusUrl: string): Promise<string> {
+  const deadline = Date.now() + OUTBOX_POLL_LIMIT_MS
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, OUTBOX_POLL_MS))
+    try {
+      const res = await fetch(`${apiBase}${statusUrl}`, { cache: "no-store" })
+      if (!res.ok) continue
+      const item = await res.json()
+      if (OUTBOX_SETTLED.includes(item?.status)) return item.status
+    } catch {
+      // network blip — keep polling
+    }
+  }
+  return "queued"
+}
+
 function isActionBlocked(action: PreparedAction) {
   const required = REQUIRED_ARGS_BY_TOOL[action.tool_name]
   if (!required) return false
@@ -358,6 +379,8 @@ export default function StudioPage() {
   const fileInputRef = useRef<HTMLInputElement>(null)
   const feedEndRef = useRef<HTMLDivElement>(null)
   const textareaRef = useRef<HTMLTextAreaElement>(null)
+  // Failed attempts per action, so a retry after an error gets a fresh idempotency key.
+  const actionAttemptsRef = useRef<Record<string, number>>({})
 
   const apiBase = process.env.NEXT_PUBLIC_API_BASE_URL || "http://localhost:8000"
   const actionParam = searchParams.get("action") ?? searchParams.get("start")
@@ -498,12 +521,31 @@ export default function StudioPage() {
     }
   }
 
+  function markActionFailed(entryId: string, actionId: string) {
+    const attemptKey = `${entryId}:${actionId}`
+    actionAttemptsRef.current[attemptKey] = (actionAttemptsRef.current[attemptKey] ?? 0) + 1
+    setActionState(entryId, actionId, "error")
+    setTimeout(() => setActionState(entryId, actionId, "idle"), 5000)
+  }
+
+  async function settleDelivery(entryId: string, actionId: string, statusUrl: string) {
+    const delivery = await waitForDelivery(apiBase, statusUrl)
+    if (delivery === "failed" || delivery === "blocked") {
+      markActionFailed(entryId, actionId)
+      return
+    }
+    setActionState(entryId, actionId, "done")
+  }
+
   async function executeAction(entryId: string, action: PreparedAction) {
     setActionState(entryId, action.id, "loading")
+    const attemptKey = `${entryId}:${action.id}`
+    // Same prepared action, same key: a double click or a retried request is sent once.
+    const idempotencyKey = `${sessionId || "direct"}:${attemptKey}:${actionAttemptsRef.current[attemptKey] ?? 0}`
     try {
       const res = await fetch(`${apiBase}/v1/tools/${action.tool_name}`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey },
         body: JSON.stringify({
           tool_name: action.tool_name,
           args: action.args,
@@ -530,8 +572,12 @@ export default function StudioPage() {
       }
 
       if (data?.error) {
-        setActionState(entryId, action.id, "error")
-        setTimeout(() => setActionState(entryId, action.id, "idle"), 5000)
+        markActionFailed(entryId, action.id)
+        return
+      }
+
+      if (data?.status === "queued" && data.status_url) {
+        await settleDelivery(entryId, action.id, data.status_url)
         return
       }
 
@@ -545,8 +591,7 @@ export default function StudioPage() {
 
       setActionState(entryId, action.id, "done")
     } catch {
-      setActionState(entryId, action.id, "error")
-      setTimeout(() => setActionState(entryId, action.id, "idle"), 5000)
+      markActionFailed(entryId, action.id)
     }
   }
 
@@ -563,7 +608,12 @@ export default function StudioPage() {
     const { entryId, action } = connectSheet
     setConnectSheet({ open: false, entryId: "", action: null, requirement: null })
 
-    if (resumeResult?.status === "executed" && action) {
+    if (!action) return
+    const statusUrl = (resumeResult?.result as { status_url?: string } | undefined)?.status_url
+    if (resumeResult?.status === "queued" && statusUrl) {
+      setActionState(entryId, action.id, "loading")
+      void settleDelivery(entryId, action.id, statusUrl)
+    } else if (resumeResult?.status === "executed") {
       setActionState(entryId, action.id, "done")
     }
   }
@@ -0,0 +1,249 @@
+"""
+Extract the JSON object from a model's full reply text.
+
+Models wrap the prepared-work object in prose or ``` fences, append notes
+after it, or stop mid-object when they hit the token limit. extract_object()
+walks the text once with json.JSONDecoder.raw_decode:
+
+  - at each "{" it decodes a whole value in C; a success skips past the
+    object (its nested objects are never tried on their own)
+  - a decode that fails at the end of the text is a truncated object: it is
+    repaired by closing the open string and brackets, falling back to the
+    last complete member when the cut fell inside a key or a literal
+  - a decode that fails inside the text moves on to the next "{"
+
+The best candidate wins: an object with one of the `prefer` keys over one
+without, a complete object over a repaired one, then the first. The same
+extractor serves the HTTP and WebSocket chat paths (main._parse_broker_response).
+
+OutputStats counts, per model, how each chat turn's final answer parsed and
+how many output tokens it cost, for /v1/metrics.
+"""
+
+import json
+import re
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+# strict=False: models often put raw newlines and tabs inside strings.
+_decoder = json.JSONDecoder(strict=False)
+# Characters that change bracket or string state; everything else is skipped.
+_STRUCTURAL = re.compile(r'[{}\[\],:"\\]')
+_CLOSERS = {"{": "}", "[": "]"}
+_WHITESPACE = " \t\n\r"
+
+
+def repair_truncated(text: str) -> Optional[dict]:
+    """
+    Complete a JSON object that was cut off: close an open string (dropping
+    a half-written escape) and every open bracket. Returns None when `text`
+    is not a truncated object (it is complete, or broken before its end).
+    """
+    # Open brackets, innermost last, and whether the innermost object expects a key.
+    brackets = ""
+    expect_key = False
+    in_string = string_is_value = False
+    string_start = escape_until = 0
+    # Longest prefix known to close cleanly, with the brackets open there.
+    safe_end, safe_brackets = 0, ""
+    for m in _STRUCTURAL.finditer(text):
+        i = m.start()
+        if i < escape_until:
+            continue
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                escape_until = i + 2
+            elif ch == '"':
+                in_string = False
+                if string_is_value:
+                    safe_end, safe_brackets = i + 1, brackets
+            continue
+        if ch == '"':
+            in_string, string_start = True, i
+            string_is_value = not expect_key
+        elif ch == "{" or ch == "[":
+            brackets += ch
+            expect_key = ch == "{"
+            safe_end, safe_brackets = i + 1, brackets
+        elif ch == "}" or ch == "]":
+            if not brackets or _CLOSERS[brackets[-1]] != ch:
+                return None
+            brackets = brackets[:-1]
+            if not brackets:
+                # The object closed, so the error was not truncation.
+                return None
+            expect_key = False
+            safe_end, safe_brackets = i + 1, brackets
+        elif ch == ",":
+            if brackets:
+                # Everything before the comma is a complete member.
+                safe_end, safe_brackets = i, brackets
+                expect_key = brackets[-1] == "{"
+        elif ch == ":":
+            expect_key = False
+    if not brackets:
+        return None
+
+    attempts = []
+    if in_string and string_is_value:
+        body = text[string_start + 1:]
+        body = body[:_unfinished_escape(body)]
+        attempts.append(text[:string_start + 1] + body + '"' + _closing(brackets))
+    elif not in_string:
+        attempts.append(text.rstrip(_WHITESPACE) + _closing(brackets))
+    attempts.append(text[:safe_end] + _closing(safe_brackets))
+    for attempt in attempts:
+        try:
+            value = _decoder.decode(attempt)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def _unfinished_escape(body: str) -> int:
+    """Where a cut-off "\\" or "\\uXX" escape at the end of a string body starts (else its length)."""
+    backslash = body.rfind("\\", max(0, len(body) - 6))
+    if backslash == -1:
+        return len(body)
+    run = 0
+    while backslash - run >= 0 and body[backslash - run] == "\\":
+        run += 1
+    tail = body[backslash:]
+    if run % 2 == 1 and (len(tail) < 2 or (tail[1] == "u" and len(tail) < 6)):
+        return backslash
+    return len(body)
+
+
+def _closing(brackets: str) -> str:
+    return "".join(_CLOSERS[b] for b in reversed(brackets))
+
+
+def extract_object(text: str, prefer: Iterable[str] = ()) -> Optional[dict]:
+    """The best top-level JSON object in `text` (see module docstring), or None."""
+    return find_object(text, prefer)[0]
+
+
+def find_object(text: str, prefer: Iterable[str] = ()) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    extract_object() plus how the object was found:
+
+      "clean"     the text is the object alone (fenced or not)
+      "wrapped"   a complete object with other text around it
+      "repaired"  a truncated object, completed by repair_truncated
+      None        no object
+    """
+    prefer = tuple(prefer)
+    best: Optional[Tuple[Tuple[bool, bool], dict, int, int]] = None
+    i = text.find("{")
+    while i != -1:
+        try:
+            value, end = _decoder.raw_decode(text, i)
+            complete = True
+        except ValueError as e:
+            value, end, complete = None, i + 1, False
+            if _truncated(text, e):
+                value = repair_truncated(text[i:])
+                end = len(text)
+        if isinstance(value, dict):
+            rank = (any(key in value for key in prefer), complete)
+            if best is None or rank > best[0]:
+                best = (rank, value, i, end)
+                if rank == (True, True) or not prefer and complete:
+                    break
+        i = text.find("{", end)
+    if best is None:
+        return None, None
+    (_, complete), value, start, end = best
+    if not complete:
+        return value, "repaired"
+    alone = text[:start].strip() in ("", "```", "```json") and text[end:].strip() in ("", "```")
+    return value, "clean" if alone else "wrapped"
+
+
+def _truncated(text: str, error: ValueError) -> bool:
+    """Whether a raw_decode error means the text ran out (rather than bad JSON mid-text)."""
+    pos = getattr(error, "pos", None)
+    if pos is None:
+        return False
+    # A "\uXX" escape cut off at the end is reported where it starts.
+    if pos >= len(text.rstrip(_WHITESPACE)) - 6:
+        return True
+    # "Unterminated string" reports where the string began.
+    return getattr(error, "msg", "").startswith("Unterminated string")
+
+
+def extract_string(text: str, key: str) -> Optional[str]:
+    """The first `"key": "..."` string value in `text`, decoded, even if the JSON around it is broken."""
+    needle = f'"{key}"'
+    i = text.find(needle)
+    while i != -1:
+        j = i + len(needle)
+        while j < len(text) and text[j] in _WHITESPACE:
+            j += 1
+        if j < len(text) and text[j] == ":":
+            j += 1
+            while j < len(text) and text[j] in _WHITESPACE:
+                j += 1
+            if j < len(text) and text[j] == '"':
+                try:
+                    value, _ = _decoder.raw_decode(text, j)
+                    return value
+                except ValueError:
+                    pass
+        i = text.find(needle, i + 1)
+    return None
+
+
+class OutputStats:
+    """
+    Per-model counters for final answers. `outcome` is find_object's
+    ("clean", "wrapped", "repaired") or "fallback" when no contract object
+    was found; a structured re-ask records its own outcome and tokens.
+    """
+
+    OUTCOMES = ("clean", "wrapped", "repaired", "fallback")
+
+    def __init__(self):
+        self._models: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _model(self, model: str) -> dict:
+        counters = self._models.get(model)
+        if counters is None:
+            counters = self._models[model] = {
+                "turns": 0, **{o: 0 for o in self.OUTCOMES}, "output_tokens": 0,
+                "reasks": 0, "reask_failed": 0, "reask_output_tokens": 0,
+            }
+        return counters
+
+    def record(self, model: str, outcome: str, output_tokens: int) -> None:
+        with self._lock:
+            counters = self._model(model)
+            counters["turns"] += 1
+            counters[outcome] += 1
+            counters["output_tokens"] += output_tokens
+
+    def record_reask(self, model: str, outcome: str, output_tokens: int) -> None:
+        with self._lock:
+            counters = self._model(model)
+            counters["reasks"] += 1
+            if outcome not in ("clean", "wrapped"):
+                counters["reask_failed"] += 1
+            counters["reask_output_tokens"] += output_tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for model, counters in self._models.items():
+                turns = counters["turns"]
+                out[model] = {
+                    **counters,
+                    # Turns whose first answer needed repair or the raw-text fallback.
+                    "fallback_rate": round((counters["repaired"] + counters["fallback"]) / turns, 4) if turns else None,
+                    "avg_output_tokens": round(counters["output_tokens"] / turns, 1) if turns else None,
+                }
+            return out
+
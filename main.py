@@ -1,29 +1,61 @@
+import asyncio
+import contextlib
+import contextvars
+import copy
+import functools
 import json
-import re
 import hashlib
 import uuid
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from urllib.parse import quote
 
 from dotenv import load_dotenv
 import os
 
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Header, Request, BackgroundTasks, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 from sqlalchemy import create_engine, text
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from openai import OpenAI as _OpenAI
 
-from security import SecurityShield, RequestSignature
-from tools import ToolExecutor
+from artifacts import ArtifactStore
+from cache import MISSING, TTLCache
+from documents import BULK_DOCUMENT_MAX, BULK_DOCUMENT_TYPES, BulkDocumentJobs
+from outbox import OUTBOX_TOOLS, Outbox
+from security import WINDOW_SECONDS, SecurityShield, RequestSignature, ThreatSignals
+from shield_state import make_state_store
+from registry import MANUAL_TOOL_NAMES
+from request_scope import request_scope, totals as request_scope_totals, watch_engine
+from proactive import ProactiveScanner
+from scheduler import PeriodicTask
+from snapshots import MarketSnapshotService
+from prompt_cache import GeminiPromptCache
+from json_extract import OutputStats, extract_object, extract_string, find_object
+from streaming import PreparedStreamParser
+from tools import (
+    ARTIFACT_BASE_URL,
+    ARTIFACT_MAX_AGE_SECONDS,
+    ARTIFACT_MAX_BYTES,
+    PDF_RENDER_WAIT_SECONDS,
+    PDF_RENDER_WORKERS,
+    ToolExecutor,
+)
 from channels import (
+    CHANNEL_DB,
     save_channel_config,
     list_user_channels,
     create_resume_token,
     consume_resume_token,
+    channel_store_stats,
+    purge_resume_tokens,
 )
 
 load_dotenv()
@@ -32,13 +64,72 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
+# Re-ask once for a schema-constrained answer when a chat turn ends without a
+# complete prepared-work object (truncated, or no JSON at all).
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "1").lower() in ("1", "true", "yes")
+# Ollama's constrained mode for that re-ask: "json_schema" (Ollama 0.5+) or "json_object".
+OLLAMA_RESPONSE_FORMAT = os.getenv("OLLAMA_RESPONSE_FORMAT", "json_schema")
+# Chat requests allowed to run at once per worker; extra requests queue for a slot.
+CHAT_MAX_INFLIGHT = int(os.getenv("CHAT_MAX_INFLIGHT", "16"))
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "30"))
+# Threads used for blocking LLM rounds and tool calls (never run on the event loop).
+OFFLOAD_WORKERS = int(os.getenv("OFFLOAD_WORKERS", str(CHAT_MAX_INFLIGHT * 2)))
+# Tool calls from one model round that may run at once for a single request.
+TOOL_MAX_PARALLEL = int(os.getenv("TOOL_MAX_PARALLEL", "4"))
+# Database connections per worker: one per offload thread that can be inside a tool call
+# (at most CHAT_MAX_INFLIGHT × TOOL_MAX_PARALLEL), plus overflow for the background tasks.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(min(OFFLOAD_WORKERS, CHAT_MAX_INFLIGHT * TOOL_MAX_PARALLEL))))
+DB_POOL_OVERFLOW = int(os.getenv("DB_POOL_OVERFLOW", "10"))
+# How often the tool spec file is checked for changes (0 disables hot reload).
+TOOL_SPEC_RELOAD_SECONDS = float(os.getenv("TOOL_SPEC_RELOAD_SECONDS", "5"))
+# Pinned version: context caching needs one, and cached and uncached rounds must run the same model.
+GEMINI_MODEL = "gemini-2.0-flash-001"
+# Context caching of the static prompt prefix (system prompt + tool declarations).
+# Without an API key, or while the prefix is under the model's minimum cacheable size, rounds send the prefix.
+GEMINI_PROMPT_CACHE = os.getenv("GEMINI_PROMPT_CACHE", "1").lower() in ("1", "true", "yes")
+GEMINI_CACHE_MODEL = f"models/{GEMINI_MODEL}"
+GEMINI_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CACHE_MIN_TOKENS", "4096"))
+GEMINI_PROMPT_CACHE_TTL_SECONDS = float(os.getenv("GEMINI_PROMPT_CACHE_TTL_SECONDS", "3600"))
+# Response cache for /v1/chat (0 entries disables it).
+CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "600"))
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "512"))
+# How often the dashboard market snapshots are recomputed in the background.
+MARKET_SNAPSHOT_SECONDS = float(os.getenv("MARKET_SNAPSHOT_SECONDS", "60"))
+# How often the fuzzy name index checks its source tables for writes.
+NAME_INDEX_REFRESH_SECONDS = float(os.getenv("NAME_INDEX_REFRESH_SECONDS", "120"))
+# How often the ranking engine snapshot (RANKING_ENGINE=1) checks the inventory for writes.
+RANKING_REFRESH_SECONDS = float(os.getenv("RANKING_REFRESH_SECONDS", "60"))
+# Proactive price-drop matching: how often it runs and what counts as a drop (dld_price_delta_pct).
+PROACTIVE_SCAN_SECONDS = float(os.getenv("PROACTIVE_SCAN_SECONDS", "300"))
+PROACTIVE_DROP_PCT = float(os.getenv("PROACTIVE_DROP_PCT", "-20"))
+# How often generated PDFs past their age / size bounds are evicted.
+ARTIFACT_EVICT_SECONDS = float(os.getenv("ARTIFACT_EVICT_SECONDS", "600"))
+# Bulk document jobs: render processes (0 = one per core) and where job manifests live.
+DOCUMENT_RENDER_PROCESSES = int(os.getenv("DOCUMENT_RENDER_PROCESSES", "0"))
+DOCUMENT_JOBS_DIR = os.getenv("DOCUMENT_JOBS_DIR") or os.path.join(tempfile.gettempdir(), "lelwa-jobs")
+# WhatsApp sends and calls go through the outbox (0 = send inline in the request).
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "1").lower() in ("1", "true", "yes")
+# Outbox delivery threads per worker, attempts per item and the first retry delay (doubling).
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_SECONDS = float(os.getenv("OUTBOX_RETRY_SECONDS", "2"))
+# Threat-scoring state: sessions tracked per worker, idle expiry and score half-life.
+SHIELD_MAX_SESSIONS = int(os.getenv("SHIELD_MAX_SESSIONS", "100000"))
+SHIELD_SESSION_TTL_SECONDS = float(os.getenv("SHIELD_SESSION_TTL_SECONDS", "3600"))
+SHIELD_SCORE_HALF_LIFE_SECONDS = float(os.getenv("SHIELD_SCORE_HALF_LIFE_SECONDS", "300"))
+# Where threat-scoring state is shared (process | local | sqlite) and how often workers sync it.
+SHIELD_STATE_BACKEND = os.getenv("SHIELD_STATE_BACKEND", "process").lower()
+SHIELD_STATE_PATH = os.getenv("SHIELD_STATE_PATH")
+SHIELD_SYNC_SECONDS = float(os.getenv("SHIELD_SYNC_SECONDS", "1"))
+# How often expired resume tokens are deleted from the channel store.
+RESUME_TOKEN_GC_SECONDS = float(os.getenv("RESUME_TOKEN_GC_SECONDS", "3600"))
 
 
 def _init_engine():
     if not DATABASE_URL:
         return None
     try:
-        return create_engine(DATABASE_URL, pool_pre_ping=True)
+        return create_engine(DATABASE_URL, pool_pre_ping=True, pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_OVERFLOW)
     except Exception:
         return None
 
@@ -53,12 +144,25 @@ def _resolve_static_dir() -> str:
 
 
 engine = _init_engine()
+if engine is not None:
+    # Per-turn DB round-trip counts (see request_scope.py)
+    watch_engine(engine)
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 ollama_client = _OpenAI(base_url=OLLAMA_BASE_URL, api_key="ollama")
-shield = SecurityShield()
-executor = ToolExecutor(engine)
-MANUAL_TOOL_NAMES = {"send_whatsapp", "call_investor"}
+shield = SecurityShield(
+    max_sessions=SHIELD_MAX_SESSIONS,
+    session_ttl=SHIELD_SESSION_TTL_SECONDS,
+    half_life=SHIELD_SCORE_HALF_LIFE_SECONDS,
+    store=make_state_store(
+        SHIELD_STATE_BACKEND,
+        SHIELD_STATE_PATH,
+        SHIELD_SCORE_HALF_LIFE_SECONDS,
+        WINDOW_SECONDS,
+        SHIELD_SESSION_TTL_SECONDS,
+    ),
+    sync_interval=SHIELD_SYNC_SECONDS,
+)
 
 STATIC_DIR = _resolve_static_dir()
 try:
@@ -67,6 +171,66 @@ except Exception:
     STATIC_DIR = os.path.join(tempfile.gettempdir(), "lelwa-static")
     os.makedirs(STATIC_DIR, exist_ok=True)
 
+artifacts = ArtifactStore(
+    os.path.join(STATIC_DIR, "pdfs"),
+    ARTIFACT_BASE_URL,
+    max_bytes=ARTIFACT_MAX_BYTES,
+    max_age=ARTIFACT_MAX_AGE_SECONDS,
+    render_workers=PDF_RENDER_WORKERS,
+    wait=PDF_RENDER_WAIT_SECONDS,
+    evict_interval=ARTIFACT_EVICT_SECONDS,
+)
+executor = ToolExecutor(engine, artifacts=artifacts)
+# Threat signals come from the spec's governance section and follow its hot reload.
+shield.signals = ThreatSignals.from_spec(executor.registry.spec)
+executor.registry.on_reload(lambda registry: setattr(shield, "signals", ThreatSignals.from_spec(registry.spec)))
+prompt_cache = GeminiPromptCache(
+    GEMINI_CACHE_MODEL,
+    version=lambda: executor.registry.version,
+    prefix=lambda: (SYSTEM_PROMPT, executor.get_tool_definitions()),
+    ttl=GEMINI_PROMPT_CACHE_TTL_SECONDS,
+    renew_before=GEMINI_PROMPT_CACHE_TTL_SECONDS / 4,
+    interval=60 if GEMINI_PROMPT_CACHE and GEMINI_API_KEY else 0,
+    min_tokens=GEMINI_CACHE_MIN_TOKENS,
+)
+# A spec reload changes the tool declarations, so the cached prefix is rebuilt at once.
+executor.registry.on_reload(lambda registry: prompt_cache.task.trigger())
+bulk_documents = BulkDocumentJobs(executor, artifacts, DOCUMENT_JOBS_DIR, processes=DOCUMENT_RENDER_PROCESSES)
+outbox = Outbox(
+    executor,
+    CHANNEL_DB,
+    workers=OUTBOX_WORKERS if OUTBOX_ENABLED else 0,
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+    backoff=OUTBOX_RETRY_SECONDS,
+)
+market_snapshots = MarketSnapshotService(executor, interval=MARKET_SNAPSHOT_SECONDS)
+proactive_scanner = ProactiveScanner(engine, interval=PROACTIVE_SCAN_SECONDS, drop_pct=PROACTIVE_DROP_PCT)
+
+_offload_pool = ThreadPoolExecutor(max_workers=OFFLOAD_WORKERS, thread_name_prefix="lelwa-offload")
+_chat_slots = asyncio.Semaphore(CHAT_MAX_INFLIGHT)
+chat_cache = TTLCache(maxsize=CHAT_CACHE_MAX_ENTRIES, ttl=CHAT_CACHE_TTL_SECONDS)
+# How each model's final answers parsed, and their output tokens.
+output_stats = OutputStats()
+# Names of the tools run during the current chat turn (None outside a turn).
+_turn_tool_calls: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("turn_tool_calls", default=None)
+
+# Started with the app; each runs on its own daemon thread (see scheduler.py).
+BACKGROUND_TASKS = [
+    PeriodicTask("tool-spec-reload", TOOL_SPEC_RELOAD_SECONDS, executor.registry.reload_if_changed),
+    market_snapshots.task,
+    PeriodicTask("name-index", NAME_INDEX_REFRESH_SECONDS, executor.resolver.refresh, run_immediately=True),
+    proactive_scanner.task,
+    artifacts.task,
+    outbox.task,
+    shield.task,
+    prompt_cache.task,
+    PeriodicTask("resume-token-gc", RESUME_TOKEN_GC_SECONDS, purge_resume_tokens, run_immediately=True),
+]
+if executor.ranking is not None:
+    BACKGROUND_TASKS.append(
+        PeriodicTask("ranking-snapshot", RANKING_REFRESH_SECONDS, executor.ranking.refresh, run_immediately=True)
+    )
+
 app = FastAPI(title="Lelwa API", version="4.0.0")
 
 app.add_middleware(
@@ -133,6 +297,22 @@ def init_workflow_tables() -> None:
 init_workflow_tables()
 
 
+@app.on_event("startup")
+def _start_background_tasks() -> None:
+    for task in BACKGROUND_TASKS:
+        task.start()
+    outbox.start()
+
+
+@app.on_event("shutdown")
+def _stop_background_tasks() -> None:
+    for task in BACKGROUND_TASKS:
+        task.stop()
+    outbox.stop()
+    bulk_documents.close()
+    prompt_cache.close()
+
+
 # ── MODELS ─────────────────────────────────────────────────────────────────
 
 class ChatRequest(BaseModel):
@@ -148,6 +328,15 @@ class ToolRequest(BaseModel):
     args: Dict[str, Any]
     user_id: str = "default"
     session_id: Optional[str] = None
+    # Repeating a send with the same key (per user) returns the first one's outbox item.
+    idempotency_key: Optional[str] = None
+
+
+class BulkDocumentRequest(BaseModel):
+    document_type: str = "offer"
+    property_names: Optional[List[str]] = None
+    asset_ids: Optional[List[str]] = None
+    zip: bool = True
 
 
 class ChannelConfigRequest(BaseModel):
@@ -244,41 +433,26 @@ Broker, Market, Property, Schedule, Done, Activity, Action
 
 # ── RESPONSE PARSER ────────────────────────────────────────────────────────
 
+# An object with any of these keys is the prepared-work contract.
+_CONTRACT_KEYS = ("reply", "prepared_blocks", "prepared_actions")
+
+
 def _parse_broker_response(raw: str) -> dict:
-    """Extract structured JSON from LLM response. Three fallbacks, never crashes."""
+    """Extract structured JSON from LLM response (json_extract.py). Never crashes."""
     text = raw.strip()
 
-    # 1. Direct JSON
-    if text.startswith("{"):
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
+    # 1. Best JSON object: bare, fenced, wrapped in prose, or repaired if truncated
+    parsed = extract_object(text, prefer=_CONTRACT_KEYS)
+    # An unrelated object quoted inside prose is not the answer; the prose is.
+    if parsed is not None and (text.startswith(("{", "```")) or any(k in parsed for k in _CONTRACT_KEYS)):
+        return parsed
 
-    # 2. Fenced code block
-    m = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
-    if m:
-        try:
-            return json.loads(m.group(1))
-        except json.JSONDecodeError:
-            pass
+    # 2. Pull the "reply" string out of JSON that is broken mid-text
+    reply_val = extract_string(text, "reply")
+    if isinstance(reply_val, str) and reply_val.strip():
+        return {"reply": reply_val.strip(), "prepared_blocks": [], "prepared_actions": []}
 
-    # 3. Any JSON object containing prepared_blocks
-    m = re.search(r'\{.*?"prepared_blocks".*?\}', text, re.DOTALL)
-    if m:
-        try:
-            return json.loads(m.group(0))
-        except json.JSONDecodeError:
-            pass
-
-    # 4. Regex: pull "reply" value even from malformed / truncated JSON
-    m = re.search(r'"reply"\s*:\s*"((?:[^"\\]|\\.)*)"', text)
-    if m:
-        reply_val = m.group(1).encode().decode("unicode_escape", errors="replace")
-        if reply_val.strip():
-            return {"reply": reply_val.strip(), "prepared_blocks": [], "prepared_actions": []}
-
-    # 5. Last resort: use raw text (truncated) only if it doesn't look like JSON
+    # 3. Last resort: use raw text (truncated) only if it doesn't look like JSON
     short = text[:400] + ("…" if len(text) > 400 else "")
     if short.strip().startswith("{"):
         short = "Prepared reply ready."
@@ -297,23 +471,20 @@ def _ensure_prepared_contract(structured: dict, message: str) -> dict:
     reply_text = reply_text.strip()
 
     # If reply_text looks like JSON (tool-call / format bleed-through from Ollama),
-    # unwrap the inner "reply" value using JSON parse first, then regex fallback.
+    # unwrap the inner "reply" value with the same extractor (repairs truncation).
     for _ in range(3):
         if not reply_text.startswith("{"):
             break
         extracted = None
-        try:
-            inner = json.loads(reply_text)
+        inner = extract_object(reply_text, prefer=_CONTRACT_KEYS)
+        if inner is not None:
             inner_reply = inner.get("reply", "")
             if isinstance(inner_reply, str) and inner_reply.strip():
                 extracted = inner_reply.strip()
                 if not structured.get("prepared_blocks") and isinstance(inner.get("prepared_blocks"), list):
                     structured["prepared_blocks"] = inner["prepared_blocks"]
-        except json.JSONDecodeError:
-            # JSON may be truncated — use regex to pull out "reply": "..." value
-            m = re.search(r'"reply"\s*:\s*"((?:[^"\\]|\\.)*)"', reply_text)
-            if m:
-                extracted = m.group(1).encode().decode("unicode_escape", errors="replace")
+        else:
+            extracted = extract_string(reply_text, "reply")
         if extracted and extracted.strip() and not extracted.strip().startswith("{"):
             reply_text = extracted.strip()
         else:
@@ -374,9 +545,259 @@ def _ensure_prepared_contract(structured: dict, message: str) -> dict:
     return structured
 
 
+# ── OFFLOAD ────────────────────────────────────────────────────────────────
+
+async def _offload(fn, *args, **kwargs):
+    """
+    Run a blocking call (LLM round, tool call, DB query) on the bounded offload pool.
+    The caller's context variables travel with the call.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_offload_pool, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+@contextlib.asynccontextmanager
+async def _chat_slot():
+    """Hold one of CHAT_MAX_INFLIGHT chat slots; raises TimeoutError if none frees up in time."""
+    await asyncio.wait_for(_chat_slots.acquire(), timeout=CHAT_QUEUE_TIMEOUT_SECONDS)
+    try:
+        yield
+    finally:
+        _chat_slots.release()
+
+
+async def _run_tool_call(name: str, args: dict, session_id: str, user_id: str, assessment=None) -> Any:
+    """Execute one model-requested tool call off the event loop and apply shield degradation."""
+    turn_calls = _turn_tool_calls.get()
+    if turn_calls is not None:
+        turn_calls.append(name)
+    if name in MANUAL_TOOL_NAMES:
+        result = {"status": "manual_action_required"}
+    else:
+        result = await _offload(executor.execute, name, args, session_id, user_id=user_id)
+    if assessment is not None and assessment.threat_level != "clear":
+        result = shield.degrade_response(result, assessment)
+    return result
+
+
+async def _dispatch_tool_calls(
+    calls: list, session_id: str, user_id: str, assessment=None, on_event=None
+) -> list:
+    """
+    Run one model round's tool calls [(name, args), ...] concurrently,
+    at most TOOL_MAX_PARALLEL at a time. Stateful (@writes) tools act as barriers:
+    reads before them finish first, reads after them start later.
+    Results are returned in call order. `on_event`, if given, is awaited
+    with a progress event when each call starts and finishes.
+    """
+    slots = asyncio.Semaphore(TOOL_MAX_PARALLEL)
+
+    async def run(index: int, name: str, args: dict):
+        async with slots:
+            if on_event is not None:
+                await on_event({"type": "progress", "stage": "tool_started", "tool_name": name, "index": index})
+            started = time.perf_counter()
+            result = await _run_tool_call(name, args, session_id, user_id, assessment)
+            if on_event is not None:
+                await on_event({
+                    "type": "progress",
+                    "stage": "tool_finished",
+                    "tool_name": name,
+                    "index": index,
+                    "ok": not (isinstance(result, dict) and "error" in result),
+                    "ms": round((time.perf_counter() - started) * 1000, 1),
+                })
+            return result
+
+    results: list = []
+    batch: list = []
+    for index, (name, args) in enumerate(calls):
+        if name in executor.registry.stateful_tools:
+            results.extend(await asyncio.gather(*(run(*c) for c in batch)))
+            batch = []
+            results.append(await run(index, name, args))
+        else:
+            batch.append((index, name, args))
+    results.extend(await asyncio.gather(*(run(*c) for c in batch)))
+    return results
+
+
+# ── GEMINI CHAT ────────────────────────────────────────────────────────────
+
+_gemini_models: Dict[tuple, Any] = {}
+
+
+def _gemini_model(structured: bool = False, use_cache: bool = True):
+    """
+    Process-wide Gemini model built from the current tool registry.
+    Rebuilt only when the registry version changes (spec hot reload).
+    `structured` is the tool-less variant constrained to the prepared-work
+    response schema: Gemini does not combine function calling with a JSON
+    response mode, so it serves the re-ask after the tool loop.
+    The tool-calling model comes from the prompt cache while it is live,
+    unless `use_cache` is False.
+    """
+    if not structured and use_cache:
+        cached = prompt_cache.model()
+        if cached is not None:
+            return cached
+    version = executor.registry.version
+    model = _gemini_models.get((version, structured))
+    if model is None:
+        if structured:
+            model = genai.GenerativeModel(
+                model_name=GEMINI_MODEL,
+                system_instruction=SYSTEM_PROMPT,
+                generation_config=genai.GenerationConfig(
+                    response_mime_type="application/json",
+                    response_schema=executor.registry.gemini_response_schema,
+                ),
+            )
+        else:
+            model = genai.GenerativeModel(
+                model_name=GEMINI_MODEL,
+                system_instruction=SYSTEM_PROMPT,
+                tools=executor.get_tool_definitions(),
+            )
+        for key in [k for k in _gemini_models if k[0] != version]:
+            del _gemini_models[key]
+        _gemini_models[(version, structured)] = model
+    return model
+
+
+def _gemini_output_tokens(response) -> int:
+    usage = getattr(response, "usage_metadata", None)
+    return int(getattr(usage, "candidates_token_count", 0) or 0)
+
+
+def _text_parts(response) -> list:
+    try:
+        parts = response.candidates[0].content.parts
+    except (AttributeError, IndexError):
+        return []
+    return [p.text for p in parts if getattr(p, "text", "")]
+
+
+async def _stream_gemini_round(chat, content, on_text):
+    """
+    One streamed send_message round. Chunks are pulled on the offload pool and
+    awaited on `on_text` on the event loop as they arrive. Returns the resolved
+    response (function calls and full text available as with a blocking round).
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def pump():
+        try:
+            response = chat.send_message(content, stream=True)
+            for chunk in response:
+                for piece in _text_parts(chunk):
+                    loop.call_soon_threadsafe(queue.put_nowait, ("text", piece))
+            loop.call_soon_threadsafe(queue.put_nowait, ("done", response))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+
+    pumping = asyncio.ensure_future(_offload(pump))
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "text":
+                await on_text(value)
+            elif kind == "error":
+                raise value
+            else:
+                return value
+    finally:
+        await pumping
+
+
+async def _chat_with_gemini(
+    chat, message: str, session_id: str, user_id: str, assessment=None, on_event=None
+) -> str:
+    """
+    Full tool-call loop (max 5 rounds, data tools only) on a Gemini chat session.
+    Every send_message round and tool call runs on the offload pool.
+    With `on_event`, rounds are streamed and it is awaited with round/tool
+    progress events and {"type": "text"} chunks as they happen.
+    Returns the final raw text response from the model.
+    """
+    rounds = 0
+    output_tokens = 0
+
+    async def send(content):
+        nonlocal rounds, output_tokens
+        rounds += 1
+        if on_event is not None:
+            await on_event({"type": "progress", "stage": "round_started", "round": rounds})
+        cache_name = getattr(getattr(chat, "model", None), "cached_content", None)
+        cached = cache_name is not None
+        try:
+            response, round_ms, first_token_ms = await send_round(content)
+        except (google_exceptions.NotFound, google_exceptions.PermissionDenied,
+                google_exceptions.InvalidArgument) as e:
+            if not cached:
+                raise
+            # The cached prefix is gone or rejected: continue this chat on the uncached model.
+            # Rate limits and server errors are not the cache's fault and propagate as usual.
+            prompt_cache.invalidate(e, cache_name)
+            chat.model = _gemini_model(use_cache=False)
+            cached = False
+            response, round_ms, first_token_ms = await send_round(content)
+        prompt_cache.record_round(response, cached, round_ms, first_token_ms)
+        output_tokens += _gemini_output_tokens(response)
+        return response
+
+    async def send_round(content):
+        started = time.perf_counter()
+        if on_event is None:
+            response = await _offload(chat.send_message, content)
+            return response, (time.perf_counter() - started) * 1000, None
+        first_token_at = None
+
+        async def on_text(piece):
+            nonlocal first_token_at
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            await on_event({"type": "text", "text": piece})
+
+        response = await _stream_gemini_round(chat, content, on_text)
+        first_token_ms = (first_token_at - started) * 1000 if first_token_at is not None else None
+        return response, (time.perf_counter() - started) * 1000, first_token_ms
+
+    response = await send(message)
+
+    for _ in range(5):
+        if not response.candidates or not response.candidates[0].content.parts:
+            break
+        calls = [
+            p.function_call
+            for p in response.candidates[0].content.parts
+            if hasattr(p, "function_call") and p.function_call.name
+        ]
+        if not calls:
+            break
+
+        results = await _dispatch_tool_calls(
+            [(call.name, dict(call.args)) for call in calls], session_id, user_id, assessment, on_event
+        )
+        tool_responses = [
+            genai.protos.Part(
+                function_response=genai.protos.FunctionResponse(
+                    name=call.name,
+                    response={"result": json.dumps(result, default=str)},
+                )
+            )
+            for call, result in zip(calls, results)
+        ]
+        response = await send(genai.protos.Content(parts=tool_responses))
+
+    return await _structured_answer("gemini", GEMINI_MODEL, message, getattr(response, "text", "") or "", output_tokens)
+
+
 # ── OLLAMA CHAT ────────────────────────────────────────────────────────────
 
-def _chat_with_ollama(message: str, session_id: str, user_id: str, assessment, model: str | None = None) -> str:
+async def _chat_with_ollama(message: str, session_id: str, user_id: str, assessment, model: str | None = None) -> str:
     """
     Full tool-call loop against the local Ollama instance.
     Uses Ollama's OpenAI-compatible API at OLLAMA_BASE_URL.
@@ -390,9 +811,11 @@ def _chat_with_ollama(message: str, session_id: str, user_id: str, assessment, m
     ]
     openai_tools = executor.get_openai_tool_definitions()
     last_content = ""
+    output_tokens = 0
 
     for _ in range(5):
-        response = ollama_client.chat.completions.create(
+        response = await _offload(
+            ollama_client.chat.completions.create,
             model=ollama_model,
             messages=messages,
             tools=openai_tools,
@@ -400,6 +823,7 @@ def _chat_with_ollama(message: str, session_id: str, user_id: str, assessment, m
         )
         choice = response.choices[0]
         last_content = choice.message.content or ""
+        output_tokens += getattr(response.usage, "completion_tokens", 0) or 0
 
         if not choice.message.tool_calls:
             break
@@ -419,30 +843,110 @@ def _chat_with_ollama(message: str, session_id: str, user_id: str, assessment, m
             "tool_calls": tool_calls_serialized,
         })
 
-        # Execute each tool call and append results
-        for tc in choice.message.tool_calls:
-            args = json.loads(tc.function.arguments or "{}")
-            if tc.function.name in MANUAL_TOOL_NAMES:
-                result = {"status": "manual_action_required"}
-            else:
-                result = executor.execute(tc.function.name, args, session_id, user_id=user_id)
-            if assessment.threat_level != "clear":
-                result = shield.degrade_response(result, assessment)
+        # Execute the round's tool calls concurrently and append results in call order
+        results = await _dispatch_tool_calls(
+            [(tc.function.name, json.loads(tc.function.arguments or "{}")) for tc in choice.message.tool_calls],
+            session_id,
+            user_id,
+            assessment,
+        )
+        for tc, result in zip(choice.message.tool_calls, results):
             messages.append({
                 "role": "tool",
                 "tool_call_id": tc.id,
                 "content": json.dumps(result, default=str),
             })
 
-    return last_content
+    return await _structured_answer("ollama", ollama_model, message, last_content, output_tokens)
+
+
+# ── STRUCTURED OUTPUT ──────────────────────────────────────────────────────
+
+_REASK_PROMPT = (
+    "Broker request:\n{message}\n\n"
+    "Your answer:\n{draft}\n\n"
+    "Return this answer as the prepared-work JSON object only."
+)
+
+
+def _answer_outcome(raw: str) -> str:
+    """find_object's outcome for a final answer, or "fallback" when it holds no contract object."""
+    parsed, outcome = find_object(raw.strip(), prefer=_CONTRACT_KEYS)
+    if parsed is None or not any(k in parsed for k in _CONTRACT_KEYS):
+        return "fallback"
+    return outcome
+
+
+def _reask_gemini(message: str, draft: str) -> tuple:
+    response = _gemini_model(structured=True).generate_content(_REASK_PROMPT.format(message=message, draft=draft))
+    return getattr(response, "text", "") or "", _gemini_output_tokens(response)
+
+
+def _reask_ollama(model: str, message: str, draft: str) -> tuple:
+    if OLLAMA_RESPONSE_FORMAT == "json_object":
+        response_format = {"type": "json_object"}
+    else:
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {"name": "prepared_work", "schema": executor.registry.response_schema},
+        }
+    response = ollama_client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": _REASK_PROMPT.format(message=message, draft=draft)},
+        ],
+        response_format=response_format,
+    )
+    return response.choices[0].message.content or "", getattr(response.usage, "completion_tokens", 0) or 0
+
+
+async def _structured_answer(provider: str, model: str, message: str, raw: str, output_tokens: int) -> str:
+    """
+    Record how a turn's final answer parsed (output_stats). With
+    STRUCTURED_OUTPUT, an answer that needed repair or has no JSON is re-asked
+    once, tool-less and schema-constrained, with the draft as context; the
+    re-ask replaces it only if it parses cleanly.
+    """
+    outcome = _answer_outcome(raw)
+    output_stats.record(model, outcome, output_tokens)
+    if not STRUCTURED_OUTPUT or outcome in ("clean", "wrapped"):
+        return raw
+    try:
+        if provider == "gemini":
+            text, tokens = await _offload(_reask_gemini, message, raw)
+        else:
+            text, tokens = await _offload(_reask_ollama, model, message, raw)
+    except Exception:
+        # The draft still goes through the usual repair and fallbacks.
+        output_stats.record_reask(model, "fallback", 0)
+        return raw
+    reask_outcome = _answer_outcome(text)
+    output_stats.record_reask(model, reask_outcome, tokens)
+    return text if reask_outcome in ("clean", "wrapped") else raw
 
 
 # ── ENDPOINTS ──────────────────────────────────────────────────────────────
 
+def _normalize_message(message: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the answer."""
+    return " ".join(message.lower().split()).strip(" .!?")
+
+
+def _chat_cache_key(message: str, route: tuple, data_version: str) -> str:
+    raw = json.dumps([_normalize_message(message), list(route), data_version])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
 @app.post("/v1/chat")
 async def chat_endpoint(req: ChatRequest, request: Request):
     """
     Main work feed entry point.
+    At most CHAT_MAX_INFLIGHT requests run per worker; LLM rounds and tool
+    calls are offloaded so the event loop stays free for other requests.
+    Answers are cached by (normalized message, routed model, inventory data
+    version) for clear sessions; a hit skips the model entirely. Tools in one
+    turn share a request scope, so each property row is fetched once.
 
     Response contract:
       reply            str
@@ -451,6 +955,8 @@ async def chat_endpoint(req: ChatRequest, request: Request):
       artifacts        []
       session_id       str
       threat_level     str
+      cached           bool
+      db_round_trips   int   database statements this turn issued
       timestamp        str
     """
     sig = RequestSignature(
@@ -462,76 +968,56 @@ async def chat_endpoint(req: ChatRequest, request: Request):
     )
     assessment = shield.evaluate_request(sig)
     try:
-        # Route: anything that's not "gemini" (or empty) goes to local Ollama.
-        # Pass the requested model name through so the canvas can pick llama3.2 vs deepseek-r1.
-        _GEMINI_IDS = {"gemini", "gemini-2.0-flash", None, ""}
-        if req.model not in _GEMINI_IDS:
-            # "ollama" / "local" → env default; named models pass through literally
-            ollama_model_override = req.model if req.model not in ("ollama", "local") else None
-            raw_text = _chat_with_ollama(req.message, req.session_id, req.user_id, assessment, ollama_model_override)
-        else:
-            model = genai.GenerativeModel(
-                model_name="gemini-2.0-flash",
-                system_instruction=SYSTEM_PROMPT,
-                tools=executor.get_tool_definitions(),
-            )
+        with request_scope() as scope:
+            # Route: anything that's not "gemini" (or empty) goes to local Ollama.
+            # Pass the requested model name through so the canvas can pick llama3.2 vs deepseek-r1.
+            _GEMINI_IDS = {"gemini", "gemini-2.0-flash", GEMINI_MODEL, None, ""}
+            if req.model not in _GEMINI_IDS:
+                # "ollama" / "local" → env default; named models pass through literally
+                ollama_model_override = req.model if req.model not in ("ollama", "local") else None
+                route = ("ollama", ollama_model_override or OLLAMA_MODEL)
+            else:
+                route = ("gemini", GEMINI_MODEL)
 
-            chat = model.start_chat(history=[])
-            response = chat.send_message(req.message)
+            # Degraded sessions neither read nor fill the cache: their tool data differs.
+            cache_key = None
+            if assessment.threat_level == "clear":
+                cache_key = _chat_cache_key(req.message, route, await _offload(executor.data_version))
+            cached = chat_cache.get(cache_key) if cache_key else MISSING
 
-            # Tool-call loop (max 5 rounds, data tools only)
-            for _ in range(5):
-                if not response.candidates or not response.candidates[0].content.parts:
-                    break
-                has_func = any(
-                    hasattr(p, "function_call") and p.function_call.name
-                    for p in response.candidates[0].content.parts
-                )
-                if not has_func:
-                    break
-
-                tool_responses = []
-                for part in response.candidates[0].content.parts:
-                    if hasattr(part, "function_call") and part.function_call.name:
-                        call = part.function_call
-                        if call.name in MANUAL_TOOL_NAMES:
-                            result = {"status": "manual_action_required"}
-                        else:
-                            result = executor.execute(
-                                call.name, dict(call.args), req.session_id, user_id=req.user_id
-                            )
-                        if assessment.threat_level != "clear":
-                            result = shield.degrade_response(result, assessment)
-                        tool_responses.append(
-                            genai.protos.Part(
-                                function_response=genai.protos.FunctionResponse(
-                                    name=call.name,
-                                    response={"result": json.dumps(result, default=str)},
-                                )
-                            )
+            if cached is not MISSING:
+                parsed = copy.deepcopy(cached)
+            else:
+                tool_calls: list = []
+                _turn_tool_calls.set(tool_calls)
+                async with _chat_slot():
+                    if route[0] == "ollama":
+                        raw_text = await _chat_with_ollama(
+                            req.message, req.session_id, req.user_id, assessment, ollama_model_override
                         )
-
-                if not tool_responses:
-                    break
-                response = chat.send_message(genai.protos.Content(parts=tool_responses))
-
-            raw_text = getattr(response, "text", "") or ""
-
-        structured = _ensure_prepared_contract(
-            _parse_broker_response(raw_text),
-            req.message,
-        )
-        return {
-            "reply": structured.get("reply", raw_text),
-            "prepared_blocks": structured.get("prepared_blocks", []),
-            "prepared_actions": structured.get("prepared_actions", []),
-            "artifacts": structured.get("artifacts", []),
-            "session_id": req.session_id,
-            "threat_level": assessment.threat_level,
-            "timestamp": datetime.now().isoformat(),
-        }
+                    else:
+                        chat = _gemini_model().start_chat(history=[])
+                        raw_text = await _chat_with_gemini(chat, req.message, req.session_id, req.user_id, assessment)
+                parsed = _parse_broker_response(raw_text)
+                # Turns that wrote state (profile updates, token status) are not replayable.
+                if cache_key and raw_text.strip() and not executor.registry.stateful_tools.intersection(tool_calls):
+                    chat_cache.set(cache_key, copy.deepcopy(parsed))
+
+            structured = _ensure_prepared_contract(parsed, req.message)
+            return {
+                "reply": structured.get("reply", ""),
+                "prepared_blocks": structured.get("prepared_blocks", []),
+                "prepared_actions": structured.get("prepared_actions", []),
+                "artifacts": structured.get("artifacts", []),
+                "session_id": req.session_id,
+                "threat_level": assessment.threat_level,
+                "cached": cached is not MISSING,
+                "db_round_trips": scope.round_trips,
+                "timestamp": datetime.now().isoformat(),
+            }
     except Exception:
-        # Keep studio flow alive even when model or data providers are unavailable.
+        # Keep studio flow alive even when model or data providers are unavailable
+        # (or every chat slot stayed busy past CHAT_QUEUE_TIMEOUT_SECONDS).
         fallback = _ensure_prepared_contract(
             _parse_broker_response("Prepared reply ready."),
             req.message,
@@ -564,21 +1050,47 @@ async def list_channels(user_id: str = "default"):
     return list_user_channels(user_id)
 
 
+async def _enqueue_send(
+    tool_name: str, args: dict, session_id: str, user_id: str, idempotency_key: Optional[str]
+) -> dict:
+    """Preflight the channel, then queue the send in the outbox; returns the preflight or the queued item."""
+    preflight = await _offload(executor.preflight, tool_name, args, user_id)
+    if preflight:
+        return preflight
+    item = await _offload(outbox.enqueue, user_id, session_id, tool_name, args, idempotency_key)
+    return {
+        "status": "queued",
+        "outbox_id": item["id"],
+        "outbox_status": item["status"],
+        "status_url": f"/v1/outbox/{item['id']}?user_id={quote(user_id, safe='')}",
+    }
+
+
 @app.post("/v1/tools/{tool_name}")
-async def run_tool(tool_name: str, req: ToolRequest):
+async def run_tool(tool_name: str, req: ToolRequest, idempotency_key: Optional[str] = Header(None)):
     """
     Direct tool execution.
     If the tool needs a channel that is not connected, returns:
       {requires_connection: true, resume_token, channel, prompt, fields}
     The frontend stores the token and opens the Connect Sheet.
     After the broker connects, the frontend calls /v1/actions/resume.
+    send_whatsapp and call_investor are queued in the outbox and return
+    {status: "queued", outbox_id, status_url} (Idempotency-Key header or
+    idempotency_key field dedupes retries).
     """
-    result = executor.execute(
-        tool_name,
-        req.args,
-        session_id=req.session_id or "direct",
-        user_id=req.user_id,
-    )
+    if OUTBOX_ENABLED and tool_name in OUTBOX_TOOLS:
+        result = await _enqueue_send(
+            tool_name, req.args, req.session_id or "direct", req.user_id, req.idempotency_key or idempotency_key
+        )
+    else:
+        with request_scope():
+            result = await _offload(
+                executor.execute,
+                tool_name,
+                req.args,
+                session_id=req.session_id or "direct",
+                user_id=req.user_id,
+            )
     # Attach a resume token so the frontend can resume after connecting
     if result.get("requires_connection"):
         token = create_resume_token(
@@ -591,6 +1103,45 @@ async def run_tool(tool_name: str, req: ToolRequest):
     return result
 
 
+@app.post("/v1/documents/bulk", status_code=202)
+async def bulk_documents_start(req: BulkDocumentRequest):
+    """
+    Start a bulk document job for up to BULK_DOCUMENT_MAX listings (by
+    asset_ids or property_names). Poll GET /v1/documents/bulk/{job_id} for
+    progress; the finished manifest lists each PDF URL and, with zip=true,
+    a zip_url for the whole set.
+    """
+    if engine is None:
+        raise HTTPException(status_code=503, detail="Database not configured")
+    if req.document_type not in BULK_DOCUMENT_TYPES:
+        raise HTTPException(status_code=400, detail=f"document_type must be one of {', '.join(BULK_DOCUMENT_TYPES)}")
+    listings = req.asset_ids if req.asset_ids is not None else req.property_names
+    if not listings:
+        raise HTTPException(status_code=400, detail="Provide asset_ids or property_names")
+    if len(listings) > BULK_DOCUMENT_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_DOCUMENT_MAX} listings per job")
+    job = bulk_documents.submit(req.document_type, req.property_names, req.asset_ids, make_zip=req.zip)
+    return {**job, "status_url": f"/v1/documents/bulk/{job['job_id']}"}
+
+
+@app.get("/v1/documents/bulk/{job_id}")
+async def bulk_documents_status(job_id: str):
+    """Progress and results of a bulk document job (works from any worker on the host)."""
+    job = await _offload(bulk_documents.status, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/v1/outbox/{outbox_id}")
+async def outbox_status(outbox_id: str, user_id: str = "default"):
+    """Delivery status of a queued send: queued | sending | sent | failed | blocked, attempts, result."""
+    item = await _offload(outbox.get, outbox_id, user_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Outbox item not found")
+    return item
+
+
 @app.post("/v1/actions/resume")
 async def resume_action(req: ResumeRequest):
     """
@@ -605,19 +1156,26 @@ async def resume_action(req: ResumeRequest):
             detail="resume_token not found or already used",
         )
 
-    result = executor.execute(
-        pending["tool_name"],
-        pending["args"],
-        session_id=pending["session_id"],
-        user_id=pending["user_id"],
-    )
+    if OUTBOX_ENABLED and pending["tool_name"] in OUTBOX_TOOLS:
+        # The token is single-use, so it doubles as the idempotency key.
+        result = await _enqueue_send(
+            pending["tool_name"], pending["args"], pending["session_id"], pending["user_id"], req.resume_token
+        )
+    else:
+        result = await _offload(
+            executor.execute,
+            pending["tool_name"],
+            pending["args"],
+            session_id=pending["session_id"],
+            user_id=pending["user_id"],
+        )
 
     if result.get("requires_connection"):
         # Credentials were stored but still not passing preflight (e.g. wrong values)
         return {"status": "still_blocked", "detail": result}
 
     return {
-        "status": "executed",
+        "status": "queued" if result.get("outbox_id") else "executed",
         "tool_name": pending["tool_name"],
         "result": result,
     }
@@ -828,6 +1386,52 @@ async def log_workflow_history(workflow_id: str, req: WorkflowRunLogRequest):
 async def health_check():
     return {"status": "ok"}
 
+
+@app.get("/v1/metrics")
+async def metrics():
+    """In-process counters for this worker (caches, background jobs)."""
+    return {
+        "chat_cache": chat_cache.stats(),
+        "tool_memo": executor.memo_stats(),
+        "market_snapshots": market_snapshots.stats(),
+        "name_index": executor.resolver.stats(),
+        "ranking_engine": executor.ranking.stats() if executor.ranking is not None else None,
+        "request_scopes": request_scope_totals(),
+        "proactive_scan": proactive_scanner.stats(),
+        "artifacts": artifacts.stats(),
+        "bulk_documents": bulk_documents.stats(),
+        "outbox": outbox.stats(),
+        "channel_store": channel_store_stats(),
+        "shield": shield.stats(),
+        "model_output": output_stats.stats(),
+        "gemini_prompt_cache": prompt_cache.stats(),
+        "twilio": {**executor.twilio.stats(), "throttle_wait_s": round(executor.sender_throttle.waited, 2)},
+        "background_tasks": {task.name: task.stats() for task in BACKGROUND_TASKS},
+        "timestamp": datetime.now().isoformat(),
+    }
+
+@app.get("/v1/autocomplete")
+async def autocomplete(q: str, kind: str = "property", limit: int = 8):
+    """
+    Ranked name suggestions from the in-memory name index (see resolver.py).
+    kind: property | project | area. Property results carry `key` = asset_id,
+    which the property tools accept as `asset_id` for an exact lookup.
+    """
+    if kind not in ("property", "project", "area"):
+        raise HTTPException(status_code=400, detail="kind must be property, project or area")
+    limit = max(1, min(limit, 25))
+    # Over-fetch, then keep one suggestion per displayed name (areas and projects come from two tables).
+    matches = await _offload(executor.resolver.search, kind, q, limit * 2)
+    results, seen = [], set()
+    for match in matches:
+        label = match["name"].strip().lower()
+        if label in seen:
+            continue
+        seen.add(label)
+        results.append(match)
+    return {"query": q, "kind": kind, "results": results[:limit], "ready": executor.resolver.ready}
+
+
 @app.get("/v1/profile/{session_id}")
 async def get_profile(session_id: str):
     try:
@@ -841,139 +1445,150 @@ async def get_profile(session_id: str):
         return {"status": "new_user"}
 
 
+async def _snapshot_response(request: Request, name: str, fallback: dict):
+    """
+    Serve a market snapshot with its ETag; 304 when the client already has it.
+    Falls back to `fallback` (uncached) when no snapshot could be computed.
+    """
+    snap = await _offload(market_snapshots.get, name)
+    if snap is None:
+        return {**fallback, "generated_at": fallback["timestamp"]}
+    headers = {
+        "ETag": snap.etag,
+        "Cache-Control": f"no-cache, stale-while-revalidate={int(MARKET_SNAPSHOT_SECONDS)}",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if snap.etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(snap.body(), headers=headers)
+
+
 @app.get("/v1/market/overview")
-async def market_overview():
-    try:
-        with engine.connect() as conn:
-            res = conn.execute(text("SELECT * FROM get_market_overview()")).fetchone()
-            if not res:
-                raise ValueError("overview query returned no rows")
-            return dict(res._mapping)
-    except Exception:
-        return {
-            "regime": "TRANSITIONAL",
-            "directive": "SELECTIVE_BUY",
-            "market_efficiency_score": 65.0,
-            "areas_tracked": 0,
-            "timestamp": datetime.now().isoformat(),
-        }
+async def market_overview(request: Request):
+    """Market overview from the background-refreshed snapshot (see snapshots.py)."""
+    return await _snapshot_response(request, "overview", {
+        "regime": "TRANSITIONAL",
+        "directive": "SELECTIVE_BUY",
+        "market_efficiency_score": 65.0,
+        "areas_tracked": 0,
+        "timestamp": datetime.now().isoformat(),
+    })
 
 
 @app.get("/v1/market/pulse")
-async def market_pulse():
-    """Returns live market pulse from the data spine."""
-    try:
-        return executor.execute("get_market_pulse", {}, session_id="system")
-    except Exception:
-        return {
-            "regime": "TRANSITIONAL",
-            "directive": "SELECTIVE_BUY",
-            "market_efficiency_score": 65.0,
-            "hypergrowth_areas": [],
-            "top_cities": [],
-            "timestamp": datetime.now().isoformat(),
-        }
+async def market_pulse(request: Request):
+    """Returns the market pulse from the data spine, served from the background-refreshed snapshot."""
+    return await _snapshot_response(request, "pulse", {
+        "regime": "TRANSITIONAL",
+        "directive": "SELECTIVE_BUY",
+        "market_efficiency_score": 65.0,
+        "hypergrowth_areas": [],
+        "top_cities": [],
+        "timestamp": datetime.now().isoformat(),
+    })
 
 
 @app.post("/v1/outreach/trigger")
 async def trigger_outreach(background_tasks: BackgroundTasks):
-    background_tasks.add_task(_run_proactive_scan)
+    """Run the proactive price-drop scan now instead of waiting for its schedule (see proactive.py)."""
+    if engine is None:
+        return {"status": "scan_skipped", "reason": "database not configured"}
+    if proactive_scanner.task.interval > 0:
+        proactive_scanner.task.trigger()
+    else:
+        background_tasks.add_task(proactive_scanner.task.run_once)
     return {"status": "scan_initiated"}
 
 
-def _run_proactive_scan():
+@app.get("/v1/outreach/matches")
+async def outreach_matches(
+    session_id: Optional[str] = None, status: Optional[str] = None, before: Optional[str] = None, limit: int = 50
+):
     """
-    Scans for price-dropped properties and returns matching leads.
-    Messages are NOT sent automatically — results are logged for
-    the broker to review and act on from the console.
+    Price-drop matches persisted by the proactive scan, most recently
+    (re-)matched first. Page with `before` = the previous response's
+    `next_before`. Nothing is sent to leads; the broker acts on these from
+    the console.
     """
-    results = []
     if engine is None:
-        return results
+        raise HTTPException(status_code=503, detail="Database not configured")
+    limit = max(1, min(limit, 200))
     try:
-        with engine.connect() as conn:
-            drops = conn.execute(
-                text(
-                    "SELECT name, area, final_price_from FROM entrestate_inventory "
-                    "WHERE dld_price_delta_pct < -20 LIMIT 5"
-                )
-            ).fetchall()
-            for drop in drops:
-                matches = conn.execute(
-                    text(
-                        "SELECT session_id FROM investor_intent_profiles "
-                        "WHERE budget_max >= :price "
-                        "AND (preferred_areas ILIKE :area OR preferred_areas IS NULL)"
-                    ),
-                    {"price": drop.final_price_from, "area": f"%{drop.area}%"},
-                ).fetchall()
-                for m in matches:
-                    results.append({
-                        "property": drop.name,
-                        "area": drop.area,
-                        "price": drop.final_price_from,
-                        "session_id": m.session_id,
-                    })
-    except Exception:
-        return []
-    return results
+        return await _offload(proactive_scanner.page, session_id, status, before, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="before must be a next_before cursor")
+
+
+def _stream_frame(kind: str, value, session_id: str) -> dict:
+    key = {"reply_delta": "text", "reply": "reply", "block": "block", "action": "action"}[kind]
+    return {"type": kind, key: value, "session_id": session_id}
 
 
 @app.websocket("/v1/chat/stream/{session_id}")
 async def websocket_chat(websocket: WebSocket, session_id: str):
     """
-    Streaming chat over WebSocket.
-    Collects the full LLM response, parses it through the same structured
-    contract as /v1/chat, and sends the final JSON.
+    Streaming chat over WebSocket. Frames sent per message:
+      progress     round_started / tool_started / tool_finished, as they happen
+      reply_delta  reply text as the model writes it
+      reply        the full reply once its string closes
+      block        each prepared_blocks entry the moment its object closes
+      action       each prepared_actions entry the moment its object closes
+      result       the full response after _ensure_prepared_contract, same
+                   shape as before, plus timings {first_block_ms, total_ms}
+                   and db_round_trips; "degraded": true when no chat slot
+                   freed up within CHAT_QUEUE_TIMEOUT_SECONDS
     """
     await websocket.accept()
-    model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash",
-        system_instruction=SYSTEM_PROMPT,
-        tools=executor.get_tool_definitions(),
-    )
-    chat_session = model.start_chat(history=[])
+    chat_session = _gemini_model().start_chat(history=[])
     try:
         while True:
             user_msg = await websocket.receive_text()
-            response = chat_session.send_message(user_msg)
-
-            # Tool-call loop (max 5 rounds, data tools only)
-            for _ in range(5):
-                if not response.candidates or not response.candidates[0].content.parts:
-                    break
-                has_func = any(
-                    hasattr(p, "function_call") and p.function_call.name
-                    for p in response.candidates[0].content.parts
-                )
-                if not has_func:
-                    break
-
-                tool_responses = []
-                for part in response.candidates[0].content.parts:
-                    if hasattr(part, "function_call") and part.function_call.name:
-                        call = part.function_call
-                        if call.name in MANUAL_TOOL_NAMES:
-                            result = {"status": "manual_action_required"}
-                        else:
-                            result = executor.execute(
-                                call.name, dict(call.args), session_id, user_id="default"
-                            )
-                        tool_responses.append(
-                            genai.protos.Part(
-                                function_response=genai.protos.FunctionResponse(
-                                    name=call.name,
-                                    response={"result": json.dumps(result, default=str)},
-                                )
-                            )
+            # The session outlives prompt-cache renewals and spec reloads: pick up the current model.
+            chat_session.model = _gemini_model()
+            started = time.perf_counter()
+            first_block_ms = None
+            parser = PreparedStreamParser()
+
+            async def on_event(event: dict) -> None:
+                nonlocal parser, first_block_ms
+                if event["type"] == "text":
+                    for kind, value in parser.feed(event["text"]):
+                        if first_block_ms is None and kind in ("block", "action"):
+                            first_block_ms = round((time.perf_counter() - started) * 1000, 1)
+                        await websocket.send_json(_stream_frame(kind, value, session_id))
+                    return
+                if event.get("stage") == "round_started":
+                    # Only the round that ends the tool loop carries the answer.
+                    parser = PreparedStreamParser()
+                await websocket.send_json({**event, "session_id": session_id})
+
+            try:
+                with request_scope() as scope:
+                    async with _chat_slot():
+                        raw_text = await _chat_with_gemini(
+                            chat_session, user_msg, session_id, "default", on_event=on_event
                         )
-                if not tool_responses:
-                    break
-                response = chat_session.send_message(
-                    genai.protos.Content(parts=tool_responses)
+            except TimeoutError:
+                # Every chat slot stayed busy past CHAT_QUEUE_TIMEOUT_SECONDS: answer like
+                # /v1/chat does and keep the socket open for the next message.
+                fallback = _ensure_prepared_contract(
+                    _parse_broker_response("Prepared reply ready."),
+                    user_msg,
                 )
-
-            raw_text = getattr(response, "text", "") or ""
+                await websocket.send_json({
+                    "type": "result",
+                    "reply": fallback.get("reply", "Prepared reply ready."),
+                    "prepared_blocks": fallback.get("prepared_blocks", []),
+                    "prepared_actions": fallback.get("prepared_actions", []),
+                    "session_id": session_id,
+                    "degraded": True,
+                    "timings": {
+                        "first_block_ms": None,
+                        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+                    },
+                    "timestamp": datetime.now().isoformat(),
+                })
+                continue
             structured = _ensure_prepared_contract(
                 _parse_broker_response(raw_text),
                 user_msg,
@@ -985,6 +1600,11 @@ async def websocket_chat(websocket: WebSocket, session_id: str):
                 "prepared_blocks": structured.get("prepared_blocks", []),
                 "prepared_actions": structured.get("prepared_actions", []),
                 "session_id": session_id,
+                "timings": {
+                    "first_block_ms": first_block_ms,
+                    "total_ms": round((time.perf_counter() - started) * 1000, 1),
+                },
+                "db_round_trips": scope.round_trips,
                 "timestamp": datetime.now().isoformat(),
             })
     except WebSocketDisconnect:
@@ -0,0 +1,245 @@
+"""
+Pooled Twilio clients and throttled WhatsApp broadcasts.
+
+TwilioClientPool keeps one twilio.rest.Client per account_sid, so repeated
+sends reuse the client's HTTP session (keep-alive connections, no new TLS
+handshake per message). An entry remembers a hash of the auth token it was
+built with and is rebuilt when the stored credentials change; channels.py
+also notifies the pool when credentials are saved, so stale clients are
+dropped right away in the worker that saved them.
+
+broadcast() sends one personalized message per lead from a thread pool.
+SenderThrottle paces sends per sender number to the configured messages per
+second (Twilio queues, then rejects with 429, above a sender's throughput);
+a 429 is retried after a short backoff.
+
+base_url points every client at another host with the same REST paths (e.g.
+scripts/fake_twilio_server.py for load tests).
+"""
+
+import hashlib
+import re
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+_TWILIO_HOST = re.compile(r"^https://[A-Za-z0-9.-]+\.twilio\.com")
+_FORMATTER = string.Formatter()
+# Attempts per message when Twilio answers 429 (sender queue full).
+RATE_LIMIT_ATTEMPTS = 3
+RATE_LIMIT_BACKOFF_SECONDS = 0.5
+
+
+class _PooledHttpClient(TwilioHttpClient):
+    """Twilio HTTP client with a connection pool sized for concurrent sends and an optional base URL."""
+
+    def __init__(self, base_url: Optional[str] = None, max_connections: int = 16, timeout: float = 30.0):
+        super().__init__(pool_connections=True, timeout=timeout)
+        self.base_url = base_url.rstrip("/") if base_url else None
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, max_connections))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, *args, **kwargs):
+        if self.base_url:
+            url = _TWILIO_HOST.sub(self.base_url, url, count=1)
+        return super().request(method, url, *args, **kwargs)
+
+
+def _token_hash(auth_token: str) -> str:
+    return hashlib.sha256(auth_token.encode("utf-8")).hexdigest()
+
+
+class TwilioClientPool:
+    def __init__(self, base_url: Optional[str] = None, max_connections: int = 16):
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.created = 0
+        self.reused = 0
+        self.invalidated = 0
+        # account_sid -> (token hash, client)
+        self._clients: Dict[str, Tuple[str, Client]] = {}
+        # (user_id, channel) -> account_sid last used for it
+        self._owners: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def client(self, config: dict, user_id: Optional[str] = None, channel: Optional[str] = None) -> Client:
+        """The pooled client for config's account_sid, rebuilt if its auth token changed."""
+        sid, token = config["account_sid"], config["auth_token"]
+        digest = _token_hash(token)
+        with self._lock:
+            if user_id is not None:
+                self._owners[(user_id, channel)] = sid
+            entry = self._clients.get(sid)
+            if entry is not None and entry[0] == digest:
+                self.reused += 1
+                return entry[1]
+            if entry is not None:
+                self.invalidated += 1
+            http_client = _PooledHttpClient(self.base_url, self.max_connections)
+            client = Client(sid, token, http_client=http_client)
+            self._clients[sid] = (digest, client)
+            self.created += 1
+            return client
+
+    def forget(self, account_sid: str) -> bool:
+        with self._lock:
+            if self._clients.pop(account_sid, None) is None:
+                return False
+            self.invalidated += 1
+            return True
+
+    def on_config_saved(self, user_id: str, channel: str, config: dict) -> None:
+        """channels.save_channel_config listener: drop clients built from the replaced credentials."""
+        with self._lock:
+            previous = self._owners.pop((user_id, channel), None)
+        for sid in {previous, (config or {}).get("account_sid")}:
+            if sid:
+                self.forget(sid)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "created": self.created,
+                "reused": self.reused,
+                "invalidated": self.invalidated,
+                "base_url": self.base_url,
+            }
+
+
+class SenderThrottle:
+    """Spaces sends from each sender number at least 1 / rate seconds apart (process-wide)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.waited = 0.0
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, sender: str) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(sender, now))
+            self._next[sender] = slot + 1.0 / self.rate
+            delay = slot - now
+            self.waited += delay
+        if delay > 0:
+            time.sleep(delay)
+
+
+def compile_template(template: str) -> Callable[[Dict[str, Any]], str]:
+    """
+    Parse a message template once. Placeholders are plain field names of the
+    lead ({investor_name}, {property_name}, ...), optionally with a format
+    spec; missing or null fields render empty. Raises ValueError on a
+    malformed template or a placeholder that is not a plain name.
+    """
+    parts = list(_FORMATTER.parse(template))
+    for _, field, _, _ in parts:
+        if field is not None and not field.isidentifier():
+            raise ValueError(f"Unsupported placeholder {{{field}}} in message_body")
+
+    def render(fields: Dict[str, Any]) -> str:
+        out = []
+        for literal, field, spec, conversion in parts:
+            out.append(literal)
+            if field is None:
+                continue
+            value = fields.get(field)
+            if value is None:
+                value = ""
+            if conversion:
+                value = _FORMATTER.convert_field(value, conversion)
+            out.append(format(value, spec or ""))
+        return "".join(out)
+
+    return render
+
+
+def whatsapp_address(number: str) -> str:
+    number = (number or "").strip()
+    return number if number.startswith("whatsapp:") else f"whatsapp:{number}"
+
+
+def send_message(client: Client, msg_args: dict, throttle: Optional[SenderThrottle] = None):
+    """messages.create with per-sender pacing and a retry on 429."""
+    for attempt in range(RATE_LIMIT_ATTEMPTS):
+        if throttle is not None:
+            throttle.acquire(msg_args["from_"])
+        try:
+            return client.messages.create(**msg_args)
+        except TwilioRestException as e:
+            if e.status != 429 or attempt == RATE_LIMIT_ATTEMPTS - 1:
+                raise
+            time.sleep(RATE_LIMIT_BACKOFF_SECONDS * (attempt + 1))
+
+
+def broadcast(
+    client: Client,
+    from_number: str,
+    leads: List[Dict[str, Any]],
+    template: str,
+    media_url: Optional[str] = None,
+    throttle: Optional[SenderThrottle] = None,
+    concurrency: int = 16,
+    default_name: str = "there",
+) -> Dict[str, Any]:
+    """
+    Send `template` personalized per lead; each lead needs `to_number`.
+    A number repeated in the list is sent once. Returns per-lead results in
+    input order plus sent / failed counts and messages_per_second.
+    """
+    render = compile_template(template)
+    results: List[Dict[str, Any]] = [None] * len(leads)
+    jobs, seen = [], set()
+    for i, lead in enumerate(leads):
+        to = whatsapp_address(str(lead.get("to_number") or "")) if isinstance(lead, dict) else ""
+        if to == "whatsapp:":
+            results[i] = {"to_number": None, "status": "failed", "error": "to_number is required"}
+            continue
+        if to in seen:
+            results[i] = {"to_number": lead["to_number"], "status": "skipped_duplicate"}
+            continue
+        seen.add(to)
+        jobs.append((i, to, lead))
+
+    def send(job):
+        i, to, lead = job
+        result = {"to_number": lead["to_number"]}
+        try:
+            msg_args = {"from_": from_number, "to": to, "body": render({"investor_name": default_name, **lead})}
+            if media_url:
+                msg_args["media_url"] = [media_url]
+            message = send_message(client, msg_args, throttle)
+            result.update(status="sent", sid=message.sid)
+        except Exception as e:
+            result.update(status="failed", error=str(e))
+        results[i] = result
+
+    started = time.perf_counter()
+    if jobs:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(jobs))),
+                                thread_name_prefix="lelwa-broadcast") as pool:
+            list(pool.map(send, jobs))
+    elapsed = time.perf_counter() - started
+
+    sent = sum(1 for r in results if r["status"] == "sent")
+    return {
+        "status": "sent" if sent == len(jobs) and jobs else "partial" if sent else "failed",
+        "sent": sent,
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "skipped": sum(1 for r in results if r["status"] == "skipped_duplicate"),
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "messages_per_second": round(sent / elapsed, 1) if elapsed > 0 and sent else 0.0,
+        "results": results,
+    }
@@ -0,0 +1,309 @@
+"""
+Durable outbox for outbound WhatsApp messages and voice calls.
+
+/v1/tools/send_whatsapp and /v1/tools/call_investor check the channel
+credentials, store the send in the `outbox` table of the channels SQLite
+database and return at once; a bounded pool of worker threads delivers it.
+
+  idempotency   An item may carry a client-chosen key, unique per user;
+                enqueuing the same key again returns the existing item.
+  retries       Transient failures (timeouts, connection errors, Twilio 5xx
+                and 429) are retried with exponential backoff and jitter up
+                to max_attempts. Twilio 4xx and tool errors fail at once.
+  leases        Claiming an item pushes its next_attempt_at `lease` seconds
+                out, so an item whose worker died is picked up again (by any
+                worker process on the host) once the lease expires. Delivery
+                is therefore at least once.
+  throughput    `workers` bounds concurrent sends per process; the Twilio
+                tools additionally pace each sender number (messaging.py).
+
+Finished items are deleted after `retention` seconds by a background task.
+"""
+
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from twilio.base.exceptions import TwilioRestException
+
+from scheduler import PeriodicTask
+
+OUTBOX_TOOLS = frozenset({"send_whatsapp", "call_investor"})
+STATUSES = ("queued", "sending", "sent", "failed", "blocked")
+
+_CLAIM_SQL = """
+    UPDATE outbox
+    SET status = 'sending', attempts = attempts + 1, next_attempt_at = :lease_until, updated_at = :now_iso
+    WHERE id = (
+        SELECT id FROM outbox
+        WHERE status IN ('queued', 'sending') AND next_attempt_at <= :now
+        ORDER BY next_attempt_at
+        LIMIT 1
+    )
+    RETURNING id, user_id, session_id, tool_name, args_json, attempts
+"""
+_ITEM_COLUMNS = (
+    "id, user_id, session_id, tool_name, idempotency_key, status, attempts, "
+    "next_attempt_at, last_error, result_json, created_at, updated_at"
+)
+
+
+def _is_permanent(error: Exception) -> bool:
+    """Client errors Twilio will keep rejecting (bad number, unverified sender, ...)."""
+    return isinstance(error, TwilioRestException) and 400 <= (error.status or 0) < 500 and error.status != 429
+
+
+class Outbox:
+    def __init__(
+        self,
+        executor: Any,
+        path: str,
+        workers: int = 4,
+        max_attempts: int = 5,
+        backoff: float = 2.0,
+        max_backoff: float = 300.0,
+        lease: float = 120.0,
+        poll: float = 1.0,
+        retention: float = 7 * 86400,
+    ):
+        self.executor = executor
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll = poll
+        self.retention = retention
+        self.enqueued = 0
+        self.duplicates = 0
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+        self._counter_lock = threading.Lock()
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.task = PeriodicTask("outbox-gc", 3600, self.purge)
+        try:
+            self._init_db()
+        except Exception:
+            # Keep the API importable; enqueue reports the storage error instead.
+            pass
+
+    # ── Storage ───────────────────────────────────────────────────────────
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    def _init_db(self) -> None:
+        db = self._db()
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id              TEXT PRIMARY KEY,
+                user_id         TEXT NOT NULL,
+                session_id      TEXT NOT NULL,
+                tool_name       TEXT NOT NULL,
+                args_json       TEXT NOT NULL,
+                idempotency_key TEXT,
+                status          TEXT NOT NULL DEFAULT 'queued',
+                attempts        INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error      TEXT,
+                result_json     TEXT,
+                created_at      TEXT NOT NULL,
+                updated_at      TEXT NOT NULL,
+                UNIQUE (user_id, idempotency_key)
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+
+    def enqueue(
+        self,
+        user_id: str,
+        session_id: str,
+        tool_name: str,
+        args: dict,
+        idempotency_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Store a send for delivery; returns the item (the existing one for a repeated key)."""
+        now = datetime.now().isoformat()
+        cursor = self._db().execute(
+            """
+            INSERT INTO outbox
+                (id, user_id, session_id, tool_name, args_json, idempotency_key,
+                 next_attempt_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, idempotency_key) DO NOTHING
+            """,
+            (uuid.uuid4().hex, user_id, session_id, tool_name, json.dumps(args), idempotency_key,
+             time.time(), now, now),
+        )
+        with self._counter_lock:
+            if cursor.rowcount:
+                self.enqueued += 1
+            else:
+                self.duplicates += 1
+        if cursor.rowcount:
+            self._wake.set()
+            row = self._db().execute(f"SELECT {_ITEM_COLUMNS} FROM outbox WHERE rowid = ?",
+                                     (cursor.lastrowid,)).fetchone()
+        else:
+            row = self._db().execute(f"SELECT {_ITEM_COLUMNS} FROM outbox WHERE user_id = ? AND idempotency_key = ?",
+                                     (user_id, idempotency_key)).fetchone()
+        return self._item(row)
+
+    def get(self, outbox_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """The item, or None if it does not exist or belongs to another user."""
+        row = self._db().execute(f"SELECT {_ITEM_COLUMNS} FROM outbox WHERE id = ? AND user_id = ?",
+                                 (outbox_id, user_id)).fetchone()
+        return self._item(row) if row else None
+
+    @staticmethod
+    def _item(row: sqlite3.Row) -> Dict[str, Any]:
+        item = dict(row)
+        item["result"] = json.loads(item.pop("result_json")) if item["result_json"] else None
+        item["next_attempt_at"] = (
+            datetime.fromtimestamp(item["next_attempt_at"]).isoformat()
+            if item["status"] in ("queued", "sending") else None
+        )
+        return item
+
+    def _finish(self, outbox_id: str, status: str, result: Any = None, error: Optional[str] = None,
+                next_attempt_at: Optional[float] = None) -> None:
+        self._db().execute(
+            """
+            UPDATE outbox SET status = ?, result_json = ?, last_error = ?,
+                next_attempt_at = COALESCE(?, next_attempt_at), updated_at = ?
+            WHERE id = ?
+            """,
+            (status, json.dumps(result, default=str) if result is not None else None, error,
+             next_attempt_at, datetime.now().isoformat(), outbox_id),
+        )
+
+    # ── Delivery ──────────────────────────────────────────────────────────
+
+    def claim(self) -> Optional[sqlite3.Row]:
+        """Lease the next due item to this worker (atomic across processes)."""
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(_CLAIM_SQL, {
+                "now": now, "lease_until": now + self.lease, "now_iso": datetime.now().isoformat(),
+            }).fetchone()
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return row
+
+    def process(self, row: sqlite3.Row) -> str:
+        """Deliver one claimed item and record the outcome; returns its new status."""
+        if row["attempts"] > self.max_attempts:
+            # Its last lease expired mid-send; do not send again.
+            self._finish(row["id"], "failed", error=f"gave up after {self.max_attempts} attempts")
+            self._count("failed")
+            return "failed"
+        entry = self.executor.registry.get(row["tool_name"])
+        try:
+            if entry is None:
+                raise LookupError(f"Tool {row['tool_name']} is not implemented.")
+            result = entry(json.loads(row["args_json"]), row["session_id"], user_id=row["user_id"])
+        except Exception as e:
+            error = str(e)
+            self.last_error = error
+            if _is_permanent(e) or isinstance(e, LookupError) or row["attempts"] >= self.max_attempts:
+                self._finish(row["id"], "failed", error=error)
+                self._count("failed")
+                return "failed"
+            delay = min(self.max_backoff, self.backoff * 2 ** (row["attempts"] - 1)) * random.uniform(0.8, 1.2)
+            self._finish(row["id"], "queued", error=error, next_attempt_at=time.time() + delay)
+            self._count("retried")
+            return "queued"
+
+        if isinstance(result, dict) and result.get("requires_connection"):
+            # Credentials were removed after the send was queued.
+            self._finish(row["id"], "blocked", result=result, error="channel not connected")
+            self._count("failed")
+            return "blocked"
+        if isinstance(result, dict) and "error" in result:
+            self._finish(row["id"], "failed", result=result, error=str(result["error"]))
+            self._count("failed")
+            return "failed"
+        self._finish(row["id"], "sent", result=result)
+        self._count("delivered")
+        return "sent"
+
+    def _count(self, counter: str) -> None:
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                row = self.claim()
+            except Exception as e:
+                self.last_error = str(e)
+                row = None
+            if row is None:
+                self._wake.wait(self.poll)
+                self._wake.clear()
+                continue
+            try:
+                self.process(row)
+            except Exception as e:
+                # Bookkeeping failed; the lease expiry retries the item.
+                self.last_error = str(e)
+
+    def start(self) -> None:
+        if self.workers <= 0 or any(t.is_alive() for t in self._threads):
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"lelwa-outbox-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def purge(self) -> int:
+        """Delete finished items older than `retention`."""
+        cutoff = datetime.fromtimestamp(time.time() - self.retention).isoformat()
+        cursor = self._db().execute(
+            "DELETE FROM outbox WHERE status IN ('sent', 'failed', 'blocked') AND updated_at < ?", (cutoff,)
+        )
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        try:
+            counts = dict(self._db().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        except Exception:
+            counts = {}
+        with self._counter_lock:
+            return {
+                "workers": sum(1 for t in self._threads if t.is_alive()),
+                "items": {status: counts.get(status, 0) for status in STATUSES},
+                "enqueued": self.enqueued,
+                "duplicates": self.duplicates,
+                "delivered": self.delivered,
+                "retried": self.retried,
+                "failed": self.failed,
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,204 @@
+"""
+Budget-constrained portfolio selection over one ranked candidate set.
+
+plan_investment_portfolio fetches candidates once from
+agent_ranked_for_investor_v1 and hands them to optimize_portfolio(), which
+picks up to `k` distinct properties whose prices fit the budget, maximising
+
+    sum(final_rank)                                  quality of each pick
+  + UTILIZATION_WEIGHT * spent / budget              deploy the budget
+  - sum over area / developer / status_band of
+      weight * pairs of picks sharing that value     diversification
+
+Greedy construction (best marginal gain that still leaves room for the
+cheapest remaining picks) followed by 1-swap local search. Pure Python,
+in memory: a 500-candidate pool solves in milliseconds
+(scripts/bench_portfolio.py).
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+# Objective weights (final_rank is on a 0-100 scale).
+UTILIZATION_WEIGHT = 30.0
+DIVERSITY_WEIGHTS = {"area": 15.0, "developer": 10.0, "status_band": 5.0}
+# Local-search passes over (pick, candidate) swaps.
+MAX_SWAP_PASSES = 4
+
+
+def _value(candidate: Dict[str, Any]) -> float:
+    for key in ("final_rank", "match_score", "score_0_100"):
+        v = candidate.get(key)
+        if v is not None:
+            return float(v)
+    return 0.0
+
+
+def _attrs(candidate: Dict[str, Any]) -> tuple:
+    """(dimension, value) pairs that count towards concentration."""
+    return tuple((dim, candidate[dim]) for dim in DIVERSITY_WEIGHTS if candidate.get(dim) is not None)
+
+
+class _Selection:
+    """Running totals for a set of picks, so gains are computed in O(1)."""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.picks: List[int] = []
+        self.spent = 0.0
+        self.quality = 0.0
+        # (dimension, value) -> picks sharing it
+        self.counts: Dict[tuple, int] = {}
+
+    def objective(self) -> float:
+        penalty = sum(DIVERSITY_WEIGHTS[dim] * n * (n - 1) / 2 for (dim, _), n in self.counts.items())
+        return self.quality + UTILIZATION_WEIGHT * self.spent / self.budget - penalty
+
+    def gain(self, attrs: tuple, price: float, value: float) -> float:
+        """Objective change from adding a candidate (each shared attribute costs weight × existing count)."""
+        counts = self.counts
+        penalty = 0.0
+        for attr in attrs:
+            n = counts.get(attr)
+            if n:
+                penalty += DIVERSITY_WEIGHTS[attr[0]] * n
+        return value + UTILIZATION_WEIGHT * price / self.budget - penalty
+
+    def add(self, i: int, attrs: tuple, price: float, value: float) -> None:
+        self.picks.append(i)
+        self.spent += price
+        self.quality += value
+        for attr in attrs:
+            self.counts[attr] = self.counts.get(attr, 0) + 1
+
+    def remove(self, i: int, attrs: tuple, price: float, value: float) -> None:
+        self.picks.remove(i)
+        self.spent -= price
+        self.quality -= value
+        for attr in attrs:
+            self.counts[attr] -= 1
+            if not self.counts[attr]:
+                del self.counts[attr]
+
+    def diversity(self) -> Dict[str, int]:
+        return {dim: sum(1 for d, _ in self.counts if d == dim) for dim in DIVERSITY_WEIGHTS}
+
+
+def optimize_portfolio(candidates: Sequence[Dict[str, Any]], total_budget: float, k: int) -> Dict[str, Any]:
+    """
+    Choose up to `k` distinct candidates (dicts with price_aed, final_rank,
+    area, developer, status_band, asset_id) with total price <= total_budget.
+    Returns {"picks": [...], "spent", "remaining", "objective", "diversity",
+    "candidates", "solve_ms"}.
+    """
+    started = time.perf_counter()
+    seen = set()
+    pool = []
+    for c in candidates:
+        price = float(c.get("price_aed") or 0)
+        ident = c.get("asset_id") or c.get("name")
+        if price <= 0 or price > total_budget or ident in seen:
+            continue
+        seen.add(ident)
+        pool.append((_attrs(c), price, _value(c), c))
+
+    selection = _Selection(total_budget)
+    if pool and k > 0:
+        by_price = sorted(range(len(pool)), key=lambda i: pool[i][1])
+        # A candidate can never gain more than its penalty-free gain, so scanning
+        # in that order lets both passes stop once nothing left can win.
+        bound = [value + UTILIZATION_WEIGHT * price / total_budget for _, price, value, _ in pool]
+        by_bound = sorted(range(len(pool)), key=lambda i: -bound[i])
+        chosen = set()
+
+        # Greedy: best marginal gain that keeps the remaining slots fillable.
+        # If no full-size portfolio fits, settle for fewer picks.
+        target = k
+        while len(selection.picks) < target:
+            left = total_budget - selection.spent
+            slots_after = target - len(selection.picks) - 1
+            # Cheapest unpicked prices: the cheapest way to fill the other slots
+            # is the first `slots_after` of these, skipping the candidate itself.
+            cheapest = []
+            for j in by_price:
+                if len(cheapest) > slots_after:
+                    break
+                if j not in chosen:
+                    cheapest.append(pool[j][1])
+            fill_with = sum(cheapest)
+            fill_without = sum(cheapest[:slots_after])
+            best, best_gain = None, None
+            for i in by_bound:
+                if best_gain is not None and bound[i] <= best_gain:
+                    break
+                attrs, price, value, _ = pool[i]
+                if i in chosen or price > left:
+                    continue
+                if slots_after:
+                    if price <= cheapest[min(slots_after, len(cheapest)) - 1]:
+                        rest = fill_with - price if len(cheapest) > slots_after else float("inf")
+                    else:
+                        rest = fill_without if len(cheapest) >= slots_after else float("inf")
+                    if price + rest > left:
+                        continue
+                g = selection.gain(attrs, price, value)
+                if best_gain is None or g > best_gain:
+                    best, best_gain = i, g
+            if best is None:
+                target -= 1
+                if target <= len(selection.picks):
+                    break
+                continue
+            chosen.add(best)
+            selection.add(best, *pool[best][:3])
+
+        # Local search: swap a pick for an unpicked candidate while it helps.
+        for _ in range(MAX_SWAP_PASSES):
+            improved = False
+            for out in list(selection.picks):
+                a_out, p_out, v_out, _ = pool[out]
+                base = selection.objective()
+                selection.remove(out, a_out, p_out, v_out)
+                left = total_budget - selection.spent
+                without = selection.objective()
+                best, best_obj = None, base
+                for i in by_bound:
+                    if without + bound[i] <= best_obj + 1e-9:
+                        break
+                    attrs, price, value, _ = pool[i]
+                    if i in chosen or price > left:
+                        continue
+                    obj = without + selection.gain(attrs, price, value)
+                    if obj > best_obj + 1e-9:
+                        best, best_obj = i, obj
+                if best is None:
+                    selection.add(out, a_out, p_out, v_out)
+                    continue
+                chosen.discard(out)
+                chosen.add(best)
+                selection.add(best, *pool[best][:3])
+                improved = True
+            if not improved:
+                break
+
+    picks = [pool[i][3] for i in selection.picks]
+    picks.sort(key=lambda c: -_value(c))
+    return {
+        "picks": picks,
+        "spent": round(selection.spent, 2),
+        "remaining": round(total_budget - selection.spent, 2),
+        "objective": round(selection.objective(), 3) if picks else 0.0,
+        "diversity": selection.diversity(),
+        "candidates": len(pool),
+        "solve_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def portfolio_objective(picks: Sequence[Dict[str, Any]], total_budget: float) -> Optional[float]:
+    """Objective of an arbitrary pick list (None if over budget); used by the benchmark's exhaustive check."""
+    selection = _Selection(total_budget)
+    for i, c in enumerate(picks):
+        selection.add(i, _attrs(c), float(c.get("price_aed") or 0), _value(c))
+    if selection.spent > total_budget:
+        return None
+    return selection.objective()
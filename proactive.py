@@ -0,0 +1,183 @@
+"""
+Scheduled, incremental price-drop matching for proactive outreach.
+
+Every write to entrestate_inventory appends the touched project names to
+inventory_change_log (trigger in schema.sql). ProactiveScanner.run()
+consumes that log and, in one statement, joins the changed projects that are
+now price drops against every investor_intent_profiles row whose budget
+covers the price and whose preferred area matches (or is unset). Matches
+land in proactive_matches, where the console pages through them; messages
+are never sent from here.
+
+Consumed log entries are deleted in the same transaction as the matches are
+written, so a crash never loses or half-applies a batch, and an entry
+committed late (with a lower change_id than one already seen) is still
+picked up on the next run. proactive_scan_state keeps the watermark (last
+consumed change_id) and per-run counts. The very first run matches the whole
+inventory once.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from scheduler import PeriodicTask
+
+STATE_NAME = "price_drops"
+
+# {changed} restricts the drops to the consumed log entries (empty for the first, full run).
+_SCAN_SQL = """
+    WITH claimed AS (
+        DELETE FROM inventory_change_log RETURNING change_id, name
+    ),
+    drops AS (
+        SELECT DISTINCT ON (i.name)
+            i.name, i.area, i.final_price_from::numeric AS price, i.dld_price_delta_pct::float8 AS delta_pct
+        FROM entrestate_inventory i
+        WHERE i.dld_price_delta_pct < :threshold
+          AND i.final_price_from > 0
+          {changed}
+        ORDER BY i.name, i.final_price_from
+    ),
+    matched AS (
+        SELECT p.session_id, p.budget_aed, d.*
+        FROM drops d
+        JOIN investor_intent_profiles p
+          ON p.preferred_area IS NULL AND p.budget_aed >= d.price
+        UNION ALL
+        SELECT p.session_id, p.budget_aed, d.*
+        FROM drops d
+        JOIN investor_intent_profiles p
+          ON LOWER(p.preferred_area) = LOWER(d.area) AND p.budget_aed >= d.price
+    ),
+    saved AS (
+        INSERT INTO proactive_matches AS m
+            (session_id, property_name, area, price_aed, price_delta_pct, budget_aed)
+        SELECT session_id, name, area, price, delta_pct, budget_aed FROM matched
+        ON CONFLICT (session_id, property_name) DO UPDATE SET
+            area = EXCLUDED.area,
+            price_aed = EXCLUDED.price_aed,
+            price_delta_pct = EXCLUDED.price_delta_pct,
+            budget_aed = EXCLUDED.budget_aed,
+            -- A further drop surfaces the match again.
+            status = CASE WHEN EXCLUDED.price_aed < m.price_aed THEN 'new' ELSE m.status END,
+            matched_at = NOW()
+        WHERE m.price_aed IS DISTINCT FROM EXCLUDED.price_aed
+        RETURNING 1
+    )
+    SELECT
+        (SELECT COUNT(*) FROM claimed) AS changes,
+        (SELECT MAX(change_id) FROM claimed) AS last_change_id,
+        (SELECT COUNT(*) FROM drops) AS drops,
+        (SELECT COUNT(*) FROM saved) AS matches
+"""
+_CHANGED_ONLY = "AND i.name IN (SELECT name FROM claimed)"
+
+
+class ProactiveScanner:
+    def __init__(self, engine, interval: float = 300.0, drop_pct: float = -20.0):
+        self.engine = engine
+        self.drop_pct = drop_pct
+        self.runs = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self.task = PeriodicTask("proactive-scan", interval, self.run, run_immediately=True)
+
+    def run(self) -> Optional[Dict[str, Any]]:
+        """Consume the change log and persist new matches (one transaction)."""
+        if self.engine is None:
+            return None
+        with self._lock:
+            started = time.perf_counter()
+            with self.engine.begin() as conn:
+                result = self.scan(conn)
+            result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self.runs += 1
+            self.last_run = result
+            return result
+
+    def scan(self, conn) -> Dict[str, Any]:
+        """One incremental scan inside the caller's transaction."""
+        conn.execute(
+            text("INSERT INTO proactive_scan_state (name) VALUES (:name) ON CONFLICT (name) DO NOTHING"),
+            {"name": STATE_NAME},
+        )
+        # Serializes scans across workers; the loser then finds the log empty.
+        state = conn.execute(
+            text("SELECT last_change_id, last_run_at FROM proactive_scan_state WHERE name = :name FOR UPDATE"),
+            {"name": STATE_NAME},
+        ).fetchone()
+        full = state.last_run_at is None
+        row = conn.execute(
+            text(_SCAN_SQL.format(changed="" if full else _CHANGED_ONLY)),
+            {"threshold": self.drop_pct},
+        ).fetchone()
+        watermark = max(state.last_change_id, row.last_change_id or 0)
+        conn.execute(
+            text(
+                "UPDATE proactive_scan_state SET last_change_id = :watermark, last_run_at = NOW(), "
+                "last_drops = :drops, last_matches = :matches WHERE name = :name"
+            ),
+            {"watermark": watermark, "drops": row.drops, "matches": row.matches, "name": STATE_NAME},
+        )
+        return {
+            "full": full,
+            "changes": row.changes,
+            "drops": row.drops,
+            "matches": row.matches,
+            "watermark": watermark,
+        }
+
+    def page(
+        self,
+        session_id: Optional[str] = None,
+        status: Optional[str] = None,
+        before: Optional[str] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """
+        Most recently (re-)matched first: a further price drop moves a match
+        back to the top. Pass the returned `next_before` cursor to get the
+        following page; a malformed cursor raises ValueError.
+        """
+        clauses, params = [], {"limit": limit}
+        if session_id:
+            clauses.append("session_id = :session_id")
+            params["session_id"] = session_id
+        if status:
+            clauses.append("status = :status")
+            params["status"] = status
+        if before is not None:
+            clauses.append("(matched_at, id) < (:before_at, :before_id)")
+            params["before_at"], params["before_id"] = _parse_cursor(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, session_id, property_name, area, price_aed, price_delta_pct, budget_aed, "
+                    f"status, matched_at FROM proactive_matches {where} "
+                    "ORDER BY matched_at DESC, id DESC LIMIT :limit"
+                ),
+                params,
+            ).fetchall()
+        matches: List[Dict[str, Any]] = [dict(r._mapping) for r in rows]
+        return {
+            "matches": matches,
+            "next_before": _cursor(matches[-1]) if len(matches) == limit else None,
+        }
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "drop_pct": self.drop_pct, "last_run": self.last_run}
+
+
+def _cursor(match: Dict[str, Any]) -> str:
+    """Keyset cursor of a match: its matched_at and id (ties on matched_at are broken by id)."""
+    return f"{match['matched_at'].isoformat()}_{match['id']}"
+
+
+def _parse_cursor(cursor: str) -> Tuple[datetime, int]:
+    matched_at, _, match_id = cursor.rpartition("_")
+    return datetime.fromisoformat(matched_at), int(match_id)
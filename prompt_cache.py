@@ -0,0 +1,257 @@
+"""
+Gemini context caching for the static prompt prefix.
+
+Every Gemini chat round sends SYSTEM_PROMPT and all tool declarations again
+as input. GeminiPromptCache registers that prefix once per registry version
+as a CachedContent and hands out models bound to it, so rounds only send the
+conversation. Its task renews the cache's TTL `renew_before` seconds ahead of
+expiry and re-creates it after a spec reload (triggered by the caller).
+
+Fallback is transparent: when caching is unavailable (the model has no
+caching, an API error) model() returns None and callers use the uncached
+model; creation is retried after `retry_after` seconds. The prefix is
+counted once per registry version first: under `min_tokens` (the model's
+minimum cacheable size) caching stays off for that version, with the reason
+in stats(), instead of failing every retry. A call that fails on a cached
+model because the cache is missing or rejected should be passed to
+invalidate() with the model's cache name and retried uncached.
+
+record_round() keeps input tokens billed (prompt minus cached tokens),
+cached tokens and round / first-token latency separately for cached and
+uncached rounds, so the gain shows on /v1/metrics. Each worker process
+holds its own cache.
+"""
+
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Callable, Optional, Tuple
+
+import google.generativeai as genai
+
+from scheduler import PeriodicTask
+
+# A cache this close to expiry is no longer handed out.
+_EXPIRY_MARGIN_SECONDS = 30.0
+
+
+class GeminiPromptCache:
+    def __init__(
+        self,
+        model_name: str,
+        version: Callable[[], int],
+        prefix: Callable[[], Tuple[str, Any]],
+        ttl: float = 3600.0,
+        renew_before: float = 900.0,
+        retry_after: float = 600.0,
+        interval: float = 60.0,
+        min_tokens: int = 0,
+    ):
+        self.model_name = model_name
+        self.version = version
+        self.prefix = prefix
+        self.ttl = ttl
+        self.renew_before = renew_before
+        self.retry_after = retry_after
+        self.min_tokens = min_tokens
+        self.prefix_tokens: Optional[int] = None
+        # Why caching is off for the current prefix (too small to cache), else None.
+        self.disabled: Optional[str] = None
+        self.created = 0
+        self.renewed = 0
+        self.failures = 0
+        self.invalidated = 0
+        self.last_error: Optional[str] = None
+        self._content: Any = None
+        self._model: Any = None
+        self._version: Optional[int] = None
+        self._checked_version: Optional[int] = None
+        self._expires = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._rounds = {
+            cached: {"rounds": 0, "prompt_tokens": 0, "cached_tokens": 0, "round_ms": 0.0,
+                     "streamed_rounds": 0, "first_token_ms": 0.0}
+            for cached in (True, False)
+        }
+        self.task = PeriodicTask("gemini-prompt-cache", interval, self.refresh, run_immediately=True)
+
+    # ── Provider calls (overridable) ──────────────────────────────────────
+
+    def _create(self, system_instruction: str, tools: Any) -> Any:
+        return genai.caching.CachedContent.create(
+            model=self.model_name,
+            display_name="lelwa-prompt-prefix",
+            system_instruction=system_instruction,
+            tools=tools,
+            ttl=timedelta(seconds=self.ttl),
+        )
+
+    def _count(self, system_instruction: str, tools: Any) -> int:
+        model = genai.GenerativeModel(model_name=self.model_name, system_instruction=system_instruction, tools=tools)
+        return model.count_tokens(".").total_tokens
+
+    def _bind(self, content: Any) -> Any:
+        return genai.GenerativeModel.from_cached_content(cached_content=content)
+
+    def _extend(self, content: Any) -> None:
+        content.update(ttl=timedelta(seconds=self.ttl))
+
+    def _delete(self, content: Any) -> None:
+        content.delete()
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────
+
+    def model(self) -> Any:
+        """A model bound to the live cache of the current prefix, or None (use the uncached model)."""
+        version = self.version()
+        with self._lock:
+            if self._model is None:
+                return None
+            if self._version != version:
+                # The spec changed under the cache; rebuild it now rather than at the next tick.
+                self.task.trigger()
+                return None
+            return self._model if time.time() < self._expires - _EXPIRY_MARGIN_SECONDS else None
+
+    def refresh(self) -> None:
+        """Task body: create the cache for the current prefix, or extend it ahead of expiry."""
+        now = time.time()
+        version = self.version()
+        with self._lock:
+            content, current = self._content, self._version == version
+        if content is not None and current:
+            if self._expires - now > self.renew_before:
+                return
+            try:
+                self._extend(content)
+            except Exception as e:
+                self._failed(e, now)
+                return
+            with self._lock:
+                self._expires = now + self.ttl
+                self.renewed += 1
+            return
+
+        if now < self._retry_at:
+            return
+        system_instruction, tools = self.prefix()
+        if self._checked_version != version:
+            try:
+                tokens = self._count(system_instruction, tools)
+            except Exception as e:
+                self._failed(e, now)
+                return
+            with self._lock:
+                self._checked_version, self.prefix_tokens = version, tokens
+                self.disabled = (
+                    f"prefix is {tokens} tokens, under the {self.min_tokens}-token minimum for context caching"
+                    if tokens < self.min_tokens else None
+                )
+        if self.disabled is not None:
+            if content is not None:
+                # A cache of the old prefix must not serve the new declarations.
+                self._drop(content)
+            return
+        try:
+            new_content = self._create(system_instruction, tools)
+            new_model = self._bind(new_content)
+        except Exception as e:
+            self._failed(e, now)
+            if content is not None:
+                # A cache of the old prefix must not serve the new declarations.
+                self._drop(content)
+            return
+        with self._lock:
+            old, self._content, self._model = self._content, new_content, new_model
+            self._version, self._expires = version, now + self.ttl
+            self.created += 1
+            self.last_error = None
+        if old is not None:
+            self._discard(old)
+
+    def invalidate(self, error: Exception, cache_name: Optional[str]) -> None:
+        """
+        A call on a model bound to `cache_name` failed because the cache is
+        gone or unusable. If that is still the live cache, stop handing it
+        out and re-create after retry_after; a chat holding a cache that has
+        since been replaced leaves the current one alone.
+        """
+        with self._lock:
+            content = self._content
+            self.invalidated += 1
+            if content is None or getattr(content, "name", None) != cache_name:
+                return
+        self._failed(error, time.time())
+        self._drop(content)
+
+    def close(self) -> None:
+        """Delete this worker's cache (shutdown)."""
+        with self._lock:
+            content = self._content
+        if content is not None:
+            self._drop(content)
+
+    def _failed(self, error: Exception, now: float) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self._retry_at = now + self.retry_after
+
+    def _drop(self, content: Any) -> None:
+        with self._lock:
+            if self._content is content:
+                self._content = self._model = self._version = None
+                self._expires = 0.0
+        self._discard(content)
+
+    def _discard(self, content: Any) -> None:
+        try:
+            self._delete(content)
+        except Exception:
+            # It expires on its own.
+            pass
+
+    # ── Measurement ───────────────────────────────────────────────────────
+
+    def record_round(self, response: Any, cached: bool, round_ms: float, first_token_ms: Optional[float] = None) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        with self._lock:
+            counters = self._rounds[cached]
+            counters["rounds"] += 1
+            counters["prompt_tokens"] += int(getattr(usage, "prompt_token_count", 0) or 0)
+            counters["cached_tokens"] += int(getattr(usage, "cached_content_token_count", 0) or 0)
+            counters["round_ms"] += round_ms
+            if first_token_ms is not None:
+                counters["streamed_rounds"] += 1
+                counters["first_token_ms"] += first_token_ms
+
+    def stats(self) -> dict:
+        with self._lock:
+            rounds = {}
+            for cached, c in self._rounds.items():
+                n = c["rounds"]
+                rounds["cached" if cached else "uncached"] = {
+                    "rounds": n,
+                    # Input tokens billed at the full rate; cached ones are billed at the cache rate.
+                    "avg_billed_input_tokens": round((c["prompt_tokens"] - c["cached_tokens"]) / n, 1) if n else None,
+                    "avg_cached_tokens": round(c["cached_tokens"] / n, 1) if n else None,
+                    "avg_round_ms": round(c["round_ms"] / n, 1) if n else None,
+                    "avg_first_token_ms": (
+                        round(c["first_token_ms"] / c["streamed_rounds"], 1) if c["streamed_rounds"] else None
+                    ),
+                }
+            return {
+                "model": self.model_name,
+                "active": self._model is not None,
+                "prefix_tokens": self.prefix_tokens,
+                "disabled": self.disabled,
+                "cache": getattr(self._content, "name", None),
+                "expires_in_s": round(self._expires - time.time()) if self._content is not None else None,
+                "created": self.created,
+                "renewed": self.renewed,
+                "failures": self.failures,
+                "invalidated": self.invalidated,
+                "last_error": self.last_error,
+                "rounds": rounds,
+            }
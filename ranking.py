@@ -0,0 +1,283 @@
+"""
+In-process, vectorized mirror of agent_ranked_for_investor_v1 (schema.sql).
+
+search_properties is the most-called query and the SQL function scores every
+eligible inventory row one by one. RankingEngine keeps a columnar NumPy
+snapshot of agent_inventory_view_v1 (plus investor_profiles_v1) and computes
+the same match_score / final_rank for all rows at once, then picks the top
+`limit` with argpartition and only materializes those rows.
+
+Parity with the SQL function, term by term:
+
+  match_score  The weighted sum is float8 in Postgres: the budget term is
+               float8, the other terms are exact numeric products (0.25 * 0.3
+               = 0.075) converted to float8 when added, left to right.
+               ROUND(float8) and ::INT both round half to even (np.rint).
+  final_rank   0.65 * score + 0.35 * match_score is exact numeric arithmetic
+               on integers (score_0_100::BIGINT is rint of the float), and
+               ROUND(numeric) rounds half away from zero; done in integers.
+  order        final_rank DESC, NULLs first (a NULL score_0_100 gives a NULL
+               final_rank). Ties are unordered in SQL; here they keep
+               snapshot (asset_id) order.
+  beds         LOWER(beds) LIKE '%pref%' with LIKE wildcards honoured.
+
+refresh() re-reads the tables only when their pg_stat_user_tables write
+counters moved, builds the new snapshot off to the side and swaps it in;
+rank() never waits on a refresh. scripts/check_ranking_parity.py compares
+this engine with the SQL function on a live database, or with --fixtures
+against the function's results for a fixed inventory.
+"""
+
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import text
+
+# Columns returned by agent_ranked_for_investor_v1, in order (minus the two scores).
+COLUMNS = (
+    "asset_id", "name", "developer", "city", "area",
+    "status_band", "price_aed", "beds",
+    "score_0_100", "classification", "safety_band",
+    "roi_band", "timeline_risk_band", "liquidity_band",
+    "reason_codes", "risk_flags", "drivers",
+)
+TABLES = ("agent_inventory_view_v1", "investor_profiles_v1")
+
+HORIZON_ORD = {"Ready": 1, "6-12mo": 2, "1-2yr": 3, "2-4yr": 4, "4yr+": 5}
+DEFAULT_HORIZON_ORD = 4
+STATUS_ORD = {
+    "Completed": 1, "Handover2025": 2, "Handover2026": 3,
+    "Handover2027": 4, "Handover2028_29": 5, "Handover2030Plus": 6,
+}
+UNKNOWN_STATUS_ORD = 999
+# The 0.10 * status_band term, already multiplied out as Postgres numeric would.
+STATUS_TERM = {
+    "Completed": 0.1, "Handover2025": 0.085, "Handover2026": 0.07,
+    "Handover2027": 0.055, "Handover2028_29": 0.035,
+}
+STATUS_TERM_DEFAULT = 0.015
+# The 0.10 * intent term per (intent, status_band); unlisted pairs use the intent default.
+INTENT_TERM = {
+    "invest": ({"Handover2025": 0.09, "Handover2026": 0.09, "Handover2027": 0.09}, 0.05),
+    "live": ({"Completed": 0.1, "Handover2025": 0.07}, 0.03),
+    "rent": ({"Completed": 0.1}, 0.02),
+}
+INTENT_TERM_DEFAULT = 0.05
+# 0.25 * area match / no preference / mismatch, and the same for 0.20 * beds.
+AREA_TERM = (0.25, 0.125, 0.075)
+BEDS_TERM = (0.2, 0.1, 0.06)
+
+_SNAPSHOT_SQL = f"SELECT {', '.join(COLUMNS)} FROM agent_inventory_view_v1 ORDER BY asset_id"
+_PROFILES_SQL = "SELECT risk_profile, allowed_bands FROM investor_profiles_v1"
+
+
+def _like(pattern: str):
+    """Regex (for fullmatch) equivalent to LIKE `pattern` with the default escape character."""
+    parts, i = [], 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        parts.append(".*" if ch == "%" else "." if ch == "_" else re.escape(ch))
+        i += 1
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def _encode(values: Sequence[Optional[str]]):
+    """(codes, uniques) with code -1 for NULL."""
+    uniques: Dict[str, int] = {}
+    codes = np.fromiter(
+        (-1 if v is None else uniques.setdefault(v, len(uniques)) for v in values),
+        dtype=np.int32, count=len(values),
+    )
+    return codes, list(uniques)
+
+
+def _lookup(uniques: List[str], fn, null_value: float, dtype=np.float64) -> np.ndarray:
+    """Per-code table for `fn(value)`; the last slot (index -1) is the NULL value."""
+    return np.array([fn(u) for u in uniques] + [null_value], dtype=dtype)
+
+
+class RankingSnapshot:
+    """Columnar copy of the inventory view. Immutable once built."""
+
+    def __init__(self, rows: Sequence[Sequence[Any]], profiles: Dict[str, Sequence[str]]):
+        self.rows = rows
+        self.size = len(rows)
+        pos = {name: i for i, name in enumerate(COLUMNS)}
+
+        def column(name):
+            return [r[pos[name]] for r in rows]
+
+        self.price = np.array([np.nan if p is None else float(p) for p in column("price_aed")], dtype=np.float64)
+        score = np.array([np.nan if s is None else float(s) for s in column("score_0_100")], dtype=np.float64)
+        self.score_null = np.isnan(score)
+        # score_0_100::BIGINT
+        self.score = np.where(self.score_null, 0, np.rint(score)).astype(np.int64)
+
+        self.area_code, areas = _encode(column("area"))
+        self.area_lower = [a.lower() for a in areas]
+        self.beds_code, beds = _encode(column("beds"))
+        self.beds_lower = [b.lower() for b in beds]
+        self.status_code, self.statuses = _encode(column("status_band"))
+        self.safety_code, self.safety_bands = _encode(column("safety_band"))
+
+        self.status_ord = _lookup(self.statuses, lambda s: STATUS_ORD.get(s, UNKNOWN_STATUS_ORD),
+                                  UNKNOWN_STATUS_ORD, dtype=np.int32)
+        self.status_term = _lookup(self.statuses, lambda s: STATUS_TERM.get(s, STATUS_TERM_DEFAULT),
+                                   STATUS_TERM_DEFAULT)
+        self.intent_terms = {
+            intent: _lookup(self.statuses, lambda s: by_status.get(s, default), default)
+            for intent, (by_status, default) in INTENT_TERM.items()
+        }
+        self.allowed = {
+            profile: _lookup(self.safety_bands, lambda b: b in set(bands or ()), False, dtype=bool)
+            for profile, bands in profiles.items()
+        }
+
+    def rank(
+        self,
+        risk_profile: Optional[str],
+        horizon: Optional[str],
+        budget: Optional[float] = 0,
+        area_pref: Optional[str] = None,
+        beds_pref: Optional[str] = None,
+        intent: Optional[str] = "invest",
+        limit: Optional[int] = 50,
+    ) -> List[Dict[str, Any]]:
+        allowed = self.allowed.get(risk_profile)
+        if allowed is None or not self.size:
+            return []
+        max_ord = HORIZON_ORD.get(horizon, DEFAULT_HORIZON_ORD)
+        idx = np.flatnonzero(allowed[self.safety_code] & (self.status_ord[self.status_code] <= max_ord))
+        if limit is not None:
+            if limit < 0:
+                raise ValueError("LIMIT must not be negative")
+            if limit == 0:
+                return []
+        if not idx.size:
+            return []
+
+        budget = None if budget is None else float(budget)
+        if budget is not None and budget > 0:
+            price = self.price[idx]
+            with np.errstate(invalid="ignore"):
+                fit = np.maximum(0.0, 1.0 - np.abs(price - budget) / max(budget, 1.0))
+                budget_term = 0.35 * np.where(price > 0, fit, 0.5)
+        else:
+            budget_term = np.full(idx.size, 0.35 * 0.5)
+
+        if area_pref is None:
+            area_table = np.full(len(self.area_lower) + 1, AREA_TERM[1])
+        else:
+            want = area_pref.lower()
+            area_table = _lookup(self.area_lower, lambda a: AREA_TERM[0] if a == want else AREA_TERM[2], AREA_TERM[2])
+        if beds_pref is None:
+            beds_table = np.full(len(self.beds_lower) + 1, BEDS_TERM[1])
+        else:
+            pattern = _like("%" + beds_pref.lower() + "%")
+            beds_table = _lookup(self.beds_lower, lambda b: BEDS_TERM[0] if pattern.fullmatch(b) else BEDS_TERM[2],
+                                 BEDS_TERM[2])
+        intent_table = self.intent_terms.get(intent)
+        status = self.status_code[idx]
+
+        # Same association as the SQL expression: ((((budget + area) + beds) + intent) + status).
+        total = budget_term + area_table[self.area_code[idx]]
+        total = total + beds_table[self.beds_code[idx]]
+        total = total + (intent_table[status] if intent_table is not None else INTENT_TERM_DEFAULT)
+        total = total + self.status_term[status]
+        match = np.rint(total * 100).astype(np.int64)
+
+        weighted = 65 * self.score[idx] + 35 * match
+        final = np.where(weighted >= 0, (weighted + 50) // 100, -((-weighted + 50) // 100))
+        # ORDER BY final_rank DESC puts NULLs first.
+        null = self.score_null[idx]
+        key = np.where(null, np.iinfo(np.int64).max, final)
+
+        if limit is not None and limit < idx.size:
+            top = np.argpartition(-key, limit - 1)[:limit]
+        else:
+            top = np.arange(idx.size)
+        top = top[np.lexsort((idx[top], -key[top]))]
+
+        results = []
+        for j in top.tolist():
+            row = dict(zip(COLUMNS, self.rows[idx[j]]))
+            row["price_aed"] = None if row["price_aed"] is None else float(row["price_aed"])
+            row["score_0_100"] = None if null[j] else int(self.score[idx[j]])
+            row["match_score"] = int(match[j])
+            row["final_rank"] = None if null[j] else int(final[j])
+            results.append(row)
+        return results
+
+
+def load_snapshot(conn) -> RankingSnapshot:
+    """Snapshot of the inventory view and investor profiles as seen by `conn`."""
+    rows = [tuple(r) for r in conn.execute(text(_SNAPSHOT_SQL))]
+    profiles = {r.risk_profile: list(r.allowed_bands or ()) for r in conn.execute(text(_PROFILES_SQL))}
+    return RankingSnapshot(rows, profiles)
+
+
+class RankingEngine:
+    def __init__(self, engine):
+        self.engine = engine
+        self.snapshot: Optional[RankingSnapshot] = None
+        self.loaded_at: Optional[float] = None
+        self.build_ms: Optional[float] = None
+        self.refreshes = 0
+        self.queries = 0
+        self._stamps: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    def refresh(self) -> None:
+        """Rebuild the snapshot if either table saw writes since the last build."""
+        if self.engine is None:
+            return
+        with self._lock:
+            with self.engine.connect() as conn:
+                stamps = {
+                    row.relname: int(row.writes)
+                    for row in conn.execute(
+                        text(
+                            "SELECT relname, n_tup_ins + n_tup_upd + n_tup_del AS writes "
+                            "FROM pg_stat_user_tables WHERE relname = ANY(:tables)"
+                        ),
+                        {"tables": list(TABLES)},
+                    )
+                }
+                if self.snapshot is not None and stamps == self._stamps:
+                    return
+                started = time.perf_counter()
+                snapshot = load_snapshot(conn)
+            self.build_ms = round((time.perf_counter() - started) * 1000, 1)
+            self.snapshot = snapshot
+            self._stamps = stamps
+            self.loaded_at = time.time()
+            self.refreshes += 1
+
+    def rank(self, *args, **kwargs) -> Optional[List[Dict[str, Any]]]:
+        """Same rows as agent_ranked_for_investor_v1(...), or None until a snapshot exists."""
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+        self.queries += 1
+        return snapshot.rank(*args, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "rows": self.snapshot.size if self.snapshot else 0,
+            "loaded_at": self.loaded_at,
+            "build_ms": self.build_ms,
+            "refreshes": self.refreshes,
+            "queries": self.queries,
+        }
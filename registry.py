@@ -0,0 +1,302 @@
+"""
+Process-wide tool registry.
+
+Built once from entrestate_codex_spec_v1.json: the Gemini declarations, the
+OpenAI-format declarations (Ollama), the response schema of the prepared-work
+answer and the name → method dispatch table live together, so a request only
+does dictionary lookups. reload_if_changed() rebuilds everything when the spec
+file changes on disk.
+"""
+
+import inspect
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+SPEC_PATH = os.path.join(os.path.dirname(__file__), "entrestate_codex_spec_v1.json")
+
+# Executed by the broker from prepared_actions, never called by the model.
+MANUAL_TOOL_NAMES = frozenset({"send_whatsapp", "call_investor", "broadcast_whatsapp"})
+
+# The prepared-work answer (see SYSTEM_PROMPT in main.py), for structured output.
+PREPARED_BLOCK_TYPES = ("reply", "call_script", "offer", "contract", "followups", "summary")
+PREPARED_ACTION_REQUIRES = ("connection", "confirmation", "none")
+# Tools whose parameters make up a prepared action's `args`.
+PREPARED_ACTION_TOOLS = (
+    "send_whatsapp", "call_investor", "generate_offer", "generate_rental_contract", "generate_document_pdf",
+)
+
+# The browser tool is defined inline (not in the JSON spec) and offered to Ollama only.
+BROWSE_WEB_DEFINITION = {
+    "name": "browse_web",
+    "description": (
+        "Use a real web browser to research a topic, find current news, "
+        "check live prices, or gather information not in the local database. "
+        "Use this when the answer requires up-to-date or external web data."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "task": {
+                "type": "string",
+                "description": "Natural language task describing what to search or browse for.",
+            }
+        },
+        "required": ["task"],
+    },
+}
+
+
+def memoize(ttl: float, tags: Tuple[str, ...] = (), stamp: Optional[str] = None):
+    """
+    Declare a read tool cacheable for `ttl` seconds. `tags` name the data it
+    reads, so a @writes tool with a matching tag drops its cached results.
+    `stamp` names a result key set to the current time on every call, hit or
+    miss, so a cached result does not carry the time it was computed.
+    String args are compared case-insensitively, so only use this on tools
+    whose lookups are case-insensitive. Results with an "error" key or a true
+    "degraded" key (a stand-in answer) are never cached.
+    """
+    def wrap(fn):
+        fn._memo_ttl = ttl
+        fn._memo_tags = tuple(tags)
+        fn._memo_stamp = stamp
+        return fn
+    return wrap
+
+
+def writes(*tags: str):
+    """Declare a tool with side effects; cached results tagged with `tags` are invalidated after it runs."""
+    def wrap(fn):
+        fn._writes = tuple(tags)
+        return fn
+    return wrap
+
+
+def _schema_to_gemini(schema: dict) -> dict:
+    """
+    Convert JSON Schema (OpenAI-style) -> google.generativeai Schema dict.
+    Key rules:
+      - "type" becomes "type_"
+      - types must be UPPERCASE enum names: OBJECT, STRING, NUMBER, INTEGER, BOOLEAN, ARRAY
+    """
+    if not schema:
+        return {"type_": "OBJECT"}
+
+    t = schema.get("type", "object")
+    type_map = {
+        "object": "OBJECT",
+        "string": "STRING",
+        "number": "NUMBER",
+        "integer": "INTEGER",
+        "boolean": "BOOLEAN",
+        "array": "ARRAY",
+    }
+    gemini: dict = {"type_": type_map.get(t, "OBJECT")}
+
+    if "description" in schema and schema["description"]:
+        gemini["description"] = schema["description"]
+
+    if "enum" in schema and schema["enum"]:
+        gemini["enum"] = schema["enum"]
+
+    # properties
+    if t == "object":
+        props = schema.get("properties", {}) or {}
+        if props:
+            gemini["properties"] = {k: _schema_to_gemini(v) for k, v in props.items()}
+        req = schema.get("required", []) or []
+        if req:
+            gemini["required"] = req
+
+    # array items
+    if t == "array":
+        items = schema.get("items") or {}
+        gemini["items"] = _schema_to_gemini(items)
+
+    return gemini
+
+
+def _prepared_response_schema(spec: dict) -> dict:
+    """
+    JSON Schema of the prepared-work answer. An action's `args` lists the
+    parameters of every PREPARED_ACTION_TOOLS tool (all optional; a name two
+    tools define differently keeps only its type), plus the message_body /
+    message texts the contract fills in.
+    """
+    args: Dict[str, dict] = {
+        "message_body": {"type": "string", "description": "WhatsApp message text"},
+        "message": {"type": "string", "description": "Call script or voice message text"},
+    }
+    for tool in spec["tools"]["definitions"]:
+        function = tool.get("function", {})
+        if function.get("name") not in PREPARED_ACTION_TOOLS:
+            continue
+        for name, prop in ((function.get("parameters") or {}).get("properties") or {}).items():
+            if name in args and args[name] != prop:
+                args[name] = {"type": args[name].get("type", "string")}
+            else:
+                args.setdefault(name, prop)
+    return {
+        "type": "object",
+        "properties": {
+            "reply": {"type": "string"},
+            "prepared_blocks": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "type": {"type": "string", "enum": list(PREPARED_BLOCK_TYPES)},
+                        "title": {"type": "string"},
+                        "content": {"type": "string"},
+                    },
+                    "required": ["type", "title", "content"],
+                },
+            },
+            "prepared_actions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "string"},
+                        "label": {"type": "string"},
+                        "tool_name": {"type": "string"},
+                        "args": {"type": "object", "properties": args},
+                        "requires": {"type": "string", "enum": list(PREPARED_ACTION_REQUIRES)},
+                    },
+                    "required": ["id", "label", "tool_name", "args", "requires"],
+                },
+            },
+        },
+        "required": ["reply", "prepared_blocks", "prepared_actions"],
+    }
+
+
+class ToolEntry:
+    """One dispatchable tool: the bound method, how to call it and its cache policy."""
+
+    __slots__ = ("name", "method", "accepts_user_id", "memo_ttl", "memo_tags", "memo_stamp", "writes")
+
+    def __init__(self, name: str, method: Callable, accepts_user_id: bool):
+        self.name = name
+        self.method = method
+        self.accepts_user_id = accepts_user_id
+        self.memo_ttl: float = getattr(method, "_memo_ttl", 0.0)
+        self.memo_tags: Tuple[str, ...] = getattr(method, "_memo_tags", ())
+        self.memo_stamp: Optional[str] = getattr(method, "_memo_stamp", None)
+        # None for read tools; a (possibly empty) tag tuple for tools with side effects.
+        self.writes: Optional[Tuple[str, ...]] = getattr(method, "_writes", None)
+
+    def __call__(self, args: dict, session_id: Optional[str], user_id: str = "default") -> Any:
+        if self.accepts_user_id:
+            return self.method(args, session_id, user_id=user_id)
+        return self.method(args, session_id)
+
+
+class ToolRegistry:
+    """
+    Holds the parsed spec, both declaration formats and the dispatch table
+    for one ToolExecutor. `version` increases on every (re)load so callers can
+    cache objects built from the declarations (e.g. a Gemini model).
+    """
+
+    def __init__(self, owner: Any, spec_path: str = SPEC_PATH):
+        self.owner = owner
+        self.spec_path = spec_path
+        self.version = 0
+        self.spec: Dict[str, Any] = {}
+        self.gemini_declarations: List[dict] = []
+        self.openai_declarations: List[dict] = []
+        # The prepared-work answer as JSON Schema (Ollama) and Gemini Schema.
+        self.response_schema: Dict[str, Any] = {}
+        self.gemini_response_schema: Dict[str, Any] = {}
+        self.dispatch: Dict[str, ToolEntry] = {}
+        self.stateful_tools: FrozenSet[str] = frozenset()
+        # tag -> names of memoized tools that read data with that tag
+        self.tag_readers: Dict[str, FrozenSet[str]] = {}
+        self._mtime: Optional[float] = None
+        self._listeners: List[Callable[["ToolRegistry"], None]] = []
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        """Parse the spec and swap in freshly built declarations and dispatch table."""
+        mtime = os.path.getmtime(self.spec_path)
+        with open(self.spec_path, "r") as f:
+            spec = json.load(f)
+
+        gemini, openai = [], []
+        for tool in spec["tools"]["definitions"]:
+            function = tool.get("function", {})
+            if function.get("name") in MANUAL_TOOL_NAMES:
+                continue
+            params = function.get("parameters", {}) or {}
+            gemini.append({
+                "name": function.get("name"),
+                "description": function.get("description", ""),
+                "parameters": _schema_to_gemini(params),
+            })
+            openai.append({
+                "type": "function",
+                "function": {
+                    "name": function.get("name"),
+                    "description": function.get("description", ""),
+                    "parameters": params,
+                },
+            })
+        openai.append({"type": "function", "function": BROWSE_WEB_DEFINITION})
+        response_schema = _prepared_response_schema(spec)
+
+        dispatch = {}
+        for attr, _ in inspect.getmembers(type(self.owner), inspect.isfunction):
+            if not attr.startswith("tool_"):
+                continue
+            method = getattr(self.owner, attr)
+            accepts_user_id = "user_id" in inspect.signature(method).parameters
+            dispatch[attr[len("tool_"):]] = ToolEntry(attr[len("tool_"):], method, accepts_user_id)
+
+        tag_readers: Dict[str, set] = {}
+        for entry in dispatch.values():
+            for tag in entry.memo_tags:
+                tag_readers.setdefault(tag, set()).add(entry.name)
+
+        with self._lock:
+            self.spec = spec
+            self.gemini_declarations = gemini
+            self.openai_declarations = openai
+            self.response_schema = response_schema
+            self.gemini_response_schema = _schema_to_gemini(response_schema)
+            self.dispatch = dispatch
+            self.stateful_tools = frozenset(e.name for e in dispatch.values() if e.writes is not None)
+            self.tag_readers = {tag: frozenset(names) for tag, names in tag_readers.items()}
+            self._mtime = mtime
+            self.version += 1
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            try:
+                listener(self)
+            except Exception:
+                pass
+
+    def reload_if_changed(self) -> bool:
+        """Hot-reload hook: rebuild when the spec file's mtime moved. Returns True on reload."""
+        try:
+            mtime = os.path.getmtime(self.spec_path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            self.load()
+        except (OSError, ValueError, KeyError):
+            # Half-written or invalid spec: keep serving the last good one.
+            return False
+        return True
+
+    def on_reload(self, listener: Callable[["ToolRegistry"], None]) -> None:
+        self._listeners.append(listener)
+
+    def get(self, name: str) -> Optional[ToolEntry]:
+        return self.dispatch.get(name)
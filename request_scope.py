@@ -0,0 +1,148 @@
+"""
+Request-scoped identity map and database round-trip counter.
+
+One RequestScope lives for the duration of a chat turn (or a direct tool
+call). It is carried in a ContextVar, so tool calls offloaded to worker
+threads (main._offload copies the context) and run concurrently all share it.
+
+  rows         entity key -> row, loaded at most once per scope. Concurrent
+               loads of the same key wait for the first one instead of
+               issuing their own query.
+  round_trips  statements sent to the database while the scope was active,
+               counted by a before_cursor_execute listener (watch_engine).
+
+Rows are snapshots for the turn only; nothing is shared across requests.
+"""
+
+import contextlib
+import contextvars
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+from sqlalchemy import event
+
+_current: contextvars.ContextVar[Optional["RequestScope"]] = contextvars.ContextVar("request_scope", default=None)
+
+# Summed over every finished scope in this process, for /v1/metrics.
+_totals = {"scopes": 0, "round_trips": 0, "identity_hits": 0, "identity_misses": 0}
+_totals_lock = threading.Lock()
+
+
+class RequestScope:
+    def __init__(self):
+        self.round_trips = 0
+        self.identity_hits = 0
+        self.identity_misses = 0
+        self._rows: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """The row for `key`, calling `loader` only if no caller in this scope has yet."""
+        with self._lock:
+            pending = self._rows.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._rows[key] = Future()
+                self.identity_misses += 1
+            else:
+                self.identity_hits += 1
+        if owner:
+            try:
+                pending.set_result(loader())
+            except BaseException as e:
+                with self._lock:
+                    self._rows.pop(key, None)
+                pending.set_exception(e)
+        return pending.result()
+
+    def get_or_load_many(self, keys: List[Hashable], loader: Callable[[List[Hashable]], Dict[Hashable, Any]]) -> Dict[Hashable, Any]:
+        """
+        Batch form of get_or_load: `loader(missing)` is called once with every
+        key not yet loaded (or loading) in this scope and returns {key: row};
+        keys it leaves out resolve to None.
+        """
+        owned: Dict[Hashable, Future] = {}
+        pending: Dict[Hashable, Future] = {}
+        with self._lock:
+            for key in keys:
+                if key in pending or key in owned:
+                    continue
+                fut = self._rows.get(key)
+                if fut is None:
+                    owned[key] = self._rows[key] = Future()
+                    self.identity_misses += 1
+                else:
+                    pending[key] = fut
+                    self.identity_hits += 1
+        if owned:
+            try:
+                rows = loader(list(owned))
+            except BaseException as e:
+                with self._lock:
+                    for key in owned:
+                        self._rows.pop(key, None)
+                for fut in owned.values():
+                    fut.set_exception(e)
+                raise
+            for key, fut in owned.items():
+                fut.set_result(rows.get(key))
+        pending.update(owned)
+        return {key: fut.result() for key, fut in pending.items()}
+
+    def forget(self) -> None:
+        """Drop every row, e.g. after a tool wrote to the database."""
+        with self._lock:
+            self._rows.clear()
+
+    def count_round_trip(self) -> None:
+        with self._lock:
+            self.round_trips += 1
+
+    def stats(self) -> dict:
+        return {
+            "round_trips": self.round_trips,
+            "identity_hits": self.identity_hits,
+            "identity_misses": self.identity_misses,
+        }
+
+
+def current() -> Optional[RequestScope]:
+    return _current.get()
+
+
+@contextlib.contextmanager
+def request_scope() -> Iterator[RequestScope]:
+    """Open a scope for the current context (nested calls reuse the outer one)."""
+    scope = _current.get()
+    if scope is not None:
+        yield scope
+        return
+    scope = RequestScope()
+    token = _current.set(scope)
+    try:
+        yield scope
+    finally:
+        _current.reset(token)
+        with _totals_lock:
+            _totals["scopes"] += 1
+            for name, value in scope.stats().items():
+                _totals[name] += value
+
+
+def totals() -> dict:
+    with _totals_lock:
+        summary = dict(_totals)
+    scopes = summary["scopes"]
+    summary["avg_round_trips"] = round(summary["round_trips"] / scopes, 2) if scopes else 0.0
+    return summary
+
+
+def watch_engine(engine) -> None:
+    """Count every statement `engine` executes against the active scope, if any."""
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        scope = _current.get()
+        if scope is not None:
+            scope.count_round_trip()
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
@@ -0,0 +1,218 @@
+"""
+In-memory fuzzy name resolution for properties, projects and areas.
+
+Tools used to find rows with `name ILIKE '%...%' LIMIT 1`, which can't use an
+index and returns an arbitrary first match. NameResolver keeps a trigram index
+(pg_trgm-style padding and similarity) over the names in the database and
+returns ranked candidates; the tools then fetch the winner by primary key or
+exact name.
+
+Kinds and their sources (one index per kind, each entry remembers its table):
+
+  property   agent_inventory_view_v1.name            key: asset_id
+  project    entrestate_inventory.name               key: name
+             dld_sales_transactions.project_name_en  key: project_name_en
+  area       entrestate_area_cards.area              key: area
+             dld_area_benchmarks.area_name_clean     key: area_name_clean
+
+refresh() re-reads only the sources whose tables saw writes since the last
+load (pg_stat_user_tables), builds new indexes off to the side and swaps them
+in, so lookups never block on a refresh.
+"""
+
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+# Candidates scoring below this are not returned (pg_trgm's default similarity threshold).
+MIN_SCORE = 0.3
+# Candidates re-scored exactly after the trigram-overlap pre-selection.
+_SHORTLIST = 64
+# Minimum gap between on-demand loads while the index has never been built.
+_COLD_RETRY_SECONDS = 30.0
+
+# (kind, table, SQL returning key, name[, area]) — one entry per source.
+SOURCES: Tuple[Tuple[str, str, str], ...] = (
+    ("property", "agent_inventory_view_v1",
+     "SELECT asset_id, name, area FROM agent_inventory_view_v1 WHERE name IS NOT NULL"),
+    ("project", "entrestate_inventory",
+     "SELECT DISTINCT name, name, area FROM entrestate_inventory WHERE name IS NOT NULL"),
+    ("project", "dld_sales_transactions",
+     "SELECT DISTINCT project_name_en, project_name_en FROM dld_sales_transactions "
+     "WHERE project_name_en IS NOT NULL"),
+    ("area", "entrestate_area_cards",
+     "SELECT area, area FROM entrestate_area_cards WHERE area IS NOT NULL"),
+    ("area", "dld_area_benchmarks",
+     "SELECT area_name_clean, area_name_clean FROM dld_area_benchmarks WHERE area_name_clean IS NOT NULL"),
+)
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(name: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    folded = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM.sub(" ", folded.lower()).strip()
+
+
+def trigrams(normalized: str) -> frozenset:
+    """pg_trgm-style trigrams: each word padded with two leading and one trailing space."""
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return frozenset(grams)
+
+
+def score(query: str, query_grams: frozenset, name: str, name_grams: frozenset) -> float:
+    """
+    Rank of `name` for `query` (both normalized), in [0, 1]. Exact matches
+    score 1, prefixes and substrings (what ILIKE '%q%' matched) sit above
+    any fuzzy match, shorter names first. Fuzzy matches blend how much of the
+    query appears in the name (like pg_trgm word_similarity, so a typo in a
+    long name still matches) with plain trigram similarity.
+    """
+    if query == name:
+        return 1.0
+    coverage = len(query) / len(name) if name else 0.0
+    if name.startswith(query):
+        return 0.9 + 0.09 * coverage
+    if query in name:
+        return 0.75 + 0.1 * coverage
+    if not query_grams:
+        return 0.0
+    shared = len(query_grams & name_grams)
+    similarity = shared / len(query_grams | name_grams)
+    return 0.74 * (0.7 * shared / len(query_grams) + 0.3 * similarity)
+
+
+class NameIndex:
+    """Trigram index over one kind of name. Immutable once built."""
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries = entries
+        self._norm = [normalize(e["name"]) for e in entries]
+        self._grams = [trigrams(n) for n in self._norm]
+        self._postings: Dict[str, List[int]] = {}
+        for i, grams in enumerate(self._grams):
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, query: str, limit: int = 5, source: Optional[str] = None) -> List[Dict[str, Any]]:
+        q = normalize(query)
+        if not q:
+            return []
+        q_grams = trigrams(q)
+        overlap: Counter = Counter()
+        for gram in q_grams:
+            overlap.update(self._postings.get(gram, ()))
+
+        if source is not None:
+            overlap = Counter({i: n for i, n in overlap.items() if self.entries[i]["source"] == source})
+        # Most shared trigrams first; among ties the shortest name (closest to exact).
+        shortlist = heapq.nlargest(_SHORTLIST, overlap.items(), key=lambda kv: (kv[1], -len(self._norm[kv[0]])))
+
+        ranked = []
+        for i, _ in shortlist:
+            s = score(q, q_grams, self._norm[i], self._grams[i])
+            if s >= MIN_SCORE:
+                ranked.append((s, -len(self._norm[i]), i))
+        ranked.sort(reverse=True)
+        return [{**self.entries[i], "score": round(s, 3)} for s, _, i in ranked[:limit]]
+
+
+class NameResolver:
+    def __init__(self, engine):
+        self.engine = engine
+        self.loaded_at: Optional[float] = None
+        self.refreshes = 0
+        self.last_error: Optional[str] = None
+        self._indexes: Dict[str, NameIndex] = {}
+        self._rows: Dict[str, List[Dict[str, Any]]] = {}  # table -> entries
+        self._stamps: Dict[str, int] = {}  # table -> write counter at last load
+        self._attempted_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at is not None
+
+    def refresh(self) -> None:
+        """Reload the sources whose tables changed and rebuild the affected indexes."""
+        if self.engine is None:
+            return
+        with self._lock:
+            self._attempted_at = time.monotonic()
+            tables = sorted({table for _, table, _ in SOURCES})
+            with self.engine.connect() as conn:
+                stamps = {
+                    row.relname: int(row.writes)
+                    for row in conn.execute(
+                        text(
+                            "SELECT relname, n_tup_ins + n_tup_upd + n_tup_del AS writes "
+                            "FROM pg_stat_user_tables WHERE relname = ANY(:tables)"
+                        ),
+                        {"tables": tables},
+                    )
+                }
+                changed_kinds = set()
+                for kind, table, sql in SOURCES:
+                    if table in self._rows and stamps.get(table) == self._stamps.get(table):
+                        continue
+                    try:
+                        with conn.begin_nested():
+                            rows = conn.execute(text(sql)).fetchall()
+                    except Exception as e:
+                        # A missing source table just contributes no names.
+                        self.last_error = f"{table}: {e}"
+                        rows = []
+                    self._rows[table] = [
+                        {"kind": kind, "source": table, "key": r[0], "name": r[1],
+                         **({"area": r[2]} if len(r) > 2 else {})}
+                        for r in rows
+                    ]
+                    self._stamps[table] = stamps.get(table)
+                    changed_kinds.add(kind)
+
+            for kind in changed_kinds:
+                entries = [e for k, table, _ in SOURCES if k == kind for e in self._rows.get(table, [])]
+                self._indexes[kind] = NameIndex(entries)
+            self.loaded_at = time.time()
+            self.refreshes += 1
+
+    def search(self, kind: str, query: str, limit: int = 5, source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Ranked candidates ({kind, source, key, name, score, ...}) for `query`, best first."""
+        if not self.ready and (
+            self._attempted_at is None or time.monotonic() - self._attempted_at > _COLD_RETRY_SECONDS
+        ):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = str(e)
+        index = self._indexes.get(kind)
+        if index is None or not query:
+            return []
+        return index.search(query, limit=limit, source=source)
+
+    def best(self, kind: str, query: str, source: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        matches = self.search(kind, query, limit=1, source=source)
+        return matches[0] if matches else None
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "loaded_at": self.loaded_at,
+            "refreshes": self.refreshes,
+            "last_error": self.last_error,
+            "entries": {kind: len(index) for kind, index in self._indexes.items()},
+        }
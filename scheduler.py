@@ -0,0 +1,67 @@
+"""
+Background periodic jobs for the API process.
+
+Each PeriodicTask runs its function on a daemon thread every `interval`
+seconds. A failing run is recorded and the loop carries on, so one bad
+refresh never stops the next one. An interval of 0 disables the task.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+
+class PeriodicTask:
+    def __init__(self, name: str, interval: float, fn: Callable[[], None], run_immediately: bool = False):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.run_immediately = run_immediately
+        self.runs = 0
+        self.last_run_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=f"lelwa-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def trigger(self) -> None:
+        """Run as soon as possible instead of waiting for the next interval."""
+        self._wake.set()
+
+    def run_once(self) -> None:
+        try:
+            self.fn()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+        self.runs += 1
+        self.last_run_at = time.time()
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "last_error": self.last_error,
+        }
+
+    def _loop(self) -> None:
+        if self.run_immediately:
+            self.run_once()
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.run_once()
@@ -395,3 +395,241 @@ AS $fn$
         ROUND(AVG(score_0_100)::numeric, 1) AS avg_score
     FROM market_scores_v1;
 $fn$;
+
+-- MARKET REGIME ROLLUPS
+-- Maintained incrementally by statement-level triggers on the source tables,
+-- so get_market_regime reads O(days) rows instead of scanning the DLD feed.
+-- Run scripts/backfill_market_rollups.py once after creating them (and after
+-- bulk loads that bypass triggers, e.g. COPY with triggers disabled).
+CREATE TABLE IF NOT EXISTS market_tx_daily (
+    day      DATE NOT NULL,
+    area     TEXT NOT NULL DEFAULT '',
+    tx_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, area)
+);
+
+CREATE TABLE IF NOT EXISTS market_inventory_rollup (
+    final_status TEXT NOT NULL DEFAULT '',
+    launch_year  INT NOT NULL DEFAULT 0,
+    row_count    BIGINT NOT NULL DEFAULT 0,
+    demand_sum   DOUBLE PRECISION NOT NULL DEFAULT 0,
+    demand_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (final_status, launch_year)
+);
+
+-- The regime reads the rollups only once a backfill has been recorded here.
+CREATE TABLE IF NOT EXISTS market_rollup_state (
+    name          TEXT PRIMARY KEY,
+    backfilled_at TIMESTAMP
+);
+
+-- area_name_en is read through to_jsonb so the rollup works whether or not the
+-- DLD feed carries it (rows without it roll up under area '').
+CREATE OR REPLACE FUNCTION market_tx_daily_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $fn$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM market_tx_daily;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO market_tx_daily AS r (day, area, tx_count)
+        SELECT o.instance_date::date, COALESCE(to_jsonb(o) ->> 'area_name_en', ''), -COUNT(*)
+        FROM old_rows o
+        WHERE o.instance_date IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT (day, area) DO UPDATE SET tx_count = r.tx_count + EXCLUDED.tx_count;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO market_tx_daily AS r (day, area, tx_count)
+        SELECT n.instance_date::date, COALESCE(to_jsonb(n) ->> 'area_name_en', ''), COUNT(*)
+        FROM new_rows n
+        WHERE n.instance_date IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT (day, area) DO UPDATE SET tx_count = r.tx_count + EXCLUDED.tx_count;
+    END IF;
+    RETURN NULL;
+END;
+$fn$;
+
+CREATE OR REPLACE FUNCTION market_inventory_rollup_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $fn$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM market_inventory_rollup;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO market_inventory_rollup AS r (final_status, launch_year, row_count, demand_sum, demand_count)
+        SELECT COALESCE(o.final_status, ''), COALESCE(o.launch_year::int, 0),
+               -COUNT(*), -COALESCE(SUM(o.rental_demand_score), 0), -COUNT(o.rental_demand_score)
+        FROM old_rows o
+        GROUP BY 1, 2
+        ON CONFLICT (final_status, launch_year) DO UPDATE SET
+            row_count = r.row_count + EXCLUDED.row_count,
+            demand_sum = r.demand_sum + EXCLUDED.demand_sum,
+            demand_count = r.demand_count + EXCLUDED.demand_count;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO market_inventory_rollup AS r (final_status, launch_year, row_count, demand_sum, demand_count)
+        SELECT COALESCE(n.final_status, ''), COALESCE(n.launch_year::int, 0),
+               COUNT(*), COALESCE(SUM(n.rental_demand_score), 0), COUNT(n.rental_demand_score)
+        FROM new_rows n
+        GROUP BY 1, 2
+        ON CONFLICT (final_status, launch_year) DO UPDATE SET
+            row_count = r.row_count + EXCLUDED.row_count,
+            demand_sum = r.demand_sum + EXCLUDED.demand_sum,
+            demand_count = r.demand_count + EXCLUDED.demand_count;
+    END IF;
+    RETURN NULL;
+END;
+$fn$;
+
+-- Rebuild both rollups from the source tables. Writers are blocked (SHARE
+-- lock) for the duration, so no trigger delta is lost or double counted.
+CREATE OR REPLACE FUNCTION market_rollups_backfill()
+RETURNS void
+LANGUAGE plpgsql
+AS $fn$
+BEGIN
+    LOCK TABLE dld_sales_transactions, entrestate_inventory IN SHARE MODE;
+
+    DELETE FROM market_tx_daily;
+    INSERT INTO market_tx_daily (day, area, tx_count)
+    SELECT t.instance_date::date, COALESCE(to_jsonb(t) ->> 'area_name_en', ''), COUNT(*)
+    FROM dld_sales_transactions t
+    WHERE t.instance_date IS NOT NULL
+    GROUP BY 1, 2;
+
+    DELETE FROM market_inventory_rollup;
+    INSERT INTO market_inventory_rollup (final_status, launch_year, row_count, demand_sum, demand_count)
+    SELECT COALESCE(i.final_status, ''), COALESCE(i.launch_year::int, 0),
+           COUNT(*), COALESCE(SUM(i.rental_demand_score), 0), COUNT(i.rental_demand_score)
+    FROM entrestate_inventory i
+    GROUP BY 1, 2;
+
+    INSERT INTO market_rollup_state (name, backfilled_at) VALUES ('market_regime', NOW())
+    ON CONFLICT (name) DO UPDATE SET backfilled_at = EXCLUDED.backfilled_at;
+END;
+$fn$;
+
+-- The source tables are loaded by the data pipeline, so only attach triggers
+-- where they exist.
+DO $do$
+BEGIN
+    IF to_regclass('dld_sales_transactions') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS dld_sales_transactions_instance_date_idx
+            ON dld_sales_transactions (instance_date);
+        -- Exact project lookups after name resolution (resolver.py).
+        CREATE INDEX IF NOT EXISTS dld_sales_transactions_project_idx
+            ON dld_sales_transactions (project_name_en, instance_date DESC);
+        DROP TRIGGER IF EXISTS market_tx_daily_ins ON dld_sales_transactions;
+        DROP TRIGGER IF EXISTS market_tx_daily_upd ON dld_sales_transactions;
+        DROP TRIGGER IF EXISTS market_tx_daily_del ON dld_sales_transactions;
+        DROP TRIGGER IF EXISTS market_tx_daily_trunc ON dld_sales_transactions;
+        CREATE TRIGGER market_tx_daily_ins AFTER INSERT ON dld_sales_transactions
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION market_tx_daily_trg();
+        CREATE TRIGGER market_tx_daily_upd AFTER UPDATE ON dld_sales_transactions
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION market_tx_daily_trg();
+        CREATE TRIGGER market_tx_daily_del AFTER DELETE ON dld_sales_transactions
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION market_tx_daily_trg();
+        CREATE TRIGGER market_tx_daily_trunc AFTER TRUNCATE ON dld_sales_transactions
+            FOR EACH STATEMENT EXECUTE FUNCTION market_tx_daily_trg();
+    END IF;
+
+    IF to_regclass('entrestate_inventory') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS entrestate_inventory_name_idx ON entrestate_inventory (name);
+        DROP TRIGGER IF EXISTS market_inventory_rollup_ins ON entrestate_inventory;
+        DROP TRIGGER IF EXISTS market_inventory_rollup_upd ON entrestate_inventory;
+        DROP TRIGGER IF EXISTS market_inventory_rollup_del ON entrestate_inventory;
+        DROP TRIGGER IF EXISTS market_inventory_rollup_trunc ON entrestate_inventory;
+        CREATE TRIGGER market_inventory_rollup_ins AFTER INSERT ON entrestate_inventory
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION market_inventory_rollup_trg();
+        CREATE TRIGGER market_inventory_rollup_upd AFTER UPDATE ON entrestate_inventory
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION market_inventory_rollup_trg();
+        CREATE TRIGGER market_inventory_rollup_del AFTER DELETE ON entrestate_inventory
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION market_inventory_rollup_trg();
+        CREATE TRIGGER market_inventory_rollup_trunc AFTER TRUNCATE ON entrestate_inventory
+            FOR EACH STATEMENT EXECUTE FUNCTION market_inventory_rollup_trg();
+    END IF;
+END;
+$do$;
+
+-- PROACTIVE PRICE-DROP MATCHES
+-- entrestate_inventory writes append the touched project names to
+-- inventory_change_log; the proactive scan (proactive.py) consumes the log,
+-- joins the changed price drops against investor_intent_profiles in one
+-- statement and keeps the matches in proactive_matches for the console.
+CREATE TABLE IF NOT EXISTS inventory_change_log (
+    change_id  BIGSERIAL PRIMARY KEY,
+    name       TEXT NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Scan progress: last consumed change_id (the watermark) and last run.
+CREATE TABLE IF NOT EXISTS proactive_scan_state (
+    name           TEXT PRIMARY KEY,
+    last_change_id BIGINT NOT NULL DEFAULT 0,
+    last_run_at    TIMESTAMP,
+    last_drops     INT NOT NULL DEFAULT 0,
+    last_matches   INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS proactive_matches (
+    id              BIGSERIAL PRIMARY KEY,
+    session_id      TEXT NOT NULL,
+    property_name   TEXT NOT NULL,
+    area            TEXT,
+    price_aed       NUMERIC,
+    price_delta_pct DOUBLE PRECISION,
+    budget_aed      NUMERIC,
+    status          TEXT NOT NULL DEFAULT 'new',
+    matched_at      TIMESTAMP NOT NULL DEFAULT NOW(),
+    UNIQUE (session_id, property_name)
+);
+-- Console paging: most recently (re-)matched first, per lead or across all leads.
+CREATE INDEX IF NOT EXISTS proactive_matches_session_idx ON proactive_matches (session_id, matched_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS proactive_matches_matched_idx ON proactive_matches (matched_at DESC, id DESC);
+
+-- The two halves of the profile join: no area preference (budget range scan)
+-- and an exact, case-insensitive area preference (hash or merge join).
+CREATE INDEX IF NOT EXISTS investor_intent_profiles_any_area_idx
+    ON investor_intent_profiles (budget_aed) WHERE preferred_area IS NULL;
+CREATE INDEX IF NOT EXISTS investor_intent_profiles_area_idx
+    ON investor_intent_profiles (LOWER(preferred_area), budget_aed);
+
+CREATE OR REPLACE FUNCTION inventory_change_log_trg()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $fn$
+BEGIN
+    INSERT INTO inventory_change_log (name)
+    SELECT DISTINCT n.name FROM new_rows n WHERE n.name IS NOT NULL;
+    RETURN NULL;
+END;
+$fn$;
+
+DO $do$
+BEGIN
+    IF to_regclass('entrestate_inventory') IS NOT NULL THEN
+        DROP TRIGGER IF EXISTS inventory_change_log_ins ON entrestate_inventory;
+        DROP TRIGGER IF EXISTS inventory_change_log_upd ON entrestate_inventory;
+        CREATE TRIGGER inventory_change_log_ins AFTER INSERT ON entrestate_inventory
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_change_log_trg();
+        CREATE TRIGGER inventory_change_log_upd AFTER UPDATE ON entrestate_inventory
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION inventory_change_log_trg();
+    END IF;
+END;
+$do$;
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Backfill and verify the market-regime rollups (see MARKET REGIME ROLLUPS in schema.sql).
+
+The backfill rebuilds market_tx_daily and market_inventory_rollup from the
+source tables in one transaction (writers wait on a SHARE lock) and marks the
+rollups ready, after which get_market_regime reads them instead of scanning.
+
+The check computes the six regime signals both ways inside one REPEATABLE
+READ transaction (same snapshot, same NOW()) and fails if they differ.
+
+Usage:
+  psql "$DATABASE_URL" -f schema.sql            # creates the tables and triggers
+  python3 scripts/backfill_market_rollups.py    # backfill, then check
+  python3 scripts/backfill_market_rollups.py --check
+Requires DATABASE_URL.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dotenv import load_dotenv  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from tools import ToolExecutor  # noqa: E402
+
+SIGNALS = ("monthly_tx", "recent_launches", "avg_demand", "construction_count", "handover_wave", "avg_growth")
+
+
+def _same(a, b) -> bool:
+    if a is None or b is None:
+        return a is b
+    return math.isclose(float(a), float(b), rel_tol=1e-9, abs_tol=1e-9)
+
+
+def backfill(engine) -> None:
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text("SELECT market_rollups_backfill()"))
+        days = conn.execute(text("SELECT COUNT(*) FROM market_tx_daily")).scalar()
+        groups = conn.execute(text("SELECT COUNT(*) FROM market_inventory_rollup")).scalar()
+    print(f"backfilled {days} day/area rows and {groups} inventory groups "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+def check(engine) -> bool:
+    executor = ToolExecutor(engine)
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        with conn.begin():
+            ready = conn.execute(text(
+                "SELECT backfilled_at FROM market_rollup_state WHERE name = 'market_regime'"
+            )).scalar()
+            if ready is None:
+                print("rollups have not been backfilled; run without --check first")
+                return False
+
+            started = time.perf_counter()
+            scanned = executor.regime_signals(conn, use_rollups=False)
+            scan_ms = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            rolled = executor.regime_signals(conn)
+            rollup_ms = (time.perf_counter() - started) * 1000
+
+    ok = True
+    print(f"{'signal':<20}{'full scan':>18}{'rollup':>18}")
+    for name in SIGNALS:
+        match = _same(scanned[name], rolled[name])
+        ok = ok and match
+        print(f"{name:<20}{str(scanned[name]):>18}{str(rolled[name]):>18}{'' if match else '  MISMATCH'}")
+    print(f"full scan {scan_ms:.1f} ms, rollup {rollup_ms:.1f} ms (backfilled at {ready})")
+    return ok
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="only compare rollups with the full-scan query")
+    opts = parser.parse_args()
+
+    load_dotenv()
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        sys.exit("DATABASE_URL is not set")
+    engine = create_engine(url)
+
+    if not opts.check:
+        backfill(engine)
+    if not check(engine):
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+WhatsApp broadcast throughput against a local fake Twilio server.
+
+Sends --leads personalized messages two ways and reports messages/sec:
+
+  sequential   one new twilio Client per message, one at a time (the old
+               send_whatsapp path, called in a loop)
+  broadcast    ToolExecutor.tool_broadcast_whatsapp: pooled client,
+               --concurrency senders, paced to --mps per sender
+
+The fake server (scripts/fake_twilio_server.py) runs in-process with
+--latency-ms per request; credentials go to a temporary channel DB.
+
+Usage:
+  python3 scripts/bench_broadcast.py --leads 300 --latency-ms 40 --concurrency 16 --mps 80
+No database needed.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mps", type=float, default=80.0, help="per-sender pacing (0 = unpaced)")
+    parser.add_argument("--server-max-mps", type=float, default=0.0, help="fake server's 429 threshold")
+    parser.add_argument("--skip-sequential", action="store_true")
+    opts = parser.parse_args()
+
+    from fake_twilio_server import serve_in_background
+
+    server = serve_in_background(latency_ms=opts.latency_ms, max_mps=opts.server_max_mps)
+    # Configuration is read at import time.
+    os.environ["TWILIO_API_BASE_URL"] = server.base_url
+    os.environ["TWILIO_MESSAGES_PER_SECOND"] = str(opts.mps)
+    os.environ["WHATSAPP_BROADCAST_CONCURRENCY"] = str(opts.concurrency)
+    os.environ["WHATSAPP_BROADCAST_MAX_LEADS"] = str(max(opts.leads, 1))
+    os.environ["CHANNEL_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="lelwa-bench-"), "channels.db")
+
+    from twilio.rest import Client
+
+    from channels import get_channel_config, save_channel_config
+    from messaging import _PooledHttpClient, whatsapp_address
+    from tools import ToolExecutor
+
+    config = {"account_sid": "AC" + "0" * 32, "auth_token": "bench-token", "from_number": "whatsapp:+14155238886"}
+    save_channel_config("bench", "whatsapp", config)
+    executor = ToolExecutor(None)
+    leads = [
+        {"to_number": f"+9715{i:08d}", "investor_name": f"Investor {i}", "property_name": f"Project {i % 37}"}
+        for i in range(opts.leads)
+    ]
+    template = "Hi {investor_name}, {property_name} just dropped in price. Want the offer?"
+
+    print(f"{opts.leads} leads, fake Twilio latency {opts.latency_ms} ms, "
+          f"concurrency {opts.concurrency}, pacing {opts.mps or 'off'} msg/s per sender")
+    print(f"{'mode':>12} {'seconds':>8} {'msg/s':>8} {'sent':>6} {'failed':>6}")
+
+    if not opts.skip_sequential:
+        started = time.perf_counter()
+        sent = 0
+        for lead in leads:
+            stored = get_channel_config("bench", "whatsapp")
+            client = Client(stored["account_sid"], stored["auth_token"],
+                            http_client=_PooledHttpClient(server.base_url, 1))
+            client.messages.create(
+                from_=stored["from_number"], to=whatsapp_address(lead["to_number"]),
+                body=template.format(**lead),
+            )
+            sent += 1
+        elapsed = time.perf_counter() - started
+        print(f"{'sequential':>12} {elapsed:>8.2f} {sent / elapsed:>8.1f} {sent:>6} {0:>6}")
+
+    started = time.perf_counter()
+    result = executor.tool_broadcast_whatsapp(
+        {"leads": leads, "message_body": template}, session_id="bench", user_id="bench"
+    )
+    elapsed = time.perf_counter() - started
+    if "error" in result:
+        sys.exit(result["error"])
+    print(f"{'broadcast':>12} {elapsed:>8.2f} {result['messages_per_second']:>8.1f} "
+          f"{result['sent']:>6} {result['failed']:>6}")
+    print(f"server: {server.received} received, {server.rejected} rejected (429), "
+          f"{server.connections} connections; pool: {executor.twilio.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Bulk document rendering throughput by process count.
+
+Renders --documents synthetic offer PDFs (property rows shaped like
+agent_inventory_view_v1) through artifacts.write_once on a spawn process
+pool, as BulkDocumentJobs does, once per --processes value, each into an
+empty directory. Pool start-up is excluded from the timings.
+
+Usage:
+  python3 scripts/bench_bulk_documents.py --documents 200 --processes 1 2 4 8
+No database needed.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from artifacts import write_once  # noqa: E402
+from documents import render_date, render_document_pdf  # noqa: E402
+
+
+def synthetic_row(i: int) -> dict:
+    return {
+        "asset_id": f"A{i:05d}", "name": f"Project {i}", "developer": "Developer", "city": "Dubai",
+        "area": "Dubai Marina", "status": "Off Plan", "completion_year": "2027", "price_aed": 1_250_000 + i * 1000,
+        "beds": "2 BR", "score_0_100": 74, "classification": "Core", "safety_band": "Capital Safe",
+        "roi_band": "Mid", "timeline_risk_band": "Low", "liquidity_band": "High", "status_band": "Handover2027",
+        "price_tier": "Mid", "reason_codes": '["yield"]', "risk_flags": "[]", "drivers": '["demand"]',
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    opts = parser.parse_args()
+    rows = [synthetic_row(i) for i in range(opts.documents)]
+
+    print(f"{opts.documents} documents, {os.cpu_count()} CPUs")
+    print(f"{'processes':>9} {'seconds':>8} {'docs/s':>8} {'speedup':>8}")
+    baseline = None
+    for processes in sorted(set(opts.processes)):
+        root = tempfile.mkdtemp(prefix="lelwa-bench-")
+        try:
+            with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+                # Start every process (and import the renderer) before timing.
+                wait([pool.submit(time.sleep, 0.2) for _ in range(processes)])
+                started = time.perf_counter()
+                futures = [
+                    pool.submit(write_once, os.path.join(root, f"offer_{i}.pdf"), render_document_pdf,
+                                "offer", row["name"], row, render_date())
+                    for i, row in enumerate(rows)
+                ]
+                wait(futures)
+                elapsed = time.perf_counter() - started
+                for future in futures:
+                    future.result()
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        baseline = baseline or elapsed
+        print(f"{processes:>9} {elapsed:>8.2f} {opts.documents / elapsed:>8.1f} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Channel store concurrency benchmark: many simultaneous preflight / resume
+operations from several worker processes.
+
+Each of --processes processes runs --threads threads for --seconds, looping
+over a mix of get_channel_config (the send preflight, ~80%),
+create_resume_token + consume_resume_token (~18%) and save_channel_config
+(~2%) for --users users. Two stores are compared on fresh database files:
+
+  legacy    connection per call, rollback journal, expired-token DELETE on
+            every consume (the previous channels.py, reproduced here)
+  current   channels.py: WAL, per-thread connections, config cache
+
+Reports operations/sec, latency percentiles and "database is locked" errors.
+
+Usage:
+  python3 scripts/bench_channels.py --processes 4 --threads 8 --seconds 5
+No database needed.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+
+# ── The previous store ─────────────────────────────────────────────────────
+
+class LegacyStore:
+    def __init__(self, path: str):
+        self.path = path
+        with sqlite3.connect(path) as db:
+            db.execute("CREATE TABLE IF NOT EXISTS user_channels (user_id TEXT NOT NULL, channel TEXT NOT NULL, "
+                       "status TEXT NOT NULL DEFAULT 'connected', config_json TEXT NOT NULL, "
+                       "updated_at TEXT NOT NULL, PRIMARY KEY (user_id, channel))")
+            db.execute("CREATE TABLE IF NOT EXISTS resume_tokens (token TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+                       "session_id TEXT NOT NULL, tool_name TEXT NOT NULL, args_json TEXT NOT NULL, "
+                       "created_at TEXT NOT NULL)")
+
+    def get_channel_config(self, user_id, channel):
+        with sqlite3.connect(self.path) as db:
+            row = db.execute("SELECT config_json FROM user_channels WHERE user_id=? AND channel=? "
+                             "AND status='connected'", (user_id, channel)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_channel_config(self, user_id, channel, config):
+        with sqlite3.connect(self.path) as db:
+            db.execute("INSERT INTO user_channels (user_id, channel, status, config_json, updated_at) "
+                       "VALUES (?, ?, 'connected', ?, ?) ON CONFLICT (user_id, channel) DO UPDATE SET "
+                       "config_json = excluded.config_json, status = 'connected', updated_at = excluded.updated_at",
+                       (user_id, channel, json.dumps(config), datetime.now().isoformat()))
+
+    def create_resume_token(self, user_id, session_id, tool_name, args):
+        token = str(uuid.uuid4())
+        with sqlite3.connect(self.path) as db:
+            db.execute("INSERT INTO resume_tokens (token, user_id, session_id, tool_name, args_json, created_at) "
+                       "VALUES (?, ?, ?, ?, ?, ?)",
+                       (token, user_id, session_id, tool_name, json.dumps(args), datetime.now().isoformat()))
+        return token
+
+    def consume_resume_token(self, token):
+        cutoff = (datetime.now() - timedelta(hours=24)).isoformat()
+        with sqlite3.connect(self.path) as db:
+            db.execute("DELETE FROM resume_tokens WHERE created_at < ?", (cutoff,))
+            row = db.execute("SELECT user_id, session_id, tool_name, args_json FROM resume_tokens "
+                             "WHERE token=? AND created_at >= ?", (token, cutoff)).fetchone()
+            if not row:
+                return None
+            db.execute("DELETE FROM resume_tokens WHERE token=?", (token,))
+        return {"user_id": row[0]}
+
+
+def _store(mode: str, path: str):
+    if mode == "legacy":
+        return LegacyStore(path)
+    os.environ["CHANNEL_DB_PATH"] = path
+    import channels
+    return channels
+
+
+def _config(user: int) -> dict:
+    return {"account_sid": f"AC{user:032d}", "auth_token": "token", "from_number": "whatsapp:+14155238886"}
+
+
+def seed(mode: str, path: str, users: int) -> None:
+    store = _store(mode, path)
+    for user in range(users):
+        store.save_channel_config(f"user{user}", "whatsapp", _config(user))
+
+
+def worker(mode: str, path: str, threads: int, seconds: float, users: int):
+    store = _store(mode, path)
+    latencies, errors = [], []
+    deadline = time.monotonic() + seconds
+
+    def loop(seed_value):
+        rng = random.Random(seed_value)
+        local_lat, local_err = [], 0
+        while time.monotonic() < deadline:
+            user = f"user{rng.randrange(users)}"
+            roll = rng.random()
+            started = time.perf_counter()
+            try:
+                if roll < 0.80:
+                    store.get_channel_config(user, "whatsapp")
+                elif roll < 0.98:
+                    token = store.create_resume_token(user, "s", "send_whatsapp", {"to_number": "+971500000000"})
+                    store.consume_resume_token(token)
+                else:
+                    store.save_channel_config(user, "whatsapp", _config(rng.randrange(users)))
+            except sqlite3.OperationalError:
+                local_err += 1
+                continue
+            local_lat.append(time.perf_counter() - started)
+        latencies.extend(local_lat)
+        errors.append(local_err)
+
+    pool = [threading.Thread(target=loop, args=(os.getpid() * 1000 + i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, sum(errors)
+
+
+def run(mode: str, opts) -> None:
+    root = tempfile.mkdtemp(prefix="lelwa-bench-")
+    path = os.path.join(root, "channels.db")
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Pool(1) as pool:
+            pool.apply(seed, (mode, path, opts.users))
+        with ctx.Pool(opts.processes) as pool:
+            started = time.perf_counter()
+            results = pool.starmap(worker, [(mode, path, opts.threads, opts.seconds, opts.users)] * opts.processes)
+            elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    n = len(latencies)
+
+    def pct(p):
+        return latencies[min(n - 1, int(p * n))] * 1000 if n else float("nan")
+
+    print(f"{mode:>8} {n / opts.seconds:>9.0f} {pct(0.5):>8.3f} {pct(0.99):>8.2f} {pct(1.0) if n else 0:>8.1f} "
+          f"{errors:>7} ({elapsed:.1f}s wall)")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", default=["legacy", "current"], choices=["legacy", "current"])
+    opts = parser.parse_args()
+    print(f"{opts.processes} processes x {opts.threads} threads, {opts.seconds}s, {opts.users} users")
+    print(f"{'store':>8} {'ops/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'locked':>7}")
+    for mode in opts.modes:
+        run(mode, opts)
+
+
+if __name__ == "__main__":
+    main_cli()
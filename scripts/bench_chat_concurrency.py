@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Concurrent /v1/chat latency benchmark.
+
+Drives the FastAPI app in-process (httpx ASGITransport) with a fake Gemini
+model whose rounds block for --llm-ms, then reports p50/p99 latency for
+concurrent /v1/chat calls and for /health probes due while they run.
+
+  blocking   LLM rounds and tool calls run inline on the event loop (the old pipeline)
+  offloaded  the current pipeline (_offload + CHAT_MAX_INFLIGHT)
+
+Usage:
+  python3 scripts/bench_chat_concurrency.py --requests 64 --concurrency 32 --llm-ms 200
+Requires httpx (pip install httpx). No database or API key needed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+
+FINAL_JSON = json.dumps({
+    "reply": "Prepared a reply for the 1BR Dubai Marina lead.",
+    "prepared_blocks": [{"type": "reply", "title": "Reply", "content": "Hi, sharing options."}],
+    "prepared_actions": [],
+})
+
+
+class _FakeChat:
+    def __init__(self, llm_seconds: float):
+        self.llm_seconds = llm_seconds
+
+    def send_message(self, content, **kwargs):
+        time.sleep(self.llm_seconds)  # blocking, like the real google.generativeai client
+        return SimpleNamespace(candidates=[], text=FINAL_JSON)
+
+
+class _FakeModel:
+    llm_seconds = 0.2
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def start_chat(self, history=None):
+        return _FakeChat(self.llm_seconds)
+
+
+async def _inline(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+def _pct(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def _run(requests: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=main.app)
+    chat_ms, health_ms = [], []
+    gate = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one_chat(i):
+            async with gate:
+                t0 = time.perf_counter()
+                r = await client.post("/v1/chat", json={
+                    "message": "Lead: 1BR Dubai Marina budget 1.4M",
+                    "session_id": f"bench-{i}",
+                })
+                r.raise_for_status()
+                chat_ms.append((time.perf_counter() - t0) * 1000)
+
+        async def health_probe(stop: asyncio.Event):
+            # Timed from the moment the probe is due, so event-loop stalls are counted.
+            while not stop.is_set():
+                due = time.perf_counter() + 0.02
+                await asyncio.sleep(0.02)
+                await client.get("/health")
+                health_ms.append((time.perf_counter() - due) * 1000)
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(health_probe(stop))
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one_chat(i) for i in range(requests)))
+        wall = time.perf_counter() - t0
+        stop.set()
+        await prober
+
+    return {
+        "chat_p50_ms": round(statistics.median(chat_ms), 1),
+        "chat_p99_ms": round(_pct(chat_ms, 99), 1),
+        "health_p99_ms": round(_pct(health_ms, 99), 1),
+        "throughput_rps": round(requests / wall, 1),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-ms", type=float, default=200.0)
+    opts = parser.parse_args()
+
+    _FakeModel.llm_seconds = opts.llm_ms / 1000
+    main.genai.GenerativeModel = _FakeModel
+
+    offload = main._offload
+    results = {}
+    for label, runner in (("blocking", _inline), ("offloaded", offload)):
+        main._offload = runner
+        main._chat_slots = asyncio.Semaphore(main.CHAT_MAX_INFLIGHT)  # fresh per event loop
+        results[label] = asyncio.run(_run(opts.requests, opts.concurrency))
+    main._offload = offload
+
+    print(f"{opts.requests} requests, concurrency {opts.concurrency}, "
+          f"LLM round {opts.llm_ms:.0f} ms, CHAT_MAX_INFLIGHT={main.CHAT_MAX_INFLIGHT}")
+    print(f"{'mode':<10} {'chat p50':>10} {'chat p99':>10} {'/health p99':>12} {'req/s':>8}")
+    for label, r in results.items():
+        print(f"{label:<10} {r['chat_p50_ms']:>10} {r['chat_p99_ms']:>10} "
+              f"{r['health_p99_ms']:>12} {r['throughput_rps']:>8}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Broker response parsing: the previous regex cascade vs json_extract.
+
+Runs a corpus of model outputs in the shapes seen from Gemini and Ollama
+(fenced, wrapped in prose, cut off at the token limit, raw newlines inside
+strings, a JSON reply nested in the reply, a long --blocks answer) through
+
+  legacy    the previous _parse_broker_response and the reply unwrapping in
+            _ensure_prepared_contract (reproduced here)
+  current   main._parse_broker_response + main._ensure_prepared_contract
+            (which also fills in the contract's default blocks and actions,
+            a few microseconds legacy is not charged for)
+
+and prints, per output, the parse time, whether the expected reply came
+back and how many of the model's prepared_blocks survived.
+
+Usage:
+  python3 scripts/bench_parse.py --blocks 40
+No database or API key needed.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main  # noqa: E402
+
+REPLY = "Hi Sara, three 1BR units in Dubai Marina fit AED 1.4M — shall I book Thursday's viewing?"
+
+
+def _answer(blocks: int) -> dict:
+    return {
+        "reply": REPLY,
+        "prepared_blocks": [
+            {"type": "summary", "title": f"Option {i + 1}",
+             "content": f"Unit {1200 + i}, AED {1.3 + i / 100:.2f}M, {{2-3}} year plan, \"ready\" Q{i % 4 + 1}."}
+            for i in range(blocks)
+        ],
+        "prepared_actions": [
+            {"id": "send_offer", "label": "Send on WhatsApp", "tool_name": "send_whatsapp",
+             "args": {"to_number": "", "message_body": REPLY}, "requires": "connection"},
+        ],
+    }
+
+
+def corpus(blocks: int) -> list:
+    """(name, model output, model's block count) — the expected reply is always REPLY."""
+    small = json.dumps(_answer(3))
+    pretty = json.dumps(_answer(3), indent=2, ensure_ascii=False)
+    long = json.dumps(_answer(blocks), indent=2)
+    return [
+        ("bare", small, 3),
+        ("fenced", f"```json\n{pretty}\n```", 3),
+        ("prose + fence", f"Here is the prepared work for Sara:\n\n```json\n{pretty}\n```\nLet me know!", 3),
+        ("prose, no fence", f"Sure. {small} Anything else?", 3),
+        ("trailing note", small + "\n\nNote: prices are indicative {subject to change}.", 3),
+        ("raw newlines", pretty.replace("\\n", "\n").replace("Option 2", "Option\n2"), 3),
+        ("cut mid-block", pretty[:pretty.index("Option 3") + 30], 3),
+        ("cut mid-reply", small[:small.index("shall")], 0),
+        ("cut after key", pretty[:pretty.index('"prepared_actions"') + 19], 3),
+        ("nested reply", json.dumps({"reply": small, "prepared_blocks": []}), 3),
+        ("think + fence", "<think>User wants {budget: 1.4M}. Use search_listings.</think>\n```json\n"
+                          f"{pretty}\n```", 3),
+        (f"long ({blocks} blocks)", f"Prepared:\n```json\n{long}\n```", blocks),
+        ("long, cut", long[:int(len(long) * 0.8)], None),
+    ]
+
+
+# ── The previous parser ────────────────────────────────────────────────────
+
+def legacy_parse(raw: str) -> dict:
+    text = raw.strip()
+    if text.startswith("{"):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            pass
+    m = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
+    if m:
+        try:
+            return json.loads(m.group(1))
+        except json.JSONDecodeError:
+            pass
+    m = re.search(r'\{.*?"prepared_blocks".*?\}', text, re.DOTALL)
+    if m:
+        try:
+            return json.loads(m.group(0))
+        except json.JSONDecodeError:
+            pass
+    m = re.search(r'"reply"\s*:\s*"((?:[^"\\]|\\.)*)"', text)
+    if m:
+        reply_val = m.group(1).encode().decode("unicode_escape", errors="replace")
+        if reply_val.strip():
+            return {"reply": reply_val.strip(), "prepared_blocks": [], "prepared_actions": []}
+    short = text[:400] + ("…" if len(text) > 400 else "")
+    if short.strip().startswith("{"):
+        short = "Prepared reply ready."
+    return {"reply": short, "prepared_blocks": [{"type": "summary", "title": "Prepared", "content": text}],
+            "prepared_actions": []}
+
+
+def legacy_unwrap(structured: dict) -> dict:
+    reply_text = structured.get("reply")
+    reply_text = reply_text.strip() if isinstance(reply_text, str) else ""
+    for _ in range(3):
+        if not reply_text.startswith("{"):
+            break
+        extracted = None
+        try:
+            inner = json.loads(reply_text)
+            inner_reply = inner.get("reply", "")
+            if isinstance(inner_reply, str) and inner_reply.strip():
+                extracted = inner_reply.strip()
+                if not structured.get("prepared_blocks") and isinstance(inner.get("prepared_blocks"), list):
+                    structured["prepared_blocks"] = inner["prepared_blocks"]
+        except json.JSONDecodeError:
+            m = re.search(r'"reply"\s*:\s*"((?:[^"\\]|\\.)*)"', reply_text)
+            if m:
+                extracted = m.group(1).encode().decode("unicode_escape", errors="replace")
+        if extracted and extracted.strip() and not extracted.strip().startswith("{"):
+            reply_text = extracted.strip()
+        else:
+            break
+    structured["reply"] = reply_text
+    return structured
+
+
+def legacy(raw: str) -> dict:
+    return legacy_unwrap(legacy_parse(raw))
+
+
+def current(raw: str) -> dict:
+    return main._ensure_prepared_contract(main._parse_broker_response(raw), "")
+
+
+# ── Run ────────────────────────────────────────────────────────────────────
+
+def timeit(fn, raw: str, budget: float = 0.2) -> float:
+    n, started = 0, time.perf_counter()
+    while True:
+        for _ in range(20):
+            fn(raw)
+        n += 20
+        elapsed = time.perf_counter() - started
+        if elapsed > budget:
+            return elapsed / n * 1e6
+
+
+def outcome(result: dict, expected_blocks) -> str:
+    reply = result.get("reply") or ""
+    ok = "ok " if reply == REPLY or (REPLY.startswith(reply) and len(reply) > 20) else "BAD"
+    # The model's blocks are all "summary"; the raw-text fallback's is titled "Prepared".
+    blocks = [b for b in result.get("prepared_blocks") or []
+              if isinstance(b, dict) and b.get("type") == "summary" and b.get("title") != "Prepared"]
+    want = "?" if expected_blocks is None else expected_blocks
+    return f"{ok} {len(blocks):>3}/{want:<3}"
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--blocks", type=int, default=40, help="prepared_blocks in the long outputs")
+    opts = parser.parse_args()
+
+    print(f"{'output':<18} {'bytes':>7} {'legacy us':>10} {'reply blocks':>13} {'current us':>11} {'reply blocks':>13}")
+    totals = [0.0, 0.0, 0, 0]
+    for name, raw, expected in corpus(opts.blocks):
+        legacy_us, current_us = timeit(legacy, raw), timeit(current, raw)
+        legacy_out, current_out = outcome(legacy(raw), expected), outcome(current(raw), expected)
+        totals[0] += legacy_us
+        totals[1] += current_us
+        totals[2] += legacy_out.startswith("ok")
+        totals[3] += current_out.startswith("ok")
+        print(f"{name:<18} {len(raw):>7,} {legacy_us:>10.1f} {legacy_out:>13} {current_us:>11.1f} {current_out:>13}")
+    print(f"{'total':<18} {'':>7} {totals[0]:>10.1f} {f'{totals[2]} ok':>13} {totals[1]:>11.1f} {f'{totals[3]} ok':>13}")
+
+
+if __name__ == "__main__":
+    main_cli()
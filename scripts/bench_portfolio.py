@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Portfolio optimizer benchmark over synthetic inventories.
+
+For each pool size, builds random candidate sets shaped like
+agent_ranked_for_investor_v1 rows (prices, final_rank, area, developer,
+status_band) and times optimize_portfolio(). For small pools it also
+enumerates every feasible k-subset and reports how close the heuristic gets
+to the exact optimum of the same objective.
+
+Usage:
+  python3 scripts/bench_portfolio.py --sizes 50 200 500 2000 --k 5 --trials 20
+No database needed.
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from portfolio import optimize_portfolio, portfolio_objective  # noqa: E402
+
+AREAS = ["Dubai Marina", "Downtown", "JVC", "Business Bay", "Dubai Hills", "Palm Jumeirah", "Creek Harbour", "Arjan"]
+DEVELOPERS = ["Emaar", "Damac", "Sobha", "Nakheel", "Binghatti", "Ellington", "Azizi", "Meraas"]
+BANDS = ["Completed", "Handover2025", "Handover2026", "Handover2027", "Handover2028_29"]
+
+
+def synthetic_pool(n: int, rnd: random.Random) -> list:
+    pool = []
+    for i in range(n):
+        price = round(rnd.lognormvariate(14.2, 0.6), -3)  # median ~1.5M AED
+        pool.append({
+            "asset_id": f"S{i}",
+            "name": f"Synthetic {i}",
+            "price_aed": price,
+            "final_rank": rnd.randint(30, 98),
+            # Skewed so concentration is tempting: popular areas/developers rank well.
+            "area": AREAS[min(int(rnd.expovariate(0.6)), len(AREAS) - 1)],
+            "developer": DEVELOPERS[min(int(rnd.expovariate(0.5)), len(DEVELOPERS) - 1)],
+            "status_band": rnd.choice(BANDS),
+        })
+    pool.sort(key=lambda c: -c["final_rank"])
+    return pool
+
+
+def exact_optimum(pool: list, budget: float, k: int) -> float:
+    best = None
+    for size in range(k, 0, -1):
+        for combo in itertools.combinations(pool, size):
+            obj = portfolio_objective(combo, budget)
+            if obj is not None and (best is None or obj > best):
+                best = obj
+        if best is not None:
+            return best
+    return 0.0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 500, 2000])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=8_000_000)
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--exact-size", type=int, default=22, help="pool size for the exhaustive optimality check")
+    parser.add_argument("--seed", type=int, default=7)
+    opts = parser.parse_args()
+    rnd = random.Random(opts.seed)
+
+    print(f"k={opts.k}, budget AED {opts.budget:,.0f}, {opts.trials} trials per size")
+    print(f"{'pool':>6} {'p50 ms':>9} {'p99 ms':>9} {'picks':>6} {'spent %':>8} {'areas':>6} {'devs':>5}")
+    for n in opts.sizes:
+        times, picks, spent, areas, devs = [], [], [], [], []
+        for _ in range(opts.trials):
+            pool = synthetic_pool(n, rnd)
+            started = time.perf_counter()
+            result = optimize_portfolio(pool, opts.budget, opts.k)
+            times.append((time.perf_counter() - started) * 1000)
+            picks.append(len(result["picks"]))
+            spent.append(100 * result["spent"] / opts.budget)
+            areas.append(result["diversity"]["area"])
+            devs.append(result["diversity"]["developer"])
+        times.sort()
+        p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+        print(f"{n:>6} {statistics.median(times):>9.2f} {p99:>9.2f} {statistics.mean(picks):>6.1f} "
+              f"{statistics.mean(spent):>8.1f} {statistics.mean(areas):>6.1f} {statistics.mean(devs):>5.1f}")
+
+    gaps = []
+    k = min(opts.k, 4)
+    for _ in range(opts.trials):
+        pool = synthetic_pool(opts.exact_size, rnd)
+        heuristic = optimize_portfolio(pool, opts.budget, k)["objective"]
+        optimum = exact_optimum(pool, opts.budget, k)
+        gaps.append(100 * (optimum - heuristic) / optimum if optimum else 0.0)
+    print(f"optimality gap vs exhaustive search ({opts.exact_size} candidates, k={k}): "
+          f"mean {statistics.mean(gaps):.2f}%, worst {max(gaps):.2f}%")
+
+
+if __name__ == "__main__":
+    main_cli()
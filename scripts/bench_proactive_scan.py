@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Proactive price-drop scan benchmark on synthetic data.
+
+Everything runs in one transaction that is rolled back. Temporary tables
+shadow entrestate_inventory, investor_intent_profiles, proactive_matches,
+proactive_scan_state and inventory_change_log. They copy the real tables'
+indexes, so schema.sql must have been applied.
+
+It seeds --profiles investor profiles (a fifth with no area preference) and
+--inventory projects (--drop-share of them price drops). It then times the
+first, full scan and an incremental scan after --changes projects were
+rewritten. After each scan it checks the result against a plain
+re-computation of the matches (same rule, written as one OR join): every
+expected (profile, project) pair is stored at the current price, the change
+log is consumed, and a scan with no changes writes nothing. Exits 1 on a
+failed check.
+
+Usage:
+  python3 scripts/bench_proactive_scan.py --profiles 100000 --inventory 20000 --changes 500
+Requires DATABASE_URL.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dotenv import load_dotenv  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from proactive import ProactiveScanner  # noqa: E402
+
+SETUP = """
+CREATE TEMP TABLE investor_intent_profiles (LIKE public.investor_intent_profiles INCLUDING ALL) ON COMMIT DROP;
+CREATE TEMP TABLE proactive_matches (LIKE public.proactive_matches INCLUDING ALL) ON COMMIT DROP;
+CREATE TEMP TABLE proactive_scan_state (LIKE public.proactive_scan_state INCLUDING ALL) ON COMMIT DROP;
+CREATE TEMP TABLE inventory_change_log (LIKE public.inventory_change_log INCLUDING ALL) ON COMMIT DROP;
+CREATE TEMP TABLE entrestate_inventory (
+    name TEXT, area TEXT, final_price_from NUMERIC, dld_price_delta_pct DOUBLE PRECISION
+) ON COMMIT DROP;
+CREATE INDEX ON entrestate_inventory (name);
+"""
+
+SEED = """
+INSERT INTO investor_intent_profiles (session_id, budget_aed, preferred_area)
+SELECT 'bench-' || g,
+       round((500000 + random() * 9500000)::numeric, -3),
+       CASE WHEN g % 5 = 0 THEN NULL ELSE 'Area ' || (g % :areas) END
+FROM generate_series(1, :profiles) g;
+
+INSERT INTO entrestate_inventory (name, area, final_price_from, dld_price_delta_pct)
+SELECT 'Project ' || g, 'area ' || (g % :areas),
+       round((400000 + random() * 8000000)::numeric, -3),
+       CASE WHEN random() < :drop_share THEN -20 - random() * 30 ELSE random() * 20 - 10 END
+FROM generate_series(1, :inventory) g;
+
+ANALYZE investor_intent_profiles;
+ANALYZE entrestate_inventory;
+"""
+
+CHANGE = """
+UPDATE entrestate_inventory SET final_price_from = final_price_from * 0.9, dld_price_delta_pct = -25
+WHERE name IN (SELECT 'Project ' || g FROM generate_series(1, :changes) g);
+INSERT INTO inventory_change_log (name) SELECT 'Project ' || g FROM generate_series(1, :changes) g;
+"""
+
+# The matching rule, written independently of proactive._SCAN_SQL.
+EXPECTED = """
+SELECT COUNT(*) FROM investor_intent_profiles p
+JOIN (
+    SELECT DISTINCT ON (name) name, area, final_price_from AS price
+    FROM entrestate_inventory
+    WHERE dld_price_delta_pct < :threshold AND final_price_from > 0
+    ORDER BY name, final_price_from
+) d ON p.budget_aed >= d.price AND (p.preferred_area IS NULL OR LOWER(p.preferred_area) = LOWER(d.area))
+"""
+STORED = "SELECT COUNT(*) FROM proactive_matches"
+STALE = """
+SELECT COUNT(*) FROM proactive_matches m JOIN entrestate_inventory i ON i.name = m.property_name
+WHERE m.price_aed <> i.final_price_from
+"""
+CHANGED_NOT_NEW = """
+SELECT COUNT(*) FROM proactive_matches
+WHERE property_name IN (SELECT 'Project ' || g FROM generate_series(1, :changes) g) AND status <> 'new'
+"""
+LOG = "SELECT COUNT(*) FROM inventory_change_log"
+
+
+def check(conn, params: dict, label: str, changed: bool = False) -> list:
+    """Failed checks of the matches stored after a scan."""
+    def count(sql):
+        return conn.execute(text(sql), params).scalar()
+
+    failed = []
+    expected, stored = count(EXPECTED), count(STORED)
+    if stored != expected:
+        failed.append(f"{label}: {stored} matches stored, {expected} expected")
+    if count(STALE):
+        failed.append(f"{label}: {count(STALE)} matches not at the current price")
+    if count(LOG):
+        failed.append(f"{label}: {count(LOG)} change-log entries left")
+    if changed and count(CHANGED_NOT_NEW):
+        failed.append(f"{label}: {count(CHANGED_NOT_NEW)} re-dropped matches not back to 'new'")
+    return failed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", type=int, default=100_000)
+    parser.add_argument("--inventory", type=int, default=20_000)
+    parser.add_argument("--areas", type=int, default=120)
+    parser.add_argument("--drop-share", type=float, default=0.05)
+    parser.add_argument("--changes", type=int, default=500)
+    opts = parser.parse_args()
+
+    load_dotenv()
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        sys.exit("DATABASE_URL is not set")
+    engine = create_engine(url)
+    scanner = ProactiveScanner(engine)
+    params = {
+        "profiles": opts.profiles, "inventory": opts.inventory, "areas": opts.areas,
+        "drop_share": opts.drop_share, "changes": opts.changes, "threshold": scanner.drop_pct,
+    }
+    failed = []
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            for statement in filter(str.strip, SETUP.split(";")):
+                conn.execute(text(statement))
+            started = time.perf_counter()
+            for statement in filter(str.strip, SEED.split(";")):
+                conn.execute(text(statement), params)
+            print(f"seeded {opts.profiles} profiles and {opts.inventory} projects "
+                  f"in {time.perf_counter() - started:.1f}s")
+
+            started = time.perf_counter()
+            full = scanner.scan(conn)
+            print(f"full scan:        {(time.perf_counter() - started) * 1000:8.1f} ms  {full}")
+            failed += check(conn, params, "full scan")
+
+            for statement in filter(str.strip, CHANGE.split(";")):
+                conn.execute(text(statement), params)
+            started = time.perf_counter()
+            incremental = scanner.scan(conn)
+            print(f"incremental scan: {(time.perf_counter() - started) * 1000:8.1f} ms  {incremental}")
+            failed += check(conn, params, "incremental scan", changed=True)
+            if incremental["changes"] != opts.changes:
+                failed.append(f"incremental scan: consumed {incremental['changes']} changes, {opts.changes} logged")
+
+            started = time.perf_counter()
+            idle = scanner.scan(conn)
+            print(f"no-change scan:   {(time.perf_counter() - started) * 1000:8.1f} ms  {idle}")
+            if idle["changes"] or idle["matches"]:
+                failed.append(f"no-change scan: {idle['changes']} changes, {idle['matches']} matches written")
+        finally:
+            trans.rollback()
+
+    for problem in failed:
+        print(f"CHECK FAILED {problem}")
+    if failed:
+        sys.exit(1)
+    print("checks: OK")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Gemini prompt-prefix caching: input tokens billed and first-token latency per round.
+
+Sends --rounds streamed requests with the chat's static prefix (SYSTEM_PROMPT
++ the spec's tool declarations), first on the uncached model and then on a
+model bound to the GeminiPromptCache, and prints per round the prompt tokens,
+the cached tokens, the tokens billed at the full input rate and the time to
+the first streamed chunk. It also prints the prefix's token count. If the
+cache is off (the prefix is under GEMINI_CACHE_MIN_TOKENS) or cannot be
+created, the reason is printed and only the uncached rows are shown — the
+same fallback the API takes.
+
+Usage:
+  python3 scripts/bench_prompt_cache.py --rounds 5
+Requires GEMINI_API_KEY. No database needed (tools are declared, not run).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import google.generativeai as genai  # noqa: E402
+
+import main  # noqa: E402
+
+MESSAGE = "New lead Sara, budget AED 1.4M, wants a 1BR in Dubai Marina. Prepare the reply and call script."
+
+
+def run_round(model) -> tuple:
+    started = time.perf_counter()
+    first = None
+    # Requests on a cached model may not set tools or tool_config, so the model
+    # may answer with a function call; the first chunk is timed either way.
+    response = model.generate_content(MESSAGE, stream=True)
+    for _ in response:
+        if first is None:
+            first = time.perf_counter()
+    usage = response.usage_metadata
+    prompt = int(getattr(usage, "prompt_token_count", 0) or 0)
+    cached = int(getattr(usage, "cached_content_token_count", 0) or 0)
+    return prompt, cached, ((first or time.perf_counter()) - started) * 1000
+
+
+def report(label: str, model, rounds: int) -> None:
+    firsts = []
+    for i in range(1, rounds + 1):
+        prompt, cached, first_ms = run_round(model)
+        firsts.append(first_ms)
+        print(f"{label:>9} {i:>5} {prompt:>8,} {cached:>8,} {prompt - cached:>8,} {first_ms:>12.0f}")
+    print(f"{label:>9} {'p50':>5} {'':>8} {'':>8} {'':>8} {statistics.median(firsts):>12.0f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    opts = parser.parse_args()
+    if not main.GEMINI_API_KEY:
+        sys.exit("GEMINI_API_KEY is not set")
+
+    uncached = genai.GenerativeModel(
+        model_name=main.GEMINI_CACHE_MODEL,
+        system_instruction=main.SYSTEM_PROMPT,
+        tools=main.executor.get_tool_definitions(),
+    )
+    print(f"{'prefix':>9} {'round':>5} {'prompt':>8} {'cached':>8} {'billed':>8} {'first tok ms':>12}")
+    report("uncached", uncached, opts.rounds)
+
+    cache = main.prompt_cache
+    cache.refresh()
+    print(f"prefix: {cache.prefix_tokens} tokens (minimum cacheable: {cache.min_tokens})")
+    model = cache.model()
+    if model is None:
+        print(f"prompt cache unavailable: {cache.disabled or cache.last_error}")
+        return
+    try:
+        report("cached", model, opts.rounds)
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main_cli()
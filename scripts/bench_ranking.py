@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Ranking engine benchmark over synthetic inventories.
+
+Builds agent_inventory_view_v1-shaped snapshots of each size and times
+RankingSnapshot.rank() for typical search_properties calls (top 10 and the
+portfolio planner's top 500) with budget, area and bed preferences set.
+
+Usage:
+  python3 scripts/bench_ranking.py --sizes 10000 100000 1000000 --queries 50
+No database needed.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from ranking import RankingSnapshot  # noqa: E402
+
+AREAS = [f"Area {i}" for i in range(120)]
+BEDS = ["Studio", "1 BR", "2 BR", "3 BR", "4 BR", "1-2 BR", "2-3 BR", None]
+STATUS_BANDS = ["Completed", "Handover2025", "Handover2026", "Handover2027", "Handover2028_29", "Handover2030Plus"]
+SAFETY_BANDS = ["Institutional Safe", "Capital Safe", "Opportunistic", "Speculative"]
+PROFILES = {
+    "Conservative": ["Institutional Safe", "Capital Safe"],
+    "Moderate": ["Institutional Safe", "Capital Safe", "Opportunistic"],
+    "Aggressive": SAFETY_BANDS,
+}
+
+
+def synthetic_rows(n: int, rnd: random.Random) -> list:
+    rows = []
+    for i in range(n):
+        rows.append((
+            f"A{i:07d}", f"Project {i}", "Developer", "Dubai", rnd.choice(AREAS),
+            rnd.choice(STATUS_BANDS), round(rnd.lognormvariate(14.2, 0.6), -3), rnd.choice(BEDS),
+            rnd.uniform(20, 98), "Core", rnd.choice(SAFETY_BANDS),
+            "Mid", "Low", "High", "[]", "[]", "[]",
+        ))
+    return rows
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=3)
+    opts = parser.parse_args()
+    rnd = random.Random(opts.seed)
+
+    print(f"{'rows':>9} {'build s':>8} {'limit':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for n in opts.sizes:
+        started = time.perf_counter()
+        snapshot = RankingSnapshot(synthetic_rows(n, rnd), PROFILES)
+        build = time.perf_counter() - started
+        for limit in (10, 500):
+            times = []
+            for _ in range(opts.queries):
+                args = (
+                    rnd.choice(list(PROFILES)), rnd.choice(["Ready", "1-2yr", "2-4yr", "4yr+"]),
+                    rnd.choice([0, 800_000, 1_500_000, 3_000_000]), rnd.choice([None, rnd.choice(AREAS)]),
+                    rnd.choice([None, "1", "2", "studio"]), rnd.choice(["invest", "live", "rent"]), limit,
+                )
+                started = time.perf_counter()
+                snapshot.rank(*args)
+                times.append((time.perf_counter() - started) * 1000)
+            times.sort()
+            p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+            print(f"{n:>9} {build:>8.1f} {limit:>6} {statistics.median(times):>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
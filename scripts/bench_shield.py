@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+SecurityShield.evaluate_request cost and memory as distinct sessions pile up.
+
+Feeds --requests requests, each from a new session id (a scraper rotating
+ids, the worst case for the session map), through one shield bounded at
+--max-sessions, plus one hot session re-evaluated throughout. Prints the
+per-request cost and traced memory after every --report requests: both
+stay flat once the bound is reached.
+
+Usage:
+  python3 scripts/bench_shield.py --requests 3000000 --max-sessions 100000
+No database needed.
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from security import RequestSignature, SecurityShield  # noqa: E402
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3_000_000)
+    parser.add_argument("--max-sessions", type=int, default=100_000)
+    parser.add_argument("--report", type=int, default=500_000)
+    parser.add_argument("--no-trace", action="store_true", help="skip tracemalloc (faster, no memory column)")
+    opts = parser.parse_args()
+
+    shield = SecurityShield(max_sessions=opts.max_sessions)
+    sig = RequestSignature.model_construct(
+        session_id="", timestamp=datetime.now(), intent="chat",
+        params={"message": "2 bed in Dubai Marina under 2M"}, ip_hash="x", result_count=0,
+    )
+    hot = RequestSignature.model_construct(**{**dict(sig), "session_id": "hot-session"})
+    if not opts.no_trace:
+        tracemalloc.start()
+
+    print(f"{opts.requests:,} requests from distinct sessions, bound {opts.max_sessions:,} sessions")
+    print(f"{'requests':>10} {'us/request':>11} {'sessions':>9} {'traced MB':>10} {'hot level':>10}")
+    started = time.perf_counter()
+    for i in range(1, opts.requests + 1):
+        sig.session_id = f"s{i}"
+        shield.evaluate_request(sig)
+        if i % 1000 == 0:
+            assessment = shield.evaluate_request(hot)
+        if i % opts.report == 0:
+            elapsed = time.perf_counter() - started
+            memory = f"{tracemalloc.get_traced_memory()[0] / 1e6:>10.1f}" if not opts.no_trace else f"{'-':>10}"
+            print(f"{i:>10,} {elapsed / opts.report * 1e6:>11.2f} {len(shield.session_profiles):>9,} "
+                  f"{memory} {assessment.threat_level:>10}")
+            started = time.perf_counter()
+    print(shield.stats())
+
+
+if __name__ == "__main__":
+    main_cli()
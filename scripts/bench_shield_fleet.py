@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Threat scoring across worker processes: per-process state vs a shared store.
+
+Starts --workers processes, each with its own SecurityShield, and sends one
+scraper session's requests round-robin across them every --interval
+seconds for --seconds. Spread like this, no single worker sees requests
+less than a second apart or more than VOLUME_THRESHOLD_MINUTE a minute, so
+per-process state stays "clear"; with a shared store the fleet-wide volume
+is enforced. Then each worker scores --latency-requests requests from
+distinct sessions while its sync runs, to show evaluate_request latency.
+
+Usage:
+  python3 scripts/bench_shield_fleet.py --workers 4 --interval 0.6 --seconds 20 --backends process sqlite
+No database needed.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def worker(backend: str, path: str, inbox, outbox) -> None:
+    from security import WINDOW_SECONDS, RequestSignature, SecurityShield
+    from shield_state import make_state_store
+
+    shield = SecurityShield(store=make_state_store(backend, path, 300.0, WINDOW_SECONDS, 3600.0), sync_interval=1.0)
+    shield.task.start()
+    sig = RequestSignature.model_construct(
+        session_id="", timestamp=datetime.now(), intent="chat",
+        params={"message": "2 bed in Dubai Marina under 2M"}, ip_hash="x", result_count=0,
+    )
+    while True:
+        command, value = inbox.get()
+        if command == "stop":
+            shield.task.stop()
+            return
+        if command == "request":
+            sig.session_id = value
+            assessment = shield.evaluate_request(sig)
+            outbox.put((assessment.threat_level, assessment.threat_score, assessment.flags))
+        elif command == "latency":
+            timings = []
+            for i in range(value):
+                sig.session_id = f"{os.getpid()}-{i}"
+                started = time.perf_counter()
+                shield.evaluate_request(sig)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            outbox.put((timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6,
+                        timings[-1] * 1e6, shield.stats()["syncs"]))
+
+
+def run(backend: str, opts) -> None:
+    root = tempfile.mkdtemp(prefix="lelwa-bench-")
+    ctx = multiprocessing.get_context("spawn")
+    inboxes = [ctx.Queue() for _ in range(opts.workers)]
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(backend, os.path.join(root, "shield.db"), inbox, results))
+             for inbox in inboxes]
+    try:
+        for proc in procs:
+            proc.start()
+        # Let every worker import and open its store.
+        for inbox in inboxes:
+            inbox.put(("latency", 1))
+        for _ in inboxes:
+            results.get()
+
+        print(f"\n{backend}: scraper session, one request every {opts.interval}s round-robin over {opts.workers} workers")
+        levels = {}
+        deadline = time.monotonic() + opts.seconds
+        n = 0
+        while time.monotonic() < deadline:
+            inboxes[n % opts.workers].put(("request", "scraper"))
+            level, score, flags = results.get()
+            levels[level] = levels.get(level, 0) + 1
+            n += 1
+            if n % opts.workers == 0:
+                print(f"  request {n:>3}: {level:<8} score {score:>6.1f} {','.join(flags)}")
+            time.sleep(opts.interval)
+        print(f"  levels over {n} requests: {levels}")
+
+        for inbox in inboxes:
+            inbox.put(("latency", opts.latency_requests))
+        for i in range(opts.workers):
+            p50, p99, worst, syncs = results.get()
+            print(f"  worker {i}: evaluate_request p50 {p50:.1f} us, p99 {p99:.1f} us, max {worst:.0f} us "
+                  f"({opts.latency_requests} distinct sessions, {syncs} syncs)")
+    finally:
+        for inbox in inboxes:
+            inbox.put(("stop", None))
+        for proc in procs:
+            proc.join(timeout=5)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=0.6)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--latency-requests", type=int, default=20000)
+    parser.add_argument("--backends", nargs="+", default=["process", "sqlite"], choices=["process", "sqlite"])
+    opts = parser.parse_args()
+    for backend in opts.backends:
+        run(backend, opts)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Threat signal scan cost against message length.
+
+Compares the previous export check (str(params).lower() once per keyword,
+substring match) with ThreatSignals (patterns compiled once, word-boundary
+matching over the params' string values) on chat messages of --sizes bytes
+built from two pasted listings: one mentioning "Marina Mall" and a "small
+balcony" (the previous check stops at the first, false, "all" hit) and one
+without (it scans the whole text four times). Then prints which sample
+phrases each one flags.
+
+Usage:
+  python3 scripts/bench_signals.py --sizes 100 1000 10000 100000
+No database needed.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from security import DEFAULT_THREAT_SIGNALS, ThreatSignals, _param_text  # noqa: E402
+
+LISTINGS = {
+    "mall": ("Spacious 2 bed apartment in Dubai Marina, 1,450 sq ft, walking distance to Marina Mall, "
+             "small balcony with sea view, AED 2.1M, payment plan 60/40, handover Q4. "),
+    "plain": ("Spacious 2 bed apartment in Dubai Marina, 1,450 sq ft, close to the tram, "
+              "large terrace with sea view, AED 2.1M, payment plan 60/40, handover Q4. "),
+}
+SAMPLES = [
+    "small studio near Dubai Mall",
+    "call me tomorrow about the townhouse",
+    "show me all listings in JVC",
+    "can you export this as CSV",
+    "data-dump of every project",
+]
+
+
+def legacy_scan(params: dict) -> list:
+    if any(k in str(params).lower() for k in ["all", "export", "csv", "dump"]):
+        return [("EXPORT_ATTEMPT", 40)]
+    return []
+
+
+def compiled_scan(signals: ThreatSignals, params: dict) -> list:
+    return signals.scan(_param_text(params))
+
+
+def timeit(fn, *args, budget: float = 0.3) -> float:
+    """Microseconds per call, looping for about `budget` seconds."""
+    n, started = 0, time.perf_counter()
+    while True:
+        for _ in range(50):
+            fn(*args)
+        n += 50
+        elapsed = time.perf_counter() - started
+        if elapsed > budget:
+            return elapsed / n * 1e6
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000])
+    opts = parser.parse_args()
+
+    signals = ThreatSignals(DEFAULT_THREAT_SIGNALS)
+    print(f"{'text':>6} {'bytes':>8} {'legacy us':>10} {'compiled us':>12} {'legacy MB/s':>12} {'compiled MB/s':>14}")
+    for name, listing in LISTINGS.items():
+        for size in opts.sizes:
+            message = (listing * (size // len(listing) + 1))[:size]
+            params = {"message": message, "session_id": "s1"}
+            legacy = timeit(legacy_scan, params)
+            compiled = timeit(compiled_scan, signals, params)
+            print(f"{name:>6} {size:>8,} {legacy:>10.1f} {compiled:>12.1f} "
+                  f"{size / legacy:>12.1f} {size / compiled:>14.1f}")
+
+    print(f"\n{'message':<40} {'legacy':<16} compiled")
+    for text in SAMPLES:
+        params = {"message": text}
+        legacy = ",".join(name for name, _ in legacy_scan(params)) or "-"
+        compiled = ",".join(name for name, _ in compiled_scan(signals, params)) or "-"
+        print(f"{text:<40} {legacy:<16} {compiled}")
+
+
+if __name__ == "__main__":
+    main_cli()
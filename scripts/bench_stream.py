@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-useful-block benchmark for /v1/chat/stream.
+
+A fake Gemini session does one tool round (--tool-ms) and then streams the
+final JSON answer in --chunk-chars pieces, one every --chunk-ms. The script
+reports when the first progress frame, first block and final result frame
+arrive, as seen by a WebSocket client.
+
+Usage:
+  python3 scripts/bench_stream.py --turns 5 --chunk-ms 40
+No database or API key needed.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+
+ANSWER = json.dumps({
+    "reply": "Prepared a reply, call script and offer for the 1BR Dubai Marina lead.",
+    "prepared_blocks": [
+        {"type": "reply", "title": "Reply", "content": "Hi Sara, three 1BR units in Dubai Marina fit AED 1.4M. " * 4},
+        {"type": "call_script", "title": "Call script", "content": "1. Confirm budget. 2. Confirm timeline. " * 6},
+        {"type": "offer", "title": "Offer", "content": "Unit 1204, AED 1.38M, 20% down, 25 years. " * 6},
+        {"type": "summary", "title": "Market", "content": "Marina 1BR median AED 1.35M, yield 6.8%. " * 6},
+    ],
+    "prepared_actions": [
+        {"id": "send_offer", "label": "Send on WhatsApp", "tool_name": "send_whatsapp",
+         "args": {"to_number": "", "message_body": "Hi Sara"}, "requires": "connection"},
+    ],
+})
+
+
+def _parts_response(parts):
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=parts))], text="")
+
+
+class _FakeStream:
+    """Iterable like a streamed GenerateContentResponse; resolves to `final` afterwards."""
+
+    def __init__(self, chunks, final, delay):
+        self.chunks, self.delay = chunks, delay
+        self.candidates, self.text = final.candidates, final.text
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            time.sleep(self.delay)
+            yield chunk
+
+
+class _FakeChat:
+    def __init__(self, opts):
+        self.opts, self.round = opts, 0
+
+    def send_message(self, content, stream=False, **kwargs):
+        self.round += 1
+        delay = self.opts.chunk_ms / 1000
+        if self.round == 1:
+            call = SimpleNamespace(name="search_properties", args={"preferred_area": "Dubai Marina"})
+            response = _parts_response([SimpleNamespace(function_call=call, text="")])
+            return _FakeStream([response], response, delay)
+        size = self.opts.chunk_chars
+        chunks = [
+            _parts_response([SimpleNamespace(text=ANSWER[i:i + size])])
+            for i in range(0, len(ANSWER), size)
+        ]
+        final = _parts_response([SimpleNamespace(text=ANSWER)])
+        final.text = ANSWER
+        return _FakeStream(chunks, final, delay)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--tool-ms", type=float, default=150.0)
+    parser.add_argument("--chunk-ms", type=float, default=40.0)
+    parser.add_argument("--chunk-chars", type=int, default=40)
+    opts = parser.parse_args()
+
+    def fake_execute(name, args, session_id=None, user_id="default"):
+        time.sleep(opts.tool_ms / 1000)
+        return [{"name": "Marina Gate 1", "price_aed": 1380000}]
+
+    main.executor.execute = fake_execute
+    main._gemini_model = lambda: SimpleNamespace(start_chat=lambda history=None: _FakeChat(opts))
+
+    first_progress, first_block, total = [], [], []
+    with TestClient(main.app) as client:
+        for _ in range(opts.turns):
+            with client.websocket_connect("/v1/chat/stream/bench") as ws:
+                t0 = time.perf_counter()
+                ws.send_text("Lead: 1BR Dubai Marina budget 1.4M")
+                seen_progress = seen_block = None
+                while True:
+                    frame = ws.receive_json()
+                    now = (time.perf_counter() - t0) * 1000
+                    if frame["type"] == "progress" and seen_progress is None:
+                        seen_progress = now
+                    if frame["type"] == "block" and seen_block is None:
+                        seen_block = now
+                    if frame["type"] == "result":
+                        total.append(now)
+                        break
+                first_progress.append(seen_progress or 0.0)
+                first_block.append(seen_block or 0.0)
+
+    print(f"{opts.turns} turns, tool round {opts.tool_ms:.0f} ms, "
+          f"{len(ANSWER)} answer chars in {opts.chunk_chars}-char chunks every {opts.chunk_ms:.0f} ms")
+    print(f"first progress frame  median {statistics.median(first_progress):8.1f} ms")
+    print(f"first prepared block  median {statistics.median(first_block):8.1f} ms")
+    print(f"final result frame    median {statistics.median(total):8.1f} ms  (the old single-frame latency)")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Structured-output re-ask: degraded answers and output tokens, off vs on.
+
+A fake Ollama model answers --turns chat turns. Its free-form final answers
+cycle through the malformed shapes of bench_parse.py's corpus (fenced,
+wrapped in prose, truncated, no JSON at all); asked with a response_format
+it returns the clean object. Each turn runs through main._chat_with_ollama
+and the chat endpoint's parsing, with STRUCTURED_OUTPUT off and then on,
+and the script reports how many turns lost their reply or blocks, plus the
+/v1/metrics model_output counters (fallback rate, re-asks, output tokens).
+
+Usage:
+  python3 scripts/bench_structured.py --turns 200
+No database or API key needed.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main  # noqa: E402
+from bench_parse import REPLY, _answer, corpus  # noqa: E402
+from json_extract import OutputStats  # noqa: E402
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeOllama:
+    def __init__(self, drafts):
+        self.drafts = drafts
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, response_format=None, **kwargs):
+        if response_format is not None:
+            text = json.dumps(_answer(3))
+        else:
+            text = self.drafts[self.calls % len(self.drafts)]
+            self.calls += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text, tool_calls=None))],
+            usage=SimpleNamespace(completion_tokens=_tokens(text)),
+        )
+
+
+async def run(turns: int, structured: bool, drafts) -> None:
+    main.STRUCTURED_OUTPUT = structured
+    main.output_stats = OutputStats()
+    main.ollama_client = FakeOllama(drafts)
+    degraded = 0
+    for _ in range(turns):
+        raw = await main._chat_with_ollama("2 bed in Dubai Marina for Sara, budget 1.4M", "s1", "default", None)
+        structured_answer = main._ensure_prepared_contract(main._parse_broker_response(raw), "")
+        blocks = [b for b in structured_answer["prepared_blocks"] if b.get("type") == "summary"]
+        if not REPLY.startswith(structured_answer["reply"][:40]) or len(blocks) < 3:
+            degraded += 1
+    stats = main.output_stats.stats()[main.OLLAMA_MODEL]
+    print(f"{'on' if structured else 'off':>10} {degraded:>9} {stats['fallback_rate']:>9.2%} {stats['reasks']:>7} "
+          f"{stats['reask_failed']:>7} {stats['output_tokens']:>10,} {stats['reask_output_tokens']:>10,}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    opts = parser.parse_args()
+    drafts = [raw for _, raw, _ in corpus(3)] + ["Prepared the reply and call script for Sara."]
+    print(f"{len(drafts)} answer shapes, {opts.turns} turns")
+    print(f"{'structured':>10} {'degraded':>9} {'fallback':>9} {'reasks':>7} {'failed':>7} "
+          f"{'out tokens':>10} {'reask tok':>10}")
+    for structured in (False, True):
+        asyncio.run(run(opts.turns, structured, drafts))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Check the in-process ranking engine (ranking.py) against agent_ranked_for_investor_v1.
+
+Inside one REPEATABLE READ transaction (so both sides see the same rows) it
+builds a snapshot, then runs sampled parameter combinations through the SQL
+function and the engine: every risk profile (plus an unknown one), every
+horizon, budgets around the inventory's price quartiles, existing / re-cased /
+unknown areas, bed patterns (including LIKE wildcards), every intent and NULLs.
+
+For each combination it compares, over the full ranking (LIMIT NULL), each
+asset's score_0_100, match_score and final_rank and the final_rank order,
+and the final_rank sequence of the top --limit rows. Exits 1 on any mismatch.
+
+--fixtures runs the engine on a fixed inventory instead and compares it with
+the rows the SQL function returns for it, worked out from the function's
+expression (numeric constants, float8 sums, each ROUND's tie rule). The
+fixtures sit on the rounding edges, the NULL and LIKE-wildcard cases and the
+profile / horizon filters.
+
+Usage:
+  python3 scripts/check_ranking_parity.py --samples 300 --limit 10
+  python3 scripts/check_ranking_parity.py --fixtures
+Requires DATABASE_URL (--fixtures: no database needed).
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dotenv import load_dotenv  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from ranking import COLUMNS, HORIZON_ORD, RankingSnapshot, load_snapshot  # noqa: E402
+
+RANKED_SQL = text(
+    "SELECT asset_id, score_0_100, match_score, final_rank FROM agent_ranked_for_investor_v1("
+    ":risk_profile, :horizon, :budget, :area, :beds, :intent, :limit)"
+)
+
+
+# ── Fixtures ───────────────────────────────────────────────────────────────
+
+# (asset_id, area, status_band, price_aed, beds, score_0_100, safety_band); other columns NULL.
+FIXTURE_ROWS = [
+    ("A1", "Dubai Marina", "Completed", 1_000_000, "1BR", 80, "A"),
+    ("A2", "JVC", "Handover2026", 2_000_000, "2BR", 71, "A"),
+    ("A3", "dubai marina", "Handover2028_29", None, "Studio", 90, "B"),
+    ("A4", None, "Handover2030Plus", 0, None, 60, "A"),
+    ("A5", "Business Bay", "Unknown", 1_500_000, "1_BR", None, "A"),   # status ord 999: never eligible
+    ("A6", "JVC", "Handover2025", 900_000, "3BR", 55, "C"),
+    ("A7", "Business Bay", "Handover2027", 1_250_000, "2BR", 77.5, "B"),  # ::BIGINT rounds to 78
+    ("A8", "JVC", "Handover2025", 750_000, "1BR + Study", 64, "A"),
+    ("A9", "Palm Jumeirah", "Completed", 3_000_000, "4BR", 70, "A"),
+    ("B1", "JVC", "Handover2025", 1_100_000, "1BR", None, "A"),        # NULL score: NULL final_rank, first
+    ("B2", "Dubai Marina", "Completed", 1_000_000, "2BR", 76.5, "B"),   # ::BIGINT rounds to 76
+]
+FIXTURE_PROFILES = {"Conservative": ["A"], "Balanced": ["A", "B"], "Opportunistic": ["A", "B", "C"]}
+# (risk_profile, horizon, budget, area, beds, intent) -> {asset_id: (score_0_100, match_score, final_rank)}
+# as agent_ranked_for_investor_v1 returns them.
+FIXTURE_CASES = [
+    # A2: the float8 sum is 29.500000000000004, so match_score is 30 (A9: 28.500000000000004 -> 29).
+    (("Balanced", "4yr+", 1_000_000, "DUBAI MARINA", "1", "invest"),
+     {"A1": (80, 95, 85), "A2": (71, 30, 57), "A3": (90, 57, 78), "A7": (78, 54, 70), "A8": (64, 71, 66),
+      "A9": (70, 29, 56), "B1": (None, 76, None), "B2": (76, 81, 78)}),
+    # A9: 0.65 * 70 + 0.35 * 60 = 66.5, and ROUND(numeric) rounds half away from zero: 67.
+    (("Conservative", "Ready", 0, None, None, "live"),
+     {"A1": (80, 60, 73), "A9": (70, 60, 67)}),
+    # A1 / B2: 82.5 and A9: 47.5 -- ROUND(float8) rounds half to even: 82, 48.
+    (("Opportunistic", "2-4yr", 1_000_000, "jvc", "br", "rent"),
+     {"A1": (80, 82, 81), "A2": (71, 54, 65), "A6": (55, 87, 66), "A7": (78, 61, 72), "A8": (64, 82, 70),
+      "A9": (70, 48, 62), "B1": (None, 87, None), "B2": (76, 82, 78)}),
+    # NULL budget and unknown intent score 0.5; "_" is a LIKE wildcard matching any one character.
+    (("Opportunistic", None, None, "Business Bay", "_", "flip"),
+     {"A1": (80, 60, 73), "A2": (71, 57, 66), "A6": (55, 58, 56), "A7": (78, 73, 76), "A8": (64, 58, 62),
+      "A9": (70, 60, 67), "B1": (None, 58, None), "B2": (76, 60, 70)}),
+    # Unknown horizon = 2-4yr; budget 1 makes every priced row a 0 fit; "" matches no area; "%" every beds.
+    (("Opportunistic", "10yr", 1, "", "%", None),
+     {"A1": (80, 43, 67), "A2": (71, 40, 60), "A6": (55, 41, 50), "A7": (78, 38, 64), "A8": (64, 41, 56),
+      "A9": (70, 43, 61), "B1": (None, 41, None), "B2": (76, 43, 64)}),
+    # A2: 83.5 -> 84 (half to even).
+    (("Balanced", "1-2yr", 2_000_000, None, "2br", "invest"),
+     {"A1": (80, 51, 70), "A2": (71, 84, 76), "A8": (64, 49, 59), "A9": (70, 51, 63), "B1": (None, 55, None),
+      "B2": (76, 65, 72)}),
+    (("Unknown", "4yr+", 0, None, None, "invest"), {}),
+    # A2: 23.5 -> 24, A3: 37.5 -> 38, A9: 33.5 -> 34; a NULL price scores 0.5 on budget.
+    (("Opportunistic", "4yr+", 800_000, "Nowhere", "1br + ", "live"),
+     {"A1": (80, 60, 73), "A2": (71, 24, 55), "A3": (90, 38, 72), "A6": (55, 60, 57), "A7": (78, 37, 64),
+      "A8": (64, 76, 68), "A9": (70, 34, 57), "B1": (None, 51, None), "B2": (76, 60, 70)}),
+]
+
+
+def _fixture_row(asset_id, area, status_band, price_aed, beds, score_0_100, safety_band) -> tuple:
+    values = dict.fromkeys(COLUMNS)
+    values.update(asset_id=asset_id, area=area, status_band=status_band, price_aed=price_aed, beds=beds,
+                  score_0_100=score_0_100, safety_band=safety_band)
+    return tuple(values[c] for c in COLUMNS)
+
+
+def _final_order(expected: dict) -> list:
+    """final_rank sequence of ORDER BY final_rank DESC (NULLs first)."""
+    finals = [f for _, _, f in expected.values()]
+    return [None] * finals.count(None) + sorted((f for f in finals if f is not None), reverse=True)
+
+
+def check_fixtures() -> int:
+    snapshot = RankingSnapshot([_fixture_row(*r) for r in sorted(FIXTURE_ROWS)], FIXTURE_PROFILES)
+    failures = 0
+    for params, expected in FIXTURE_CASES:
+        problems = []
+        ours = snapshot.rank(*params, limit=None)
+        got = {r["asset_id"]: (r["score_0_100"], r["match_score"], r["final_rank"]) for r in ours}
+        if set(got) != set(expected):
+            problems.append(f"rows: expected {sorted(expected)}, engine {sorted(got)}")
+        for asset, scores in expected.items():
+            if asset in got and got[asset] != scores:
+                problems.append(f"{asset}: expected (score, match, final) {scores}, engine {got[asset]}")
+        if [r["final_rank"] for r in ours] != _final_order(expected):
+            problems.append("final_rank order differs")
+        for limit in (1, 3):
+            top = [r["final_rank"] for r in snapshot.rank(*params, limit=limit)]
+            if top != _final_order(expected)[:limit]:
+                problems.append(f"top {limit} final_rank: expected {_final_order(expected)[:limit]}, engine {top}")
+        if problems:
+            failures += 1
+            print(f"MISMATCH {params}")
+            for problem in problems:
+                print(f"  {problem}")
+    print(f"{len(FIXTURE_CASES) - failures}/{len(FIXTURE_CASES)} fixture cases match")
+    return failures
+
+
+# ── Live database ──────────────────────────────────────────────────────────
+
+def parameter_space(conn, snapshot) -> dict:
+    prices = sorted(p for p in snapshot.price.tolist() if p == p and p > 0)
+    budgets = [0, None, 1, 1_000_000.5]
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        if prices:
+            budgets.append(prices[int(q * (len(prices) - 1))])
+    areas = [None, "Nowhere In Particular", ""]
+    for area in snapshot.area_lower[:5]:
+        areas += [area, area.upper()]
+    beds = [None, "", "%", "_", "1", "2", "studio", "br"] + snapshot.beds_lower[:5]
+    profiles = [r[0] for r in conn.execute(text("SELECT risk_profile FROM investor_profiles_v1"))]
+    return {
+        "risk_profile": profiles + ["Balanced"],
+        "horizon": list(HORIZON_ORD) + [None, "10yr"],
+        "budget": budgets,
+        "area": areas,
+        "beds": beds,
+        "intent": ["invest", "live", "rent", None, "flip"],
+    }
+
+
+def compare(conn, snapshot, params: dict, limit: int) -> list:
+    problems = []
+    sql_rows = [tuple(r) for r in conn.execute(RANKED_SQL, {**params, "limit": None})]
+    ours = snapshot.rank(params["risk_profile"], params["horizon"], params["budget"], params["area"],
+                         params["beds"], params["intent"], None)
+    ours_rows = [(r["asset_id"], r["score_0_100"], r["match_score"], r["final_rank"]) for r in ours]
+
+    by_asset = {r[0]: r[1:] for r in sql_rows}
+    ours_by_asset = {r[0]: r[1:] for r in ours_rows}
+    if set(by_asset) != set(ours_by_asset):
+        problems.append(f"row sets differ: {len(by_asset)} in SQL, {len(ours_by_asset)} in engine")
+    for asset, scores in by_asset.items():
+        if asset in ours_by_asset and ours_by_asset[asset] != scores:
+            problems.append(f"{asset}: SQL (score, match, final) {scores}, engine {ours_by_asset[asset]}")
+    if [r[3] for r in sql_rows] != [r[3] for r in ours_rows]:
+        problems.append("final_rank order differs")
+
+    top_sql = [r[3] for r in conn.execute(RANKED_SQL, {**params, "limit": limit})]
+    top_ours = [r["final_rank"] for r in snapshot.rank(
+        params["risk_profile"], params["horizon"], params["budget"], params["area"],
+        params["beds"], params["intent"], limit)]
+    if top_sql != top_ours:
+        problems.append(f"top {limit} final_rank: SQL {top_sql}, engine {top_ours}")
+    return problems
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=300, help="parameter combinations to check")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--fixtures", action="store_true", help="check the fixed inventory; no database needed")
+    opts = parser.parse_args()
+
+    if opts.fixtures:
+        if check_fixtures():
+            sys.exit(1)
+        print("OK")
+        return
+
+    load_dotenv()
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        sys.exit("DATABASE_URL is not set")
+    engine = create_engine(url)
+    rnd = random.Random(opts.seed)
+
+    failures = 0
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        with conn.begin():
+            started = time.perf_counter()
+            snapshot = load_snapshot(conn)
+            print(f"snapshot: {snapshot.size} rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+            space = parameter_space(conn, snapshot)
+            for n in range(opts.samples):
+                params = {name: rnd.choice(values) for name, values in space.items()}
+                problems = compare(conn, snapshot, params, opts.limit)
+                if problems:
+                    failures += 1
+                    print(f"MISMATCH {params}")
+                    for problem in problems[:5]:
+                        print(f"  {problem}")
+
+    print(f"{opts.samples - failures}/{opts.samples} parameter combinations match")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main_cli()
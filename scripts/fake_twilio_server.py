@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Twilio's Messages and Calls REST endpoints, for load
+tests of the WhatsApp tools without sending anything.
+
+Answers POST /2010-04-01/Accounts/{sid}/Messages.json and Calls.json with a
+queued resource after --latency-ms, and with Twilio's 429 error when one
+sender exceeds --max-mps (0 = unlimited). Point the API at it with
+TWILIO_API_BASE_URL=http://127.0.0.1:<port>.
+
+Usage:
+  python3 scripts/fake_twilio_server.py --port 8765 --latency-ms 40 --max-mps 80
+No database needed.
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+_RESOURCE = re.compile(r"^/2010-04-01/Accounts/(?P<sid>[^/]+)/(?P<kind>Messages|Calls)\.json$")
+
+
+class FakeTwilio(ThreadingHTTPServer):
+    daemon_threads = True
+    # Keep-alive clients open many connections at once.
+    request_queue_size = 128
+
+    def __init__(self, address, latency_ms: float = 0.0, max_mps: float = 0.0):
+        super().__init__(address, _Handler)
+        self.latency = latency_ms / 1000.0
+        self.max_mps = max_mps
+        self.received = 0
+        self.rejected = 0
+        self.connections = 0
+        self._recent = {}  # sender -> deque of accept times in the last second
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self, sender: str) -> bool:
+        with self._lock:
+            if self.max_mps <= 0:
+                self.received += 1
+                return True
+            now = time.monotonic()
+            recent = self._recent.setdefault(sender, deque())
+            while recent and now - recent[0] >= 1.0:
+                recent.popleft()
+            # A little headroom for clock jitter between client and server.
+            if len(recent) >= self.max_mps * 1.1:
+                self.rejected += 1
+                return False
+            recent.append(now)
+            self.received += 1
+            return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+        match = _RESOURCE.match(self.path.split("?", 1)[0])
+        if not match:
+            self._reply(404, {"code": 20404, "message": "The requested resource was not found", "status": 404})
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        sender = form.get("From", "")
+        if not self.server.admit(sender):
+            self._reply(429, {"code": 20429, "message": "Too Many Requests", "status": 429})
+            return
+        prefix = "SM" if match["kind"] == "Messages" else "CA"
+        now = datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S +0000")
+        self._reply(201, {
+            "sid": prefix + uuid.uuid4().hex,
+            "account_sid": match["sid"],
+            "from": sender,
+            "to": form.get("To"),
+            "body": form.get("Body"),
+            "status": "queued",
+            "date_created": now,
+            "date_updated": now,
+            "uri": self.path,
+        })
+
+
+def serve_in_background(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, max_mps: float = 0.0):
+    """Start a FakeTwilio server on a daemon thread; returns it (see .base_url, .shutdown())."""
+    server = FakeTwilio((host, port), latency_ms, max_mps)
+    threading.Thread(target=server.serve_forever, name="fake-twilio", daemon=True).start()
+    return server
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--max-mps", type=float, default=0.0)
+    opts = parser.parse_args()
+    server = FakeTwilio((opts.host, opts.port), opts.latency_ms, opts.max_mps)
+    print(f"fake Twilio on {server.base_url} (latency {opts.latency_ms} ms, max {opts.max_mps or 'unlimited'} msg/s per sender)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"received {server.received}, rejected {server.rejected}, connections {server.connections}")
+
+
+if __name__ == "__main__":
+    main_cli()
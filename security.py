@@ -1,9 +1,25 @@
 import hashlib
 import json
+import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence, Tuple
 from pydantic import BaseModel
 
+from scheduler import PeriodicTask
+from shield_state import SessionDelta, decay, merge_state
+
+# Length of the sliding request-volume window (VOLUME_THRESHOLD_MINUTE).
+WINDOW_SECONDS = 60.0
+# A worker syncs early once this many sessions have unsynced deltas.
+SYNC_BATCH_SESSIONS = 1000
+# Used when the spec's governance section has no threat_signals.
+DEFAULT_THREAT_SIGNALS = [
+    {"name": "EXPORT_ATTEMPT", "weight": 40, "patterns": ["all", "export", "csv", "dump"]},
+]
+
 class RequestSignature(BaseModel):
     session_id: str
     timestamp: datetime
@@ -18,40 +34,261 @@ class ThreatAssessment(BaseModel):
     degradation_applied: str
     flags: List[str]
 
+class ThreatSignals:
+    """
+    Content signals configured as words or phrases with a weight. Each
+    pattern is compiled once into a case-insensitive matcher bounded at word
+    edges, so "all" does not match "small" or "Mall". scan() lowercases the
+    text once, finds candidate positions for each pattern's first word with
+    str.find and confirms them with the compiled matcher; each signal found
+    is returned once, with its weight.
+
+    (A single alternation regex over the text is ~4x slower in CPython's re,
+    which has no multi-literal prefilter; str.find runs at memchr speed.)
+
+    Malformed entries are skipped and described in `errors` (shield stats);
+    if none is usable, DEFAULT_THREAT_SIGNALS apply, so a bad spec never
+    stops the API from starting or leaves it without signals.
+    """
+
+    def __init__(self, signals: Sequence[dict]):
+        self.errors: List[str] = []
+        if not isinstance(signals, (list, tuple)):
+            self.errors.append(f"threat_signals must be a list, not {type(signals).__name__}")
+            signals = ()
+        self.signals = []
+        for i, signal in enumerate(signals):
+            error = _signal_error(signal)
+            if error:
+                self.errors.append(f"threat_signals[{i}]: {error}")
+                continue
+            self.signals.append(_signal(signal))
+        if self.errors and not self.signals:
+            self.signals = [_signal(signal) for signal in DEFAULT_THREAT_SIGNALS]
+        # Per signal: (first word, matcher) for each pattern, longest first.
+        self._matchers: List[List[Tuple[str, "re.Pattern[str]"]]] = []
+        for signal in self.signals:
+            words = sorted({tuple(p.lower().split()) for p in signal["patterns"] if p.strip()}, key=len, reverse=True)
+            self._matchers.append([
+                (w[0], re.compile(r"(?<!\w)" + r"\s+".join(map(re.escape, w)) + r"(?!\w)"))
+                for w in words
+            ])
+
+    @classmethod
+    def from_spec(cls, spec: Optional[dict]) -> "ThreatSignals":
+        governance = (spec or {}).get("governance")
+        signals = governance.get("threat_signals") if isinstance(governance, dict) else None
+        return cls(signals if signals is not None else DEFAULT_THREAT_SIGNALS)
+
+    def scan(self, text: str) -> List[Tuple[str, float]]:
+        if not text:
+            return []
+        text = text.lower()
+        found = []
+        for signal, matchers in zip(self.signals, self._matchers):
+            if any(self._occurs(text, first, matcher) for first, matcher in matchers):
+                found.append((signal["name"], signal["weight"]))
+        return found
+
+    @staticmethod
+    def _occurs(text: str, first: str, matcher: "re.Pattern[str]") -> bool:
+        i = text.find(first)
+        while i >= 0:
+            if matcher.match(text, i):
+                return True
+            i = text.find(first, i + 1)
+        return False
+
+
+def _signal_error(signal: Any) -> Optional[str]:
+    """Why a threat_signals entry cannot be used, or None."""
+    if not isinstance(signal, dict):
+        return "not an object"
+    name = signal.get("name")
+    if not isinstance(name, str) or not name.strip():
+        return 'missing "name"'
+    try:
+        float(signal.get("weight", 0))
+    except (TypeError, ValueError):
+        return f'{name}: "weight" is not a number'
+    patterns = signal.get("patterns")
+    if patterns is not None and not (isinstance(patterns, list) and all(isinstance(p, str) for p in patterns)):
+        return f'{name}: "patterns" must be a list of strings'
+    return None
+
+
+def _signal(signal: dict) -> dict:
+    return {"name": signal["name"], "weight": float(signal.get("weight", 0)), "patterns": list(signal.get("patterns") or ())}
+
+
+def _param_text(value: Any) -> str:
+    """The string values of a request's params, joined (keys and structure are not scanned)."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return "\n".join(_param_text(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return "\n".join(_param_text(v) for v in value)
+    return ""
+
+
+class SessionProfile:
+    """
+    Per-session shield state: a decaying score, a sliding-window request
+    counter (over windows aligned to multiples of `window`, so workers agree
+    on them) and distinct flags. Times are wall-clock seconds.
+    """
+
+    __slots__ = ("score", "scored_at", "last_request", "window_start", "window_count", "prev_count", "flags")
+
+    def __init__(self, now: float):
+        self.score = 0.0
+        self.scored_at = now
+        self.last_request = None
+        self.window_start = 0.0
+        self.window_count = 0
+        self.prev_count = 0
+        # flag -> times raised; insertion order is first occurrence
+        self.flags: Dict[str, int] = {}
+
+    def decay(self, now: float, half_life: float) -> None:
+        if now > self.scored_at and self.score:
+            self.score = decay(self.score, now - self.scored_at, half_life)
+            if not self.score:
+                # Fully cooled down: the session starts clean.
+                self.flags.clear()
+        self.scored_at = max(self.scored_at, now)
+
+    def hit(self, now: float, window: float) -> float:
+        """Count a request; returns the sliding-window estimate of requests in the last `window` seconds."""
+        start = now - now % window
+        if start != self.window_start:
+            # A gap of two windows or more empties both.
+            self.prev_count = self.window_count if start - self.window_start == window else 0
+            self.window_start = start
+            self.window_count = 0
+        self.window_count += 1
+        return self.window_count + self.prev_count * (1.0 - (now - start) / window)
+
+    def load(self, state: dict, window: float) -> None:
+        """Replace this profile with a (fleet-wide) state from shield_state.merge_state."""
+        self.score = state["score"]
+        self.scored_at = state["at"]
+        self.last_request = state["last"]
+        self.flags = dict(state["flags"])
+        counts = {float(start): n for start, n in state["win"].items()}
+        self.window_start = max(counts) if counts else 0.0
+        self.window_count = counts.get(self.window_start, 0)
+        self.prev_count = counts.get(self.window_start - window, 0)
+
+    def flag(self, name: str, points: float) -> None:
+        self.score += points
+        self.flags[name] = self.flags.get(name, 0) + 1
+
+
+class SessionProfiles:
+    """
+    Bounded LRU map of session_id -> SessionProfile. Sessions idle for
+    `ttl` seconds are dropped as requests come in, and the least recently
+    seen session is dropped once `max_sessions` are tracked, so memory stays
+    bounded and every operation is O(1).
+    """
+
+    def __init__(self, max_sessions: int = 100_000, ttl: float = 3600.0):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        self._profiles: "OrderedDict[str, SessionProfile]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def peek(self, session_id: str) -> Optional[SessionProfile]:
+        return self._profiles.get(session_id)
+
+    def get(self, session_id: str, now: float) -> SessionProfile:
+        profiles = self._profiles
+        profile = profiles.get(session_id)
+        if profile is None:
+            profile = profiles[session_id] = SessionProfile(now)
+        else:
+            profiles.move_to_end(session_id)
+        # The front is the longest idle session; stop at the first one still live.
+        while len(profiles) > 1:
+            oldest_id, oldest = next(iter(profiles.items()))
+            if len(profiles) > self.max_sessions:
+                self.evicted_lru += 1
+            elif oldest.last_request is not None and now - oldest.last_request > self.ttl:
+                self.evicted_idle += 1
+            else:
+                break
+            del profiles[oldest_id]
+        return profile
+
+
 class SecurityShield:
     """
     Implements the 'Zero-Strategy' for data protection.
     Detects scrapers and bulk-extraction attempts.
     """
-    def __init__(self):
-        self.session_profiles = {}
+    def __init__(
+        self,
+        max_sessions: int = 100_000,
+        session_ttl: float = 3600.0,
+        half_life: float = 300.0,
+        store: Any = None,
+        sync_interval: float = 1.0,
+        signals: Optional[ThreatSignals] = None,
+    ):
+        self.session_profiles = SessionProfiles(max_sessions=max_sessions, ttl=session_ttl)
+        # Threat scores halve every `half_life` seconds without new flags.
+        self.half_life = half_life
         self.VOLUME_THRESHOLD_MINUTE = 15
         self.PRICE_KEYS = ['price', 'price_aed', 'final_price_from', 'gross_rental_yield', 'net_rental_yield']
+        # Content signals (export / bulk-extraction wording); replaced on spec reload.
+        self.signals = signals or ThreatSignals(DEFAULT_THREAT_SIGNALS)
+        # Shared state across workers (see shield_state.py); None keeps it per process.
+        self.store = store
+        self.syncs = 0
+        self.last_sync_error: Optional[str] = None
+        self._pending: Dict[str, SessionDelta] = {}
+        self._lock = threading.Lock()
+        self.task = PeriodicTask("shield-sync", sync_interval if store is not None else 0, self.sync)
 
     def evaluate_request(self, req: RequestSignature) -> ThreatAssessment:
-        profile = self.session_profiles.setdefault(req.session_id, {
-            'count': 0,
-            'last_request': req.timestamp,
-            'threat_score': 0,
-            'flags': []
-        })
-        
-        # 1. Simple Rate Limiting
-        now = datetime.now()
-        if (now - profile['last_request']).total_seconds() < 1:
-            profile['threat_score'] += 10
-            profile['flags'].append("RAPID_FIRE_REQUEST")
+        now = time.time()
+        # 2. Pattern Detection (e.g., export attempts): one pass, outside the lock
+        content = self.signals.scan(_param_text(req.params))
+        with self._lock:
+            profile = self.session_profiles.get(req.session_id, now)
+            profile.decay(now, self.half_life)
+            delta = None
+            if self.store is not None:
+                delta = self._pending.get(req.session_id)
+                if delta is None:
+                    delta = self._pending[req.session_id] = SessionDelta(now)
+                    if len(self._pending) == SYNC_BATCH_SESSIONS:
+                        self.task.trigger()
+                delta.hit(now, now - now % WINDOW_SECONDS)
+
+            # 1. Rate limiting: back-to-back requests, then volume over a sliding minute
+            raised = []
+            if profile.last_request is not None and now - profile.last_request < 1:
+                raised.append(("RAPID_FIRE_REQUEST", 10))
+            if profile.hit(now, WINDOW_SECONDS) > self.VOLUME_THRESHOLD_MINUTE:
+                raised.append(("VOLUME_THRESHOLD_EXCEEDED", 10))
+            profile.last_request = now
 
-        profile['count'] += 1
-        profile['last_request'] = now
+            for name, points in raised + content:
+                profile.flag(name, points)
+                if delta is not None:
+                    delta.flag(name, points)
 
-        # 2. Pattern Detection (e.g., export attempts)
-        if any(k in str(req.params).lower() for k in ['all', 'export', 'csv', 'dump']):
-            profile['threat_score'] += 40
-            profile['flags'].append("EXPORT_ATTEMPT")
+            score = round(profile.score, 1)
+            flags = list(profile.flags)
 
         # Determine Level
-        score = profile['threat_score']
         if score >= 70:
             level = 'critical'
             degradation = 'BLACKOUT'
@@ -69,9 +306,60 @@ class SecurityShield:
             threat_level=level,
             threat_score=score,
             degradation_applied=degradation,
-            flags=profile['flags']
+            flags=flags
         )
 
+    def sync(self) -> int:
+        """Merge the pending deltas into the shared store and load the fleet-wide states back."""
+        if self.store is None:
+            return 0
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            merged = self.store.merge({sid: d.as_state() for sid, d in pending.items()}, time.time())
+        except Exception as e:
+            # Keep the deltas for the next attempt (newer requests merge into them).
+            with self._lock:
+                for session_id, delta in pending.items():
+                    newer = self._pending.get(session_id)
+                    if newer is not None:
+                        delta = SessionDelta.from_state(
+                            merge_state(delta.as_state(), newer.as_state(), self.half_life, WINDOW_SECONDS)
+                        )
+                    self._pending[session_id] = delta
+            self.last_sync_error = str(e)
+            raise
+        with self._lock:
+            for session_id, state in merged.items():
+                profile = self.session_profiles.peek(session_id)
+                if profile is None:
+                    continue
+                newer = self._pending.get(session_id)
+                if newer is not None:
+                    # Requests scored while the store was busy are not in `state` yet.
+                    state = merge_state(state, newer.as_state(), self.half_life, WINDOW_SECONDS)
+                profile.load(state, WINDOW_SECONDS)
+            self.syncs += 1
+        self.last_sync_error = None
+        return len(merged)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self.session_profiles),
+                "max_sessions": self.session_profiles.max_sessions,
+                "evicted_idle": self.session_profiles.evicted_idle,
+                "evicted_lru": self.session_profiles.evicted_lru,
+                "pending_sessions": len(self._pending),
+                "syncs": self.syncs,
+                "last_sync_error": self.last_sync_error,
+                "signals": [signal["name"] for signal in self.signals.signals],
+                "signal_errors": self.signals.errors,
+                "store": self.store.stats() if self.store is not None else None,
+            }
+
     def degrade_response(self, data: Any, assessment: ThreatAssessment) -> Any:
         """
         Applies the Zero-Strategy: if you're a bot, the market is worth 0 AED.
@@ -0,0 +1,208 @@
+"""
+Shared threat-scoring state for SecurityShield (security.py).
+
+Each worker scores requests against its own in-memory session profiles, so
+evaluate_request never waits on I/O. With a shared store configured, the
+shield also records what each request added (score points, window hits,
+flags) as a per-session delta, and a background sync merges the batch of
+deltas into the store and loads the fleet-wide result back into the local
+profiles. A session spread over several workers is therefore scored on its
+total traffic, at most one sync interval late.
+
+A session's state (and a delta) is a small JSON-able dict:
+
+  {"score": float, "at": float, "win": {"<window start>": hits},
+   "flags": {name: count}, "last": float}
+
+merge_state() combines two of them: scores decay to the later `at` and add
+(a score that has decayed below 0.5 is dropped with its flags), window
+counts add, flags add, `last` is the later request. It is associative, so
+stores only need an atomic "merge this into the stored value" operation:
+
+  LocalStateStore   in-process dict under a lock; a stand-in for a
+                    Redis-like store, where merge() would be one Lua script
+  SQLiteStateStore  a WAL database file shared by the workers on a host;
+                    merge() is one INSERT ... ON CONFLICT DO UPDATE per
+                    session calling merge_state as a SQL function, all in
+                    one transaction per sync
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+# How often a store deletes sessions idle for longer than its ttl.
+_GC_EVERY_SECONDS = 60.0
+
+
+def decay(score: float, elapsed: float, half_life: float) -> float:
+    """`score` after `elapsed` seconds; below 0.5 counts as fully cooled down (0)."""
+    if half_life > 0 and elapsed > 0 and score:
+        score *= 0.5 ** (elapsed / half_life)
+    return score if score >= 0.5 else 0.0
+
+
+def merge_state(a: Optional[dict], b: dict, half_life: float, window: float) -> dict:
+    if a is None:
+        return b
+    at = max(a["at"], b["at"])
+    score = 0.0
+    flags: Dict[str, int] = {}
+    for part in (a, b):
+        part_score = decay(part["score"], at - part["at"], half_life)
+        if part_score:
+            score += part_score
+            for name, n in part["flags"].items():
+                flags[name] = flags.get(name, 0) + n
+    win: Dict[str, int] = dict(a["win"])
+    for start, n in b["win"].items():
+        win[start] = win.get(start, 0) + n
+    if win:
+        # Only the current and previous windows matter to the sliding count.
+        newest = max(float(start) for start in win)
+        win = {start: n for start, n in win.items() if float(start) > newest - 2 * window}
+    return {"score": score, "at": at, "win": win, "flags": flags, "last": max(a["last"], b["last"])}
+
+
+class SessionDelta:
+    """What one worker's requests added to a session since the last sync."""
+
+    __slots__ = ("score", "at", "win", "flags", "last")
+
+    def __init__(self, now: float):
+        self.score = 0.0
+        self.at = now
+        self.win: Dict[str, int] = {}
+        self.flags: Dict[str, int] = {}
+        self.last = now
+
+    def hit(self, now: float, window_start: float) -> None:
+        key = repr(window_start)
+        self.win[key] = self.win.get(key, 0) + 1
+        self.at = self.last = now
+
+    def flag(self, name: str, points: float) -> None:
+        self.score += points
+        self.flags[name] = self.flags.get(name, 0) + 1
+
+    def as_state(self) -> dict:
+        return {"score": self.score, "at": self.at, "win": self.win, "flags": self.flags, "last": self.last}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "SessionDelta":
+        delta = cls(state["at"])
+        delta.score, delta.win, delta.flags, delta.last = state["score"], state["win"], state["flags"], state["last"]
+        return delta
+
+
+class LocalStateStore:
+    """In-process store with the same merge contract as a shared one (tests, single-process runs)."""
+
+    def __init__(self, half_life: float, window: float, ttl: float = 3600.0):
+        self.half_life = half_life
+        self.window = window
+        self.ttl = ttl
+        self.merges = 0
+        self._states: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._gc_at = 0.0
+
+    def merge(self, deltas: Dict[str, dict], now: float) -> Dict[str, dict]:
+        with self._lock:
+            merged = {}
+            for session_id, delta in deltas.items():
+                state = merge_state(self._states.get(session_id), delta, self.half_life, self.window)
+                self._states[session_id] = merged[session_id] = state
+            self.merges += 1
+            if now - self._gc_at > _GC_EVERY_SECONDS:
+                self._gc_at = now
+                for session_id in [k for k, s in self._states.items() if now - s["last"] > self.ttl]:
+                    del self._states[session_id]
+            return merged
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"store": "local", "sessions": len(self._states), "merges": self.merges}
+
+
+class SQLiteStateStore:
+    def __init__(self, path: str, half_life: float, window: float, ttl: float = 3600.0):
+        self.path = path
+        self.half_life = half_life
+        self.window = window
+        self.ttl = ttl
+        self.merges = 0
+        self.merge_ms = 0.0
+        self._local = threading.local()
+        self._gc_at = 0.0
+        with self._db() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS shield_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    state      TEXT NOT NULL,
+                    last_seen  REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS idx_shield_sessions_last_seen ON shield_sessions (last_seen)")
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.create_function("shield_merge", 2, self._sql_merge, deterministic=True)
+            self._local.db = db
+        return db
+
+    def _sql_merge(self, stored: Optional[str], delta: str) -> str:
+        return json.dumps(merge_state(json.loads(stored) if stored else None, json.loads(delta),
+                                      self.half_life, self.window))
+
+    def merge(self, deltas: Dict[str, dict], now: float) -> Dict[str, dict]:
+        started = time.perf_counter()
+        db = self._db()
+        merged = {}
+        with db:
+            for session_id, delta in deltas.items():
+                rows = db.execute(
+                    """
+                    INSERT INTO shield_sessions (session_id, state, last_seen) VALUES (?, ?, ?)
+                    ON CONFLICT (session_id) DO UPDATE SET
+                        state = shield_merge(shield_sessions.state, excluded.state),
+                        last_seen = MAX(shield_sessions.last_seen, excluded.last_seen)
+                    RETURNING state
+                    """,
+                    (session_id, json.dumps(delta), delta["last"]),
+                ).fetchall()
+                merged[session_id] = json.loads(rows[0][0])
+            if now - self._gc_at > _GC_EVERY_SECONDS:
+                self._gc_at = now
+                db.execute("DELETE FROM shield_sessions WHERE last_seen < ?", (now - self.ttl,))
+        self.merges += 1
+        self.merge_ms += (time.perf_counter() - started) * 1000
+        return merged
+
+    def stats(self) -> dict:
+        return {
+            "store": "sqlite",
+            "path": self.path,
+            "merges": self.merges,
+            "avg_merge_ms": round(self.merge_ms / self.merges, 2) if self.merges else None,
+        }
+
+
+def make_state_store(kind: str, path: Optional[str], half_life: float, window: float, ttl: float):
+    """Store for SHIELD_STATE_BACKEND: "process" (none, per-worker state), "local" or "sqlite"."""
+    if kind == "sqlite":
+        return SQLiteStateStore(path or os.path.join(tempfile.gettempdir(), "lelwa-shield.db"),
+                                half_life, window, ttl)
+    if kind == "local":
+        return LocalStateStore(half_life, window, ttl)
+    if kind in ("", "process"):
+        return None
+    raise ValueError(f"Unknown shield state backend {kind!r} (process, local or sqlite)")
@@ -0,0 +1,143 @@
+"""
+Background-refreshed market snapshots for the dashboard endpoints.
+
+MarketSnapshotService recomputes the market regime, pulse and overview on a
+schedule and keeps the latest good result of each in memory, so a page load
+is a dictionary lookup no matter how many consoles are open. Reads are
+stale-while-revalidate: a snapshot older than the refresh interval is still
+served, and a refresh is triggered in the background. A failed refresh (an
+error or a degraded stand-in result) keeps the previous snapshot.
+
+Each snapshot carries `generated_at` and an ETag over its content. The ETag
+only changes when the data does, so If-None-Match revalidation hits 304
+across refreshes.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from scheduler import PeriodicTask
+
+# Snapshot name -> tool computing it, in refresh order (pulse reuses the fresh regime).
+SNAPSHOT_TOOLS = {
+    "regime": "get_market_regime",
+    "pulse": "get_market_pulse",
+    "overview": "get_market_overview",
+}
+
+# Keys that change on every computation without the data changing.
+_VOLATILE_KEYS = frozenset({"timestamp", "generated_at"})
+
+
+def _etag(payload: Any) -> str:
+    if isinstance(payload, dict):
+        payload = {k: v for k, v in payload.items() if k not in _VOLATILE_KEYS}
+    body = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+class Snapshot:
+    __slots__ = ("name", "payload", "etag", "generated_at", "computed_at")
+
+    def __init__(self, name: str, payload: Any, etag: str, generated_at: str):
+        self.name = name
+        self.payload = payload
+        self.etag = etag
+        self.generated_at = generated_at
+        self.computed_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.computed_at
+
+    def body(self) -> Any:
+        if isinstance(self.payload, dict):
+            return {**self.payload, "generated_at": self.generated_at}
+        return self.payload
+
+
+class MarketSnapshotService:
+    def __init__(self, executor: Any, interval: float = 60.0):
+        self.executor = executor
+        self.interval = interval
+        self.refreshes = 0
+        self.failures = 0
+        self.served = 0
+        self.served_stale = 0
+        self.last_error: Optional[str] = None
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._attempted_at: Optional[float] = None
+        self._refresh_lock = threading.Lock()
+        self.task = PeriodicTask("market-snapshots", interval, self.refresh, run_immediately=True)
+
+    def refresh(self) -> None:
+        """Recompute every snapshot. Concurrent callers wait for the running refresh instead of repeating it."""
+        if not self._refresh_lock.acquire(blocking=False):
+            with self._refresh_lock:
+                return
+        self._attempted_at = time.monotonic()
+        try:
+            # Bypass the tool memo so the snapshots (and the memo, re-warmed here) are fresh.
+            self.executor.invalidate("market")
+            for name, tool in SNAPSHOT_TOOLS.items():
+                self._compute(name, lambda tool=tool: self.executor.execute(tool, {}, session_id="system"))
+            self.refreshes += 1
+        finally:
+            self._refresh_lock.release()
+
+    def get(self, name: str) -> Optional[Snapshot]:
+        """
+        Latest snapshot for `name`. Computes synchronously only when none has
+        been built yet; a stale one is returned as-is and refreshed in the
+        background. None when no good snapshot could ever be computed.
+        """
+        snap = self._snapshots.get(name)
+        if snap is None:
+            # Cold start; don't retry a failing source on every request.
+            if self._attempted_at is None or time.monotonic() - self._attempted_at > self.interval:
+                self.refresh()
+            snap = self._snapshots.get(name)
+            if snap is None:
+                return None
+        elif self.interval > 0 and snap.age() > self.interval:
+            self.served_stale += 1
+            self.task.trigger()
+        self.served += 1
+        return snap
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "served": self.served,
+            "served_stale": self.served_stale,
+            "last_error": self.last_error,
+            "snapshots": {
+                name: {"generated_at": s.generated_at, "age_seconds": round(s.age(), 1), "etag": s.etag}
+                for name, s in self._snapshots.items()
+            },
+        }
+
+    def _compute(self, name: str, fn: Callable[[], Any]) -> None:
+        try:
+            payload = fn()
+        except Exception as e:
+            payload = {"error": str(e)}
+        if isinstance(payload, dict) and ("error" in payload or payload.get("degraded")):
+            # A stand-in answer (the tool could not reach its data) counts as a failed refresh too.
+            self.failures += 1
+            self.last_error = f"{name}: {payload.get('error', 'degraded result')}"
+            return
+
+        etag = _etag(payload)
+        previous = self._snapshots.get(name)
+        if previous is not None and previous.etag == etag:
+            # Unchanged data keeps its generated_at, so clients see a stable version.
+            generated_at = previous.generated_at
+        else:
+            generated_at = datetime.now(timezone.utc).isoformat()
+        self._snapshots[name] = Snapshot(name, payload, etag, generated_at)
@@ -0,0 +1,147 @@
+"""
+Incremental parser for the prepared-work JSON contract.
+
+Feed model output as it streams in; the parser scans each character once and
+emits events as soon as they are complete:
+
+  ("reply_delta", str)   newly decoded text of the top-level "reply" string
+  ("reply", str)         the full reply, once its string closes
+  ("block", dict)        one prepared_blocks entry, once its object closes
+  ("action", dict)       one prepared_actions entry, once its object closes
+
+Text before the first "{" (prose, ``` fences) is skipped. Nothing here
+enforces the contract — _ensure_prepared_contract still runs on the full text.
+"""
+
+import json
+from typing import List, Optional, Tuple
+
+_ARRAY_EVENTS = {"prepared_blocks": "block", "prepared_actions": "action"}
+
+
+def _decode_partial_string(raw: str) -> str:
+    """Decode the body of a JSON string that may stop mid-escape."""
+    cut = len(raw)
+    backslash = raw.rfind("\\", max(0, cut - 6))
+    if backslash != -1:
+        run = 0
+        i = backslash
+        while i >= 0 and raw[i] == "\\":
+            run += 1
+            i -= 1
+        if run % 2 == 1:
+            # Unfinished escape: "\" or "\uXX" — hold it back until complete.
+            tail = raw[backslash:]
+            if len(tail) < 2 or (tail[1] == "u" and len(tail) < 6):
+                cut = backslash
+    try:
+        return json.loads('"' + raw[:cut] + '"')
+    except ValueError:
+        return ""
+
+
+class PreparedStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self.done = False
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._array_event: Optional[str] = None
+        self._object_start: Optional[int] = None
+        self._reply_start: Optional[int] = None
+        self._reply_sent = ""
+
+    def feed(self, chunk: str) -> List[Tuple[str, object]]:
+        events: List[Tuple[str, object]] = []
+        if self.done or not chunk:
+            return events
+        self.buffer += chunk
+        buf = self.buffer
+        i = self._pos
+        n = len(buf)
+
+        while i < n and not self.done:
+            ch = buf[i]
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._expect_key = True
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._close_string(i, events)
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i + 1
+                if self._depth == 1 and not self._expect_key and self._key == "reply":
+                    self._reply_start = i + 1
+            elif ch in "{[":
+                if self._depth == 2 and ch == "{" and self._array_event:
+                    self._object_start = i
+                if self._depth == 1 and ch == "[":
+                    self._array_event = _ARRAY_EVENTS.get(self._key or "")
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 2 and ch == "}" and self._object_start is not None:
+                    try:
+                        obj = json.loads(buf[self._object_start:i + 1])
+                    except ValueError:
+                        obj = None
+                    if isinstance(obj, dict):
+                        events.append((self._array_event, obj))
+                    self._object_start = None
+                elif self._depth == 1 and ch == "]":
+                    self._array_event = None
+                elif self._depth == 0:
+                    self.done = True
+            elif self._depth == 1:
+                if ch == ",":
+                    self._expect_key = True
+                    self._key = None
+                elif ch == ":":
+                    self._expect_key = False
+            i += 1
+
+        self._pos = i
+        if self._in_string and self._reply_start is not None:
+            decoded = _decode_partial_string(buf[self._reply_start:i])
+            if len(decoded) > len(self._reply_sent):
+                events.append(("reply_delta", decoded[len(self._reply_sent):]))
+                self._reply_sent = decoded
+        return events
+
+    def _close_string(self, end: int, events: List[Tuple[str, object]]) -> None:
+        if self._depth != 1:
+            return
+        raw = self.buffer[self._string_start:end]
+        if self._expect_key:
+            try:
+                self._key = json.loads('"' + raw + '"')
+            except ValueError:
+                self._key = raw
+            return
+        if self._reply_start is not None:
+            reply = _decode_partial_string(raw)
+            if len(reply) > len(self._reply_sent):
+                events.append(("reply_delta", reply[len(self._reply_sent):]))
+            events.append(("reply", reply))
+            self._reply_sent = reply
+            self._reply_start = None
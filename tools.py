@@ -1,127 +1,180 @@
+import copy
 import json
 import os
 import hashlib
+import threading
+import time
 from typing import List, Dict, Any, Optional
-from sqlalchemy import create_engine, text
-from fpdf import FPDF
+from sqlalchemy import bindparam, create_engine, text
 from datetime import datetime
 import pandas as pd
-from twilio.rest import Client
-from channels import get_channel_config
-
-
-def _schema_to_gemini(schema: dict) -> dict:
-    """
-    Convert JSON Schema (OpenAI-style) -> google.generativeai Schema dict.
-    Key rules:
-      - "type" becomes "type_"
-      - types must be UPPERCASE enum names: OBJECT, STRING, NUMBER, INTEGER, BOOLEAN, ARRAY
-    """
-    if not schema:
-        return {"type_": "OBJECT"}
-
-    t = schema.get("type", "object")
-    type_map = {
-        "object": "OBJECT",
-        "string": "STRING",
-        "number": "NUMBER",
-        "integer": "INTEGER",
-        "boolean": "BOOLEAN",
-        "array": "ARRAY",
+from channels import get_channel_config, on_config_saved
+from artifacts import ArtifactStore
+from cache import MISSING, TTLCache
+from documents import document_payload, render_date, render_document_pdf
+from messaging import SenderThrottle, TwilioClientPool, broadcast, send_message, whatsapp_address
+from registry import ToolRegistry, memoize, writes
+from portfolio import optimize_portfolio
+from ranking import RankingEngine
+from resolver import NameResolver
+import request_scope
+
+# How long a computed inventory data-version stamp is reused before re-reading it.
+DATA_VERSION_TTL_SECONDS = float(os.getenv("DATA_VERSION_TTL_SECONDS", "15"))
+
+# Tables whose writes change answers built from inventory data.
+INVENTORY_TABLES = (
+    "agent_inventory_view_v1",
+    "entrestate_inventory",
+    "market_scores_v1",
+    "entrestate_area_cards",
+    "dld_area_benchmarks",
+)
+
+# Memoized tool results (see @memoize): entry and approximate payload-byte bounds.
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "2048"))
+TOOL_CACHE_MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Most properties one batched lookup (fetch_properties) will resolve.
+BATCH_FETCH_MAX = 50
+
+_PROPERTIES_BY_ID = text(
+    "SELECT * FROM agent_inventory_view_v1 WHERE asset_id IN :ids"
+).bindparams(bindparam("ids", expanding=True))
+
+# JSON-encoded list columns of agent_inventory_view_v1.
+_JSON_LIST_FIELDS = ("reason_codes", "risk_flags", "drivers")
+
+
+def _decode_json_fields(row: Dict[str, Any]) -> Dict[str, Any]:
+    for k in _JSON_LIST_FIELDS:
+        if isinstance(row.get(k), str):
+            try:
+                row[k] = json.loads(row[k])
+            except ValueError:
+                pass
+    return row
+
+
+# Serve search_properties from the in-process ranking engine (see ranking.py)
+# instead of calling agent_ranked_for_investor_v1.
+RANKING_ENGINE = os.getenv("RANKING_ENGINE", "0").lower() in ("1", "true", "yes")
+
+# Ranked candidates plan_investment_portfolio optimizes over (one query).
+PORTFOLIO_CANDIDATES = int(os.getenv("PORTFOLIO_CANDIDATES", "500"))
+RISK_PROFILE_ALIASES = {"Balanced": "Moderate"}
+
+# Market-regime signals computed by full scans of the source tables.
+REGIME_SIGNALS_SCAN_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM dld_sales_transactions WHERE instance_date > NOW() - INTERVAL '30 days') as monthly_tx,
+        (SELECT COUNT(*) FROM entrestate_inventory WHERE launch_year >= 2025) as recent_launches,
+        (SELECT AVG(rental_demand_score) FROM entrestate_inventory) as avg_demand,
+        (SELECT COUNT(*) FROM entrestate_inventory WHERE final_status = 'Under Construction') as construction_count,
+        (SELECT COUNT(*) FROM entrestate_inventory WHERE final_status = 'Handover Year (Critical)') as handover_wave,
+        (SELECT AVG(growth_score) FROM growth_by_area) as avg_growth
+    FROM entrestate_inventory LIMIT 1
+"""
+
+# The same signals from the rollup tables in schema.sql: whole days come from
+# market_tx_daily, the partial day at the window start from an indexed range
+# scan, so the result matches the full scan exactly.
+REGIME_SIGNALS_ROLLUP_SQL = """
+    SELECT
+        EXISTS (
+            SELECT 1 FROM market_rollup_state
+            WHERE name = 'market_regime' AND backfilled_at IS NOT NULL
+        ) as ready,
+        (
+            (SELECT COALESCE(SUM(tx_count), 0) FROM market_tx_daily
+             WHERE day > (NOW() - INTERVAL '30 days')::date)
+            + (SELECT COUNT(*) FROM dld_sales_transactions
+               WHERE instance_date > NOW() - INTERVAL '30 days'
+                 AND instance_date < (NOW() - INTERVAL '30 days')::date + 1)
+        )::bigint as monthly_tx,
+        COALESCE(SUM(row_count) FILTER (WHERE launch_year >= 2025), 0)::bigint as recent_launches,
+        (SUM(demand_sum) / NULLIF(SUM(demand_count), 0))::float8 as avg_demand,
+        COALESCE(SUM(row_count) FILTER (WHERE final_status = 'Under Construction'), 0)::bigint as construction_count,
+        COALESCE(SUM(row_count) FILTER (WHERE final_status = 'Handover Year (Critical)'), 0)::bigint as handover_wave,
+        (SELECT AVG(growth_score) FROM growth_by_area) as avg_growth
+    FROM market_inventory_rollup
+"""
+
+
+# Generated PDFs (see artifacts.py): public URL prefix and directory bounds.
+ARTIFACT_BASE_URL = os.getenv("ARTIFACT_BASE_URL", "https://api.ezz.ae/static/pdfs")
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(512 * 1024 * 1024)))
+ARTIFACT_MAX_AGE_SECONDS = float(os.getenv("ARTIFACT_MAX_AGE_SECONDS", str(7 * 86400)))
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+# How long a tool call waits for a new PDF before returning status "rendering".
+PDF_RENDER_WAIT_SECONDS = float(os.getenv("PDF_RENDER_WAIT_SECONDS", "10"))
+
+# Twilio (see messaging.py). The base URL override points clients at another
+# host with Twilio's REST paths, e.g. scripts/fake_twilio_server.py.
+TWILIO_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL", "")
+# Messages per second each WhatsApp sender is paced to (0 = unpaced).
+TWILIO_MESSAGES_PER_SECOND = float(os.getenv("TWILIO_MESSAGES_PER_SECOND", "80"))
+WHATSAPP_BROADCAST_CONCURRENCY = int(os.getenv("WHATSAPP_BROADCAST_CONCURRENCY", "16"))
+WHATSAPP_BROADCAST_MAX_LEADS = int(os.getenv("WHATSAPP_BROADCAST_MAX_LEADS", "500"))
+
+
+def _canonical_args(args: dict) -> str:
+    """Stable cache key for tool args: sorted keys, no empty values, trimmed lowercase strings."""
+    canonical = {
+        k: v.strip().lower() if isinstance(v, str) else v
+        for k, v in (args or {}).items()
+        if v is not None and v != ""
     }
-    gemini: dict = {"type_": type_map.get(t, "OBJECT")}
+    return json.dumps(canonical, sort_keys=True, default=str)
 
-    if "description" in schema and schema["description"]:
-        gemini["description"] = schema["description"]
 
-    if "enum" in schema and schema["enum"]:
-        gemini["enum"] = schema["enum"]
+def _stamp(entry, result: Any) -> Any:
+    """Set a memoized tool's `stamp` key (see registry.memoize) to now."""
+    if entry.memo_stamp and isinstance(result, dict):
+        result[entry.memo_stamp] = datetime.now().isoformat()
+    return result
 
-    # properties
-    if t == "object":
-        props = schema.get("properties", {}) or {}
-        if props:
-            gemini["properties"] = {k: _schema_to_gemini(v) for k, v in props.items()}
-        req = schema.get("required", []) or []
-        if req:
-            gemini["required"] = req
 
-    # array items
-    if t == "array":
-        items = schema.get("items") or {}
-        gemini["items"] = _schema_to_gemini(items)
+def _payload_size(value: Any) -> int:
+    return len(json.dumps(value, default=str))
 
-    return gemini
 
 class ToolExecutor:
     """
     The bridge between LLM linguistic intent and the Neon deterministic spine.
     """
-    def __init__(self, engine):
+    def __init__(self, engine, artifacts: Optional[ArtifactStore] = None):
         self.engine = engine
-        # Load tool definitions from the spec
-        spec_path = os.path.join(os.path.dirname(__file__), 'entrestate_codex_spec_v1.json')
-        with open(spec_path, 'r') as f:
-            spec = json.load(f)
-            # Gemini expects bare function declarations with Schema using type_ enums.
-            self.tool_definitions = []
-            manual_only = {"send_whatsapp", "call_investor"}
-            for tool in spec["tools"]["definitions"]:
-                function = tool.get("function", {})
-                if function.get("name") in manual_only:
-                    continue
-                params = function.get("parameters", {}) or {}
-                self.tool_definitions.append({
-                    "name": function.get("name"),
-                    "description": function.get("description", ""),
-                    "parameters": _schema_to_gemini(params),
-                })
+        # Content-addressed PDF store; main.py points it at STATIC_DIR/pdfs
+        self.artifacts = artifacts or ArtifactStore(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "pdfs"),
+            ARTIFACT_BASE_URL,
+            max_bytes=ARTIFACT_MAX_BYTES,
+            max_age=ARTIFACT_MAX_AGE_SECONDS,
+            render_workers=PDF_RENDER_WORKERS,
+            wait=PDF_RENDER_WAIT_SECONDS,
+        )
+        # Declarations and dispatch table are built once from the spec (see registry.py)
+        self.registry = ToolRegistry(self)
+        # Fuzzy property / project / area names -> keys (see resolver.py)
+        self.resolver = NameResolver(engine)
+        # Vectorized agent_ranked_for_investor_v1 over an inventory snapshot (optional)
+        self.ranking = RankingEngine(engine) if RANKING_ENGINE else None
+        # One Twilio client per account_sid, dropped when its credentials are re-saved
+        self.twilio = TwilioClientPool(TWILIO_API_BASE_URL or None, max_connections=WHATSAPP_BROADCAST_CONCURRENCY)
+        on_config_saved(self.twilio.on_config_saved)
+        self.sender_throttle = SenderThrottle(TWILIO_MESSAGES_PER_SECOND)
+        self._data_version = ("", 0.0)
+        self.memo = TTLCache(maxsize=TOOL_CACHE_MAX_ENTRIES, max_bytes=TOOL_CACHE_MAX_BYTES, sizeof=_payload_size)
+        self._memo_stats: Dict[str, Dict[str, float]] = {}
+        self._memo_lock = threading.Lock()
 
     def get_tool_definitions(self):
-        return self.tool_definitions
+        return self.registry.gemini_declarations
 
     def get_openai_tool_definitions(self):
         """Returns tool definitions in OpenAI function-calling format (used by Ollama)."""
-        spec_path = os.path.join(os.path.dirname(__file__), 'entrestate_codex_spec_v1.json')
-        with open(spec_path, 'r') as f:
-            spec = json.load(f)
-        manual_only = {"send_whatsapp", "call_investor"}
-        tools = []
-        for tool in spec["tools"]["definitions"]:
-            function = tool.get("function", {})
-            if function.get("name") in manual_only:
-                continue
-            tools.append({
-                "type": "function",
-                "function": {
-                    "name": function.get("name"),
-                    "description": function.get("description", ""),
-                    "parameters": function.get("parameters", {}),
-                },
-            })
-        # Append the browser tool (defined inline, not in the JSON spec)
-        tools.append({
-            "type": "function",
-            "function": {
-                "name": "browse_web",
-                "description": (
-                    "Use a real web browser to research a topic, find current news, "
-                    "check live prices, or gather information not in the local database. "
-                    "Use this when the answer requires up-to-date or external web data."
-                ),
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "task": {
-                            "type": "string",
-                            "description": "Natural language task describing what to search or browse for.",
-                        }
-                    },
-                    "required": ["task"],
-                },
-            },
-        })
-        return tools
+        return self.registry.openai_declarations
 
     def tool_browse_web(self, args: dict, session_id: str = None, user_id: str = "default") -> dict:
         """
@@ -163,36 +216,201 @@ class ToolExecutor:
         except Exception as e:
             return {"error": str(e), "task": task}
 
-    def _get_property_snapshot(self, name: str) -> Optional[Dict[str, Any]]:
+    def _name_predicate(self, kind: str, source: str, column: str, name: str):
+        """
+        (SQL predicate, params) selecting the `source` row(s) a user-typed name
+        refers to: equality on the resolver's best candidate, or ILIKE while the
+        name index has not been built yet. None when nothing matches.
+        """
         if not name:
             return None
+        match = self.resolver.best(kind, name, source=source)
+        if match is not None:
+            return f"{column} = :name", {"name": match["key"]}
+        if self.resolver.ready:
+            return None
+        return f"{column} ILIKE :name", {"name": f"%{name}%"}
+
+    def fetch_properties(
+        self, names: List[str] = None, asset_ids: List[str] = None, cap: int = BATCH_FETCH_MAX
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Batched agent_inventory_view_v1 lookup: up to `cap` property names
+        (resolved through the name index) or asset_ids, fetched with one
+        query. Returns one row dict (or None when not found) per input, in
+        input order. Inside a request scope (one chat turn) each row is
+        fetched once and shared by every tool that asks for it.
+        """
+        if asset_ids is not None:
+            keys = [("agent_inventory_view_v1", a) if a else None for a in asset_ids[:cap]]
+        else:
+            keys = []
+            for name in (names or [])[:cap]:
+                match = self.resolver.best("property", name, source="agent_inventory_view_v1") if name else None
+                if match is not None:
+                    keys.append(("agent_inventory_view_v1", match["key"]))
+                elif name and not self.resolver.ready:
+                    keys.append(("agent_inventory_view_v1", "~", name.strip().lower()))
+                else:
+                    keys.append(None)
+
+        wanted = list(dict.fromkeys(k for k in keys if k is not None))
+        if not wanted:
+            return [None] * len(keys)
+        scope = request_scope.current()
+        rows = scope.get_or_load_many(wanted, self._load_properties) if scope else self._load_properties(wanted)
+        # Callers annotate the dicts they get; keep the shared copies pristine.
+        return [dict(rows[k]) if k is not None and rows.get(k) else None for k in keys]
+
+    def _load_properties(self, keys: List[tuple]) -> Dict[tuple, Dict[str, Any]]:
+        """One round trip for every key; name keys (index not built yet) fall back to ILIKE."""
+        ids = [k[1] for k in keys if len(k) == 2]
+        patterns = [k[2] for k in keys if len(k) == 3]
+        found: Dict[tuple, Dict[str, Any]] = {}
         with self.engine.connect() as conn:
-            row = conn.execute(
-                text("SELECT * FROM agent_inventory_view_v1 WHERE name ILIKE :name LIMIT 1"),
-                {"name": f"%{name}%"},
-            ).fetchone()
-            return dict(row._mapping) if row else None
+            if ids:
+                for row in conn.execute(_PROPERTIES_BY_ID, {"ids": ids}):
+                    found[("agent_inventory_view_v1", row.asset_id)] = dict(row._mapping)
+            if patterns:
+                clauses = " OR ".join(f"name ILIKE :p{i}" for i in range(len(patterns)))
+                rows = conn.execute(
+                    text(f"SELECT * FROM agent_inventory_view_v1 WHERE {clauses} LIMIT :cap"),
+                    {**{f"p{i}": f"%{p}%" for i, p in enumerate(patterns)}, "cap": 20 * len(patterns)},
+                ).fetchall()
+                for pattern in patterns:
+                    for row in rows:
+                        if pattern in (row.name or "").lower():
+                            found[("agent_inventory_view_v1", "~", pattern)] = dict(row._mapping)
+                            break
+        return found
+
+    def _find_property(self, name: str, asset_id: str = None) -> Optional[Dict[str, Any]]:
+        """One agent_inventory_view_v1 row by asset_id or property name (see fetch_properties)."""
+        if asset_id:
+            return self.fetch_properties(asset_ids=[asset_id])[0]
+        return self.fetch_properties(names=[name])[0]
+
+    def _get_property_snapshot(self, name: str, asset_id: str = None) -> Optional[Dict[str, Any]]:
+        if not name and not asset_id:
+            return None
+        return self._find_property(name, asset_id)
+
+    def data_version(self) -> str:
+        """
+        Stamp of the inventory tables' write activity, read from pg_stat_user_tables
+        (O(1), no table scan) and reused for DATA_VERSION_TTL_SECONDS.
+        Changes whenever inventory rows are inserted, updated or deleted.
+        """
+        stamp, expires_at = self._data_version
+        if stamp and time.monotonic() < expires_at:
+            return stamp
+        if self.engine is None:
+            return "no-db"
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(
+                    text(
+                        "SELECT relid, n_tup_ins, n_tup_upd, n_tup_del FROM pg_stat_user_tables "
+                        "WHERE relname = ANY(:tables) ORDER BY relname"
+                    ),
+                    {"tables": list(INVENTORY_TABLES)},
+                ).fetchall()
+            raw = "|".join(":".join(str(v) for v in row) for row in rows)
+            stamp = hashlib.md5(raw.encode()).hexdigest()[:12]
+        except Exception:
+            stamp = "unknown"
+        self._data_version = (stamp, time.monotonic() + DATA_VERSION_TTL_SECONDS)
+        return stamp
 
     def execute(self, name: str, args: dict, session_id: str = None, user_id: str = "default") -> dict:
-        """Routes the tool call to the correct internal method."""
-        method = getattr(self, f"tool_{name}", None)
-        if method:
-            try:
-                return method(args, session_id, user_id=user_id)
-            except TypeError:
-                # Older tool methods don't accept user_id — call without it
-                try:
-                    return method(args, session_id)
-                except Exception as e:
-                    return {"error": str(e)}
-            except Exception as e:
-                return {"error": str(e)}
-        return {"error": f"Tool {name} is not implemented."}
+        """
+        Routes the tool call to the correct internal method.
+        Read tools declared with @memoize are served from self.memo while fresh;
+        tools declared with @writes drop the cached results they affect.
+        """
+        entry = self.registry.get(name)
+        if entry is None:
+            return {"error": f"Tool {name} is not implemented."}
+
+        key = None
+        if entry.memo_ttl:
+            key = (name, _canonical_args(args))
+            cached = self.memo.get(key)
+            if cached is not MISSING:
+                self._record_memo(name, hit=True)
+                return _stamp(entry, copy.deepcopy(cached))
+
+        started = time.perf_counter()
+        try:
+            result = entry(args, session_id, user_id=user_id)
+        except Exception as e:
+            return {"error": str(e)}
+
+        if key is not None:
+            self._record_memo(name, hit=False, ms=(time.perf_counter() - started) * 1000)
+            # Errors and degraded stand-in answers are retried on the next call.
+            if not (isinstance(result, dict) and ("error" in result or result.get("degraded"))):
+                self.memo.set(key, copy.deepcopy(result), ttl=entry.memo_ttl)
+            _stamp(entry, result)
+        if entry.writes is not None:
+            scope = request_scope.current()
+            if scope is not None:
+                scope.forget()
+        if entry.writes:
+            self.invalidate(*entry.writes)
+        return result
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop memoized results of every tool reading data with one of `tags`."""
+        names = set()
+        for tag in tags:
+            names.update(self.registry.tag_readers.get(tag, ()))
+        if not names:
+            return 0
+        return self.memo.delete_where(lambda key: key[0] in names)
+
+    def _record_memo(self, name: str, hit: bool, ms: float = 0.0) -> None:
+        with self._memo_lock:
+            s = self._memo_stats.setdefault(name, {"hits": 0, "misses": 0, "miss_ms": 0.0, "saved_ms": 0.0})
+            if hit:
+                s["hits"] += 1
+                # A hit saves roughly what an average miss costs.
+                s["saved_ms"] += s["miss_ms"] / s["misses"] if s["misses"] else 0.0
+            else:
+                s["misses"] += 1
+                s["miss_ms"] += ms
+
+    def memo_stats(self) -> dict:
+        """Per-tool hit ratio and estimated time saved, plus overall cache occupancy."""
+        with self._memo_lock:
+            tools = {
+                name: {
+                    "hits": s["hits"],
+                    "misses": s["misses"],
+                    "hit_ratio": round(s["hits"] / (s["hits"] + s["misses"]), 3),
+                    "avg_miss_ms": round(s["miss_ms"] / s["misses"], 1) if s["misses"] else None,
+                    "saved_ms": round(s["saved_ms"], 1),
+                }
+                for name, s in self._memo_stats.items()
+            }
+        return {"cache": self.memo.stats(), "tools": tools}
 
     # ── TOOL IMPLEMENTATIONS ──────────────────────────────────────
 
     def tool_search_properties(self, args: dict, session_id: str):
-        """Calls the ranked routing function in Neon."""
+        """Calls the ranked routing function in Neon (or its in-process mirror, see ranking.py)."""
+        if self.ranking is not None:
+            rows = self.ranking.rank(
+                args.get("risk_profile"),
+                args.get("horizon"),
+                args.get("budget_aed", 0),
+                args.get("preferred_area"),
+                args.get("beds_pref"),
+                args.get("intent", "invest"),
+                args.get("limit", 10),
+            )
+            if rows is not None:
+                return rows
         with self.engine.connect() as conn:
             query = text("""
                 SELECT * FROM agent_ranked_for_investor_v1(
@@ -210,16 +428,22 @@ class ToolExecutor:
             })
             return [dict(row._mapping) for row in result]
 
+    @memoize(ttl=900, tags=("areas",))
     def tool_get_area_intelligence(self, args: dict, session_id: str):
         """Retrieves the pre-computed Area Intelligence Card + DLD Benchmarks."""
+        area = args.get('area')
         with self.engine.connect() as conn:
             # Get Area Card
-            query = text("SELECT * FROM entrestate_area_cards WHERE area ILIKE :area")
-            row = conn.execute(query, {"area": f"%{args.get('area')}%"}).fetchone()
+            row = None
+            where = self._name_predicate("area", "entrestate_area_cards", "area", area)
+            if where:
+                row = conn.execute(text(f"SELECT * FROM entrestate_area_cards WHERE {where[0]}"), where[1]).fetchone()
             
             # Get DLD Benchmarks
-            dld_query = text("SELECT * FROM dld_area_benchmarks WHERE area_name_clean ILIKE :area")
-            dld_row = conn.execute(dld_query, {"area": f"%{args.get('area')}%"}).fetchone()
+            dld_row = None
+            where = self._name_predicate("area", "dld_area_benchmarks", "area_name_clean", area)
+            if where:
+                dld_row = conn.execute(text(f"SELECT * FROM dld_area_benchmarks WHERE {where[0]}"), where[1]).fetchone()
             
             if not row and not dld_row:
                 return {"error": "Area not found in data set."}
@@ -229,6 +453,7 @@ class ToolExecutor:
                 res['dld_benchmarks'] = dict(dld_row._mapping)
             return res
 
+    @writes("profiles")
     def tool_update_investor_profile(self, args: dict, session_id: str):
         """Persists natural language preferences into the structured Neon profile."""
         if not session_id:
@@ -251,6 +476,7 @@ class ToolExecutor:
             
         return {"status": "profile_updated", "fields": list(updates.keys())}
 
+    @memoize(ttl=300, tags=("market",))
     def tool_get_market_overview(self, args: dict, session_id: str):
         """Returns the high-level market pulse for the landing page."""
         with self.engine.connect() as conn:
@@ -261,14 +487,10 @@ class ToolExecutor:
         """Calculates mortgage scenarios and affordability."""
         name = args.get('property_name')
         price = 0
-        if name:
-            with self.engine.connect() as conn:
-                row = conn.execute(
-                    text("SELECT price_aed FROM agent_inventory_view_v1 WHERE name ILIKE :name LIMIT 1"),
-                    {"name": f"%{name}%"}
-                ).fetchone()
-                if row:
-                    price = row[0] or 0
+        if name or args.get('asset_id'):
+            row = self._find_property(name, args.get('asset_id'))
+            if row:
+                price = row.get('price_aed') or 0
         
         if price == 0:
             price = args.get('property_value', 0)
@@ -312,16 +534,10 @@ class ToolExecutor:
         name = args.get('property_name')
         years = args.get('holding_years', 5)
         
-        with self.engine.connect() as conn:
-            row = conn.execute(
-                text("SELECT * FROM agent_inventory_view_v1 WHERE name ILIKE :name LIMIT 1"),
-                {"name": f"%{name}%"}
-            ).fetchone()
-            
-        if not row:
+        p = self._find_property(name, args.get('asset_id'))
+        if not p:
             return {"error": "Property not found"}
             
-        p = dict(row._mapping)
         price = p.get('price_aed', 0)
         yield_pct = p.get('gross_yield', 0) / 100
         appreciation = 0.05 # Standard Dubai benchmark
@@ -347,38 +563,20 @@ class ToolExecutor:
             data = self.execute("analyze_investment", {"property_name": prop_name}, session_id)
         elif prop_name:
             data = self._get_property_snapshot(prop_name) or {"error": "Property not found."}
+            # Title with the listing's own name, so every spelling shares one artifact.
+            prop_name = data.get("name") or prop_name
         else:
-            data = self.tool_get_market_pulse({}, session_id)
+            data = self.execute("get_market_pulse", {}, session_id)
             prop_name = "Dubai Market Overview"
         
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Helvetica", "B", 16)
-        pdf.cell(0, 10, f"LELWA | {doc_type.upper()} REPORT", ln=True, align='C')
-        pdf.ln(10)
-        
-        pdf.set_font("Helvetica", "", 12)
-        pdf.cell(0, 10, f"Property: {prop_name}", ln=True)
-        pdf.cell(0, 10, f"Generated: {datetime.now().strftime('%Y-%m-%d')}", ln=True)
-        pdf.ln(5)
-        
-        # Add data rows
-        if isinstance(data, list):
-            data = data[0] if data else {}
-        if isinstance(data, dict):
-            for k, v in data.items():
-                pdf.cell(0, 8, f"{k.replace('_', ' ').title()}: {v}", ln=True)
-        
-        pdf.set_y(-30)
-        pdf.set_font("Helvetica", "I", 8)
-        pdf.multi_cell(0, 5, "Disclaimer: This document is prepared by Lelwa. Figures are based on DLD data and are not guaranteed.")
-        
-        filename = f"lelwa_{doc_type}_{hash(prop_name)}.pdf"
-        filepath = f"static/pdfs/{filename}"
-        os.makedirs("static/pdfs", exist_ok=True)
-        pdf.output(filepath)
-        
-        return {"pdf_url": f"https://api.ezz.ae/static/pdfs/{filename}", "status": "generated"}
+        # Same document type + same data on the same day -> same file, rendered once (see artifacts.py)
+        generated = render_date()
+        artifact = self.artifacts.get_or_render(
+            doc_type,
+            document_payload(prop_name, data, generated),
+            lambda path: render_document_pdf(path, doc_type, prop_name, data, generated),
+        )
+        return {"pdf_url": artifact["url"], "status": artifact["status"]}
 
     def tool_generate_offer(self, args: dict, session_id: str):
         """Generates a branded property offer PDF."""
@@ -405,11 +603,34 @@ class ToolExecutor:
         }, session_id)
 
     def tool_generate_viewing_plan(self, args: dict, session_id: str):
-        """Generates a viewing plan for visiting properties."""
-        property_names = args.get("property_names", "").split(",")
+        """Generates a viewing plan for visiting properties, grouped by area so each area is toured once."""
+        raw_names = args.get("property_names", "")
+        if isinstance(raw_names, list):
+            requested = [n.strip() for n in raw_names if n and n.strip()]
+        else:
+            requested = [n.strip() for n in raw_names.split(",") if n.strip()]
+        requested = requested[:BATCH_FETCH_MAX]
+        rows = self.fetch_properties(names=requested)
+
+        visits = []
+        for name, row in zip(requested, rows):
+            if row:
+                visits.append({
+                    "name": row.get("name") or name,
+                    "asset_id": row.get("asset_id"),
+                    "area": row.get("area"),
+                    "developer": row.get("developer"),
+                    "status": row.get("status"),
+                })
+            else:
+                visits.append({"name": name, "error": "not found"})
+        # Same-area viewings back to back; unknown properties last.
+        visits.sort(key=lambda v: (v.get("area") is None, v.get("area") or ""))
+        property_names = [v["name"] for v in visits]
         
         plan = {
             "properties_to_visit": property_names,
+            "visit_order": visits,
             "general_questions": [
                 "What is the service charge history?",
                 "Are there any upcoming community-wide maintenance projects?",
@@ -425,44 +646,65 @@ class ToolExecutor:
             "property_specific_checklist": {}
         }
         
-        for prop in property_names:
-            plan["property_specific_checklist"][prop.strip()] = [
+        for visit in visits:
+            checklist = [
                 "Check the age and condition of the AC unit.",
                 "Verify the developer's reputation for quality.",
                 "Assess the level of natural light during the day."
             ]
+            if visit.get("status") and visit["status"] != "Completed":
+                checklist.append("Compare construction progress with the promised handover date.")
+            plan["property_specific_checklist"][visit["name"]] = checklist
             
         return plan
 
     def tool_plan_investment_portfolio(self, args: dict, session_id: str):
-        """Splits a budget across multiple properties for an optimal portfolio."""
+        """
+        Picks up to num_properties distinct properties that together fit the
+        budget, trading rank against concentration in one area, developer or
+        handover band (see portfolio.py). One ranked candidate query plus one
+        batched fetch of the picks' details.
+        """
         total_budget = args.get("total_budget")
         risk_profile = args.get("risk_profile")
-        num_properties = args.get("num_properties", 3)
+        num_properties = max(1, min(int(args.get("num_properties") or 3), BATCH_FETCH_MAX))
         intent = args.get("intent")
 
         if not total_budget or not risk_profile:
             return {"error": "Total budget and risk profile are required."}
 
-        # Naive budget split
-        budget_per_property = total_budget / num_properties
-        
+        search_args = {
+            # The spec offers "Balanced"; investor_profiles_v1 stores it as "Moderate".
+            "risk_profile": RISK_PROFILE_ALIASES.get(risk_profile, risk_profile),
+            "horizon": "1-2yr", # Assume a mid-term horizon for portfolio planning
+            "budget_aed": total_budget / num_properties,
+            "intent": intent,
+            "limit": PORTFOLIO_CANDIDATES
+        }
+        candidates = self.tool_search_properties(search_args, session_id)
+        plan = optimize_portfolio(candidates, float(total_budget), num_properties)
+
+        details = self.fetch_properties(asset_ids=[p.get("asset_id") for p in plan["picks"]])
         portfolio = []
-        for i in range(num_properties):
-            search_args = {
-                "risk_profile": risk_profile,
-                "horizon": "1-2yr", # Assume a mid-term horizon for portfolio planning
-                "budget_aed": budget_per_property,
-                "intent": intent,
-                "limit": 1
-            }
-            properties = self.tool_search_properties(search_args, session_id)
-            if properties:
-                portfolio.append(properties[0])
+        annual_rent = 0.0
+        for pick, detail in zip(plan["picks"], details):
+            prop = {**pick, **(_decode_json_fields(detail) if detail else {})}
+            if prop.get("gross_yield") and prop.get("price_aed"):
+                prop["projected_annual_rent_aed"] = round(prop["price_aed"] * prop["gross_yield"] / 100)
+                annual_rent += prop["projected_annual_rent_aed"]
+            portfolio.append(prop)
 
         return {
             "status": "portfolio_generated",
             "properties": portfolio,
+            "allocation": {
+                "total_budget_aed": total_budget,
+                "invested_aed": plan["spent"],
+                "remaining_aed": plan["remaining"],
+                "projected_annual_rent_aed": round(annual_rent),
+            },
+            "diversification": plan["diversity"],
+            "candidates_considered": plan["candidates"],
             "summary": f"Generated a portfolio of {len(portfolio)} properties for a budget of {total_budget}."
         }
 
@@ -497,35 +739,44 @@ class ToolExecutor:
         name = args.get('property_name')
         with self.engine.connect() as conn:
             # Get project listing info from inventory
-            proj_query = text("""
-                SELECT name, area, final_price_from, final_price_per_sqft 
-                FROM entrestate_inventory 
-                WHERE name ILIKE :name LIMIT 1
-            """)
-            proj = conn.execute(proj_query, {"name": f"%{name}%"}).fetchone()
+            proj = None
+            where = self._name_predicate("project", "entrestate_inventory", "name", name)
+            if where:
+                proj_query = text(f"""
+                    SELECT name, area, final_price_from, final_price_per_sqft 
+                    FROM entrestate_inventory 
+                    WHERE {where[0]} LIMIT 1
+                """)
+                proj = conn.execute(proj_query, where[1]).fetchone()
             
             if not proj:
                 return {"error": "Project not found"}
             
             # Get DLD transactions for this project from the sales table
-            tx_query = text("""
-                SELECT actual_worth as transaction_value, meter_sale_price * 0.0929 as price_per_sqft, 
-                       instance_date as registration_date, 
-                       CASE WHEN trans_group_en ILIKE '%off%' THEN true ELSE false END as is_offplan
-                FROM dld_sales_transactions
-                WHERE project_name_en ILIKE :name
-                ORDER BY instance_date DESC
-                LIMIT 5
-            """)
-            txs = conn.execute(tx_query, {"name": f"%{name}%"}).fetchall()
+            txs = []
+            where = self._name_predicate("project", "dld_sales_transactions", "project_name_en", proj.name)
+            if where:
+                tx_query = text(f"""
+                    SELECT actual_worth as transaction_value, meter_sale_price * 0.0929 as price_per_sqft, 
+                           instance_date as registration_date, 
+                           CASE WHEN trans_group_en ILIKE '%off%' THEN true ELSE false END as is_offplan
+                    FROM dld_sales_transactions
+                    WHERE {where[0]}
+                    ORDER BY instance_date DESC
+                    LIMIT 5
+                """)
+                txs = conn.execute(tx_query, where[1]).fetchall()
             
             # Get area benchmarks for context
-            area_query = text("""
-                SELECT median_price, median_psf, tx_count
-                FROM dld_area_benchmarks
-                WHERE area_name_clean ILIKE :area
-            """)
-            area_bench = conn.execute(area_query, {"area": f"%{proj.area}%"}).fetchone()
+            area_bench = None
+            where = self._name_predicate("area", "dld_area_benchmarks", "area_name_clean", proj.area)
+            if where:
+                area_query = text(f"""
+                    SELECT median_price, median_psf, tx_count
+                    FROM dld_area_benchmarks
+                    WHERE {where[0]}
+                """)
+                area_bench = conn.execute(area_query, where[1]).fetchone()
 
             return {
                 "project_name": proj.name,
@@ -568,6 +819,7 @@ class ToolExecutor:
             "timeline": "4-8 weeks for design + 6-12 weeks for execution"
         }
 
+    @memoize(ttl=120, tags=("tokens",))
     def tool_explore_tokenized_assets(self, args: dict, session_id: str):
         """Lists fractional ownership opportunities from Mashroi."""
         vara_only = args.get('vara_compliant', False)
@@ -590,6 +842,7 @@ class ToolExecutor:
             }).fetchall()
             return [dict(row._mapping) for row in result]
 
+    @writes("tokens")
     def tool_update_token_status(self, args: dict, session_id: str):
         """Updates the regulatory status of a tokenized asset."""
         token_id = args.get('token_id')
@@ -655,6 +908,26 @@ class ToolExecutor:
             result.update({"landmarks": area['landmarks'], "schools": area['schools_nearby'], "metro": area['metro']})
             
         return result
+
+    def regime_signals(self, conn, use_rollups: bool = True) -> dict:
+        """
+        The six raw regime signals. Reads the incrementally maintained rollups
+        once they have been backfilled; otherwise (or if they are missing)
+        falls back to full scans of the source tables.
+        """
+        if use_rollups:
+            try:
+                with conn.begin_nested():
+                    row = conn.execute(text(REGIME_SIGNALS_ROLLUP_SQL)).fetchone()
+                if row is not None and row.ready:
+                    signals = dict(row._mapping)
+                    del signals["ready"]
+                    return signals
+            except Exception:
+                pass
+        return dict(conn.execute(text(REGIME_SIGNALS_SCAN_SQL)).fetchone()._mapping)
+
+    @memoize(ttl=300, tags=("market",))
     def tool_get_market_regime(self, args: dict, session_id: str):
         """
         Synthesizes 6 signals into a business direction.
@@ -663,18 +936,7 @@ class ToolExecutor:
         try:
             with self.engine.connect() as conn:
                 # Aggregate signals from the Neon spine
-                stats = conn.execute(text("""
-                    SELECT 
-                        (SELECT COUNT(*) FROM dld_sales_transactions WHERE instance_date > NOW() - INTERVAL '30 days') as monthly_tx,
-                        (SELECT COUNT(*) FROM entrestate_inventory WHERE launch_year >= 2025) as recent_launches,
-                        (SELECT AVG(rental_demand_score) FROM entrestate_inventory) as avg_demand,
-                        (SELECT COUNT(*) FROM entrestate_inventory WHERE final_status = 'Under Construction') as construction_count,
-                        (SELECT COUNT(*) FROM entrestate_inventory WHERE final_status = 'Handover Year (Critical)') as handover_wave,
-                        (SELECT AVG(growth_score) FROM growth_by_area) as avg_growth
-                    FROM entrestate_inventory LIMIT 1
-                """)).fetchone()
-
-                s = dict(stats._mapping)
+                s = self.regime_signals(conn)
 
             # Deterministic Regime Logic
             is_bull = s['monthly_tx'] > 500 and s['avg_growth'] > 50
@@ -709,16 +971,18 @@ class ToolExecutor:
                     "seasonal_position": datetime.now().strftime('%B')
                 },
                 "directive": "SELECTIVE_BUY",
-                "recommendation": "Focus on Capital Safe assets in Hypergrowth areas."
+                "recommendation": "Focus on Capital Safe assets in Hypergrowth areas.",
+                "degraded": True,
             }
 
     # ── CHANNEL PREFLIGHT ─────────────────────────────────────────
     # Credentials are fetched from channels.db per request.
     # os.environ is never read or written for channel secrets.
 
-    def _preflight_whatsapp(self, args: dict, user_id: str = "default") -> Optional[dict]:
+    def _preflight_whatsapp(self, args: dict, user_id: str = "default", config: Optional[dict] = None) -> Optional[dict]:
         """Returns preflight object if WhatsApp credentials are missing in the DB."""
-        config = get_channel_config(user_id, "whatsapp")
+        if config is None:
+            config = get_channel_config(user_id, "whatsapp")
         if not config or not all([
             config.get("account_sid"),
             config.get("auth_token"),
@@ -736,9 +1000,10 @@ class ToolExecutor:
             }
         return None
 
-    def _preflight_voice(self, args: dict, user_id: str = "default") -> Optional[dict]:
+    def _preflight_voice(self, args: dict, user_id: str = "default", config: Optional[dict] = None) -> Optional[dict]:
         """Returns preflight object if voice credentials are missing in the DB."""
-        config = get_channel_config(user_id, "voice")
+        if config is None:
+            config = get_channel_config(user_id, "voice")
         if not config or not all([
             config.get("account_sid"),
             config.get("auth_token"),
@@ -756,17 +1021,24 @@ class ToolExecutor:
             }
         return None
 
+    def preflight(self, name: str, args: dict, user_id: str = "default") -> Optional[dict]:
+        """The channel preflight of a messaging tool (None if connected or not a messaging tool)."""
+        if name in ("send_whatsapp", "broadcast_whatsapp"):
+            return self._preflight_whatsapp(args, user_id)
+        if name == "call_investor":
+            return self._preflight_voice(args, user_id)
+        return None
+
     def tool_send_whatsapp(self, args: dict, session_id: str, user_id: str = "default"):
         """Delivers messages via Twilio WhatsApp. Credentials loaded from channels.db."""
-        preflight = self._preflight_whatsapp(args, user_id)
+        config = get_channel_config(user_id, "whatsapp")
+        preflight = self._preflight_whatsapp(args, user_id, config)
         if preflight:
             return preflight
-        config = get_channel_config(user_id, "whatsapp")
-        client = Client(config["account_sid"], config["auth_token"])
-        to_number = args.get("to_number", "")
+        client = self.twilio.client(config, user_id, "whatsapp")
         msg_args = {
             "from_": config["from_number"],
-            "to": f"whatsapp:{to_number}" if not to_number.startswith("whatsapp:") else to_number,
+            "to": whatsapp_address(args.get("to_number", "")),
             "body": args.get(
                 "message_body",
                 f"Hi {args.get('investor_name', 'there')}, you have a message from your broker.",
@@ -775,16 +1047,48 @@ class ToolExecutor:
         media_url = args.get("media_url")
         if media_url:
             msg_args["media_url"] = [media_url]
-        message = client.messages.create(**msg_args)
+        message = send_message(client, msg_args, self.sender_throttle)
         return {"status": "sent", "sid": message.sid}
 
+    def tool_broadcast_whatsapp(self, args: dict, session_id: str, user_id: str = "default"):
+        """
+        Sends one personalized WhatsApp message per lead. `message_body` is a
+        template over each lead's fields, e.g. "Hi {investor_name}, {property_name}
+        just dropped in price". Sends run concurrently, paced per sender.
+        """
+        config = get_channel_config(user_id, "whatsapp")
+        preflight = self._preflight_whatsapp(args, user_id, config)
+        if preflight:
+            return preflight
+        leads = args.get("leads") or []
+        template = args.get("message_body")
+        if not isinstance(leads, list) or not leads:
+            return {"error": "Provide 'leads': a list of {to_number, investor_name, ...}."}
+        if len(leads) > WHATSAPP_BROADCAST_MAX_LEADS:
+            return {"error": f"At most {WHATSAPP_BROADCAST_MAX_LEADS} leads per broadcast."}
+        if not template:
+            return {"error": "Provide a 'message_body' template."}
+        client = self.twilio.client(config, user_id, "whatsapp")
+        try:
+            return broadcast(
+                client,
+                config["from_number"],
+                leads,
+                template,
+                media_url=args.get("media_url"),
+                throttle=self.sender_throttle,
+                concurrency=WHATSAPP_BROADCAST_CONCURRENCY,
+            )
+        except ValueError as e:
+            return {"error": str(e)}
+
     def tool_call_investor(self, args: dict, session_id: str, user_id: str = "default"):
         """Places a voice call via Twilio TwiML. Credentials loaded from channels.db."""
-        preflight = self._preflight_voice(args, user_id)
+        config = get_channel_config(user_id, "voice")
+        preflight = self._preflight_voice(args, user_id, config)
         if preflight:
             return preflight
-        config = get_channel_config(user_id, "voice")
-        client = Client(config["account_sid"], config["auth_token"])
+        client = self.twilio.client(config, user_id, "voice")
         message = args.get(
             "message",
             f"Hi {args.get('investor_name', 'there')}, this is your broker with a property update.",
@@ -796,6 +1100,7 @@ class ToolExecutor:
         )
         return {"status": "calling", "sid": call.sid}
 
+    @writes()
     def tool_queue_remote_agent_job(self, args: dict, session_id: str):
         """Queues a remote agent job for a broker (e.g. updating listings on portals)."""
         broker_id = args.get('broker_id')
@@ -830,21 +1135,17 @@ class ToolExecutor:
         correction = args.get('market_correction_pct', -15.0)
         delay = args.get('construction_delay_years', 1)
 
-        with self.engine.connect() as conn:
-            row = conn.execute(
-                text("SELECT * FROM agent_inventory_view_v1 WHERE name ILIKE :name LIMIT 1"),
-                {"name": f"%{name}%"}
-            ).fetchone()
-            
-        if not row:
+        p = self._find_property(name, args.get('asset_id'))
+        if not p:
             return {"error": "Property not found"}
             
-        p = dict(row._mapping)
         price = p.get('price_aed', 0)
         yield_pct = p.get('gross_yield', 0) / 100
         
         # Base Case (5yr)
-        base_roi = self.tool_analyze_investment({"property_name": name, "holding_years": 5}, session_id)
+        base_roi = self.tool_analyze_investment(
+            {"property_name": name, "asset_id": p.get('asset_id'), "holding_years": 5}, session_id
+        )
         
         # Stress Case Calculation
         stress_appreciation = 0.05 + (correction / 100 / 5) - (rate_hike / 100 / 2)
@@ -864,9 +1165,10 @@ class ToolExecutor:
             "verdict": "RESILIENT" if stress_roi_pct > 15 else "VULNERABLE"
         }
 
+    @memoize(ttl=300, tags=("market",), stamp="timestamp")
     def tool_get_market_pulse(self, args: dict, session_id: str):
         """Aggregates Growth Intelligence for the dashboard."""
-        regime_data = self.tool_get_market_regime({}, session_id)
+        regime_data = self.execute("get_market_regime", {}, session_id)
         try:
             with self.engine.connect() as conn:
                 try:
@@ -896,15 +1198,18 @@ class ToolExecutor:
                     "WHERE inference_type = 'market_efficiency'"
                 )).scalar()
 
-                return {
+                pulse = {
                     "regime": regime_data.get("regime"),
                     "directive": regime_data.get("directive"),
                     "signals": regime_data.get("signals"),
                     "market_efficiency_score": round(efficiency, 1) if efficiency else 65.0,
                     "hypergrowth_areas": [dict(r._mapping) for r in areas],
                     "top_cities": [dict(r._mapping) for r in cities],
-                    "timestamp": datetime.now().isoformat()
                 }
+                if regime_data.get("degraded"):
+                    # Built on the regime's stand-in answer: do not keep it past this call.
+                    pulse["degraded"] = True
+                return pulse
         except Exception:
             return {
                 "regime": regime_data.get("regime", "Balanced"),
@@ -913,34 +1218,20 @@ class ToolExecutor:
                 "market_efficiency_score": 65.0,
                 "hypergrowth_areas": [],
                 "top_cities": [],
-                "timestamp": datetime.now().isoformat()
+                "degraded": True,
             }
 
     def tool_compare_properties(self, args: dict, session_id: str):
-        """Side-by-side comparison of 2-4 properties."""
+        """Side-by-side comparison of 2-50 properties, fetched in one query."""
         raw_names = args.get('property_names', '')
         if isinstance(raw_names, list):
             pnames = raw_names
         else:
             pnames = [n.strip() for n in raw_names.split(',') if n.strip()]
         
+        pnames = pnames[:BATCH_FETCH_MAX]
         results = []
-        with self.engine.connect() as conn:
-            for name in pnames[:4]:
-                query = text("""
-                    SELECT * FROM agent_inventory_view_v1
-                    WHERE name ILIKE :name LIMIT 1
-                """)
-                row = conn.execute(query, {"name": f"%{name}%"}).fetchone()
-                if row:
-                    d = dict(row._mapping)
-                    # Parse JSON strings
-                    for k in ['reason_codes', 'risk_flags', 'drivers']:
-                        if k in d and isinstance(d[k], str):
-                            try: d[k] = json.loads(d[k])
-                            except: pass
-                    results.append(d)
-                else:
-                    results.append({"name": name, "error": "not found"})
+        for name, d in zip(pnames, self.fetch_properties(names=pnames)):
+            results.append(_decode_json_fields(d) if d else {"name": name, "error": "not found"})
         
         return {"type": "COMPARISON", "properties": results}